@@ -2,20 +2,35 @@
 import streamlit as st
 import json
 import pandas as pd
-import plotly.express as px
-import plotly.io as pio
-from ga_query import run_ga_report
-from prompt_enhancer import enhance_prompt
+import settings
+import tracing
+from ga_query import FAKE_API, PUSHDOWN_KEYS, comparison_ranges, run_ga_reports_batch, release_client, get_report_cache
+from ga_async import run_ga_reports_concurrently
+from ga_scheduler import get_scheduler
+from prompt_enhancer import analyze_query
+from query_parser import extract_query_spec
+from ga_schema import get_property_schema
+from intent_cache import get_intent_cache
+from history_store import HISTORY_PAGE_SIZE, get_history_store
+from charts import comparison_chart, generate_chart, reduced_view
+from decoder import align_periods, compare_periods
 import export_utils
+import llm_handler
 import re
 
+# Time this script run; the sidebar shows it against the rerun budget
+rerun_timer = settings.RerunTimer()
+
+# Prometheus / OTLP endpoint for production scraping, when GA4_METRICS_PORT is set
+tracing.serve_metrics()
+
 # Initialize session state
 if "ga_property_id" not in st.session_state:
     st.session_state.ga_property_id = ""
 if "ga_credentials" not in st.session_state:
     st.session_state.ga_credentials = None
-if "history" not in st.session_state:
-    st.session_state.history = []
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
 if "llm_provider" not in st.session_state:
     st.session_state.llm_provider = "OpenAI"
 if "api_key" not in st.session_state:
@@ -98,22 +113,25 @@ with st.sidebar:
         )
         
         # Auto-connect: load credentials from local file if available
-        import os
-        cred_path = os.path.join(os.path.expanduser("~"), ".ga4_assistant_credentials.json")
-        propid_path = os.path.join(os.path.expanduser("~"), ".ga4_assistant_propertyid.txt")
+        # (parsed once, then only re-read when the files change)
         auto_connected = False
-        if os.path.exists(cred_path) and os.path.exists(propid_path):
-            try:
-                with open(cred_path, "r") as f:
-                    credentials = json.load(f)
-                with open(propid_path, "r") as f:
-                    property_id = f.read().strip()
-                st.session_state.ga_credentials = credentials
-                st.session_state.ga_property_id = property_id
-                st.info(f"✅ Auto-connected to GA4 Property: **{property_id}** (from previous session)")
-                auto_connected = True
-            except Exception:
-                pass
+        saved = settings.saved_connection()
+        if saved:
+            credentials, property_id = saved
+            st.session_state.ga_credentials = credentials
+            st.session_state.ga_property_id = property_id
+            settings.info_once(
+                f"auto_connect_{property_id}",
+                f"✅ Auto-connected to GA4 Property: **{property_id}** (from previous session)"
+            )
+            auto_connected = True
+        elif FAKE_API:
+            # Offline mode: reports come from fake_ga's synthetic property
+            import fake_ga
+            st.session_state.ga_credentials = fake_ga.FAKE_CREDENTIALS
+            st.session_state.ga_property_id = fake_ga.FAKE_PROPERTY_ID
+            settings.info_once("fake_api", "🧪 Offline mode (GA4_FAKE_API): reports use synthetic data")
+            auto_connected = True
 
         # Save button
         if st.button("🔗 Connect Google Analytics", type="primary", use_container_width=True):
@@ -128,13 +146,14 @@ with st.sidebar:
                     if not all(key in credentials for key in required_keys):
                         st.error("Invalid service account file - please re-download from Google Cloud")
                     else:
+                        # Drop the pooled client built from the previous key
+                        if st.session_state.get("ga_credentials"):
+                            release_client(st.session_state.ga_credentials)
                         st.session_state.ga_property_id = property_id
                         st.session_state.ga_credentials = credentials
                         # Save credentials and property id for auto-connect next time
-                        with open(cred_path, "w") as f:
-                            json.dump(credentials, f)
-                        with open(propid_path, "w") as f:
-                            f.write(property_id)
+                        settings.save_json(settings.CREDENTIALS_PATH, credentials)
+                        settings.save_text(settings.PROPERTY_ID_PATH, property_id)
                         st.success(f"✅ Connected to GA4 Property: {property_id} (will auto-connect next time)")
                 except json.JSONDecodeError:
                     st.error("Invalid JSON format - please upload the exact file from Google Cloud")
@@ -143,15 +162,15 @@ with st.sidebar:
         if 'ga_credentials' in st.session_state:
             st.info(f"Connected to GA4 Property: **{st.session_state.ga_property_id}**")
             if st.button("Disconnect Google Analytics", use_container_width=True):
+                if st.session_state.get("ga_credentials"):
+                    release_client(st.session_state.ga_credentials)
                 keys = ['ga_credentials', 'ga_property_id']
                 for key in keys:
                     if key in st.session_state:
                         del st.session_state[key]
                 # Remove saved credentials
-                if os.path.exists(cred_path):
-                    os.remove(cred_path)
-                if os.path.exists(propid_path):
-                    os.remove(propid_path)
+                settings.remove(settings.CREDENTIALS_PATH)
+                settings.remove(settings.PROPERTY_ID_PATH)
                 st.rerun()
     
     # LLM Provider Selection
@@ -180,35 +199,42 @@ with st.sidebar:
     if provider in provider_links:
         st.markdown(f"🔑 [Get {provider.split(' ')[0]} API Key]({provider_links[provider]})", unsafe_allow_html=True)
     
-    import os
-    llm_path = os.path.join(os.path.expanduser("~"), ".ga4_assistant_llm.json")
     # Auto-load LLM settings if available
-    if os.path.exists(llm_path):
-        try:
-            with open(llm_path, "r") as f:
-                llm_data = json.load(f)
-            st.session_state.llm_provider = llm_data.get("provider", provider)
-            st.session_state.api_key = llm_data.get("api_key", api_key)
-            st.info(f"✅ Auto-loaded AI provider: {st.session_state.llm_provider}")
-        except Exception:
-            pass
+    llm_data = settings.saved_llm_settings()
+    if llm_data:
+        st.session_state.llm_provider = llm_data.get("provider", provider)
+        st.session_state.api_key = llm_data.get("api_key", api_key)
+        settings.info_once(
+            f"llm_{st.session_state.llm_provider}",
+            f"✅ Auto-loaded AI provider: {st.session_state.llm_provider}"
+        )
 
     if st.button("💾 Save AI Settings", use_container_width=True):
         st.session_state.llm_provider = provider
         st.session_state.api_key = api_key
         # Save to file for auto-connect next time
-        with open(llm_path, "w") as f:
-            json.dump({"provider": provider, "api_key": api_key}, f)
+        settings.save_json(settings.LLM_SETTINGS_PATH, {"provider": provider, "api_key": api_key})
         st.success("AI settings saved! (will auto-load next time)")
 
     # Option to clear saved LLM settings
-    if os.path.exists(llm_path):
+    if llm_data:
         if st.button("Clear Saved AI Settings", use_container_width=True):
-            os.remove(llm_path)
+            settings.remove(settings.LLM_SETTINGS_PATH)
+            llm_handler.release_providers()
             st.session_state.llm_provider = "OpenAI"
             st.session_state.api_key = ""
             st.success("Saved AI settings cleared.")
     
+    # Streaming stats of the AI providers used so far
+    llm_stats = llm_handler.provider_summary()
+    for name, info in llm_stats.items():
+        if info["mean_ttft"] is not None:
+            st.caption(
+                f"**{name}**: {info['calls']} answers · "
+                f"first token after {info['mean_ttft']:.2f}s on average · "
+                f"{info['reused']}/{info['calls']} on a reused connection"
+            )
+
     # Sample Queries
     st.divider()
     st.subheader("💡 Sample Questions")
@@ -225,6 +251,49 @@ with st.sidebar:
         if st.button(f"{query}: {explanation}", use_container_width=True):
             st.session_state.user_query = query
 
+    if st.button("📋 Show All as Overview", use_container_width=True,
+                 help="Runs every sample question together in one request"):
+        st.session_state.show_overview = True
+
+    # Report cache
+    st.divider()
+    st.subheader("🗄️ Report Cache")
+    cache_info = get_report_cache().summary()
+    st.caption(
+        f"Hits: **{cache_info['memory_hits'] + cache_info['disk_hits']}** · "
+        f"Misses: **{cache_info['misses']}** · "
+        f"Hit rate: **{cache_info['hit_rate']:.0%}**  \n"
+        f"Stored reports: {cache_info['disk_entries']} "
+        f"({cache_info['disk_bytes'] / 1024 / 1024:.1f} MB)"
+    )
+    intent_info = get_intent_cache().summary()
+    st.caption(
+        f"Remembered questions: {intent_info['disk_entries'] or intent_info['memory_entries']} · "
+        f"re-asked: **{intent_info['memory_hits'] + intent_info['disk_hits']}**"
+    )
+    if st.button("🧹 Clear Cached Reports", use_container_width=True,
+                 help="Fetch fresh data from Google Analytics on the next question"):
+        get_report_cache().invalidate()
+        get_intent_cache().invalidate()
+        st.success("Cached reports cleared.")
+
+    # Remaining GA4 quota, as reported with the last response for this property
+    quota = get_scheduler().quota_summary(f"properties/{st.session_state.ga_property_id}")
+    if quota:
+        st.subheader("⛽ GA4 Quota")
+        st.caption(
+            f"Tokens left this hour: **{quota['tokens_per_hour'][1]:,}**  \n"
+            f"Tokens left today: **{quota['tokens_per_day'][1]:,}**  \n"
+            f"Concurrent requests available: **{quota['concurrent_requests'][1]}**"
+        )
+
+    # Filled in at the end of the run with how long it took
+    rerun_slot = st.empty()
+    st.checkbox("⏱️ Show timing breakdown", key="show_timing",
+                help="Where the time went for the last question: parsing, GA4 calls, decoding, charts, exports")
+
+rerun_timer.mark("sidebar")
+
 # ===== MAIN CONTENT =====
 # New user onboarding
 if 'ga_credentials' not in st.session_state:
@@ -260,87 +329,281 @@ with col2:
     st.caption("Examples: 'Users by country', 'Top pages', 'Mobile vs desktop traffic'")
 
 
-# Chart generation function
-def generate_chart(df, query):
-    if df is None or df.empty or len(df.columns) < 2:
-        return None
-    q = query.lower()
-    if " by " in q:
-        return px.bar(df, x=df.columns[0], y=df.columns[1], title=f"{query}", color=df.columns[0])
-    elif " over time" in q or "trend" in q or "date" in q:
-        return px.line(df, x=df.columns[0], y=df.columns[1], title=f"{query} Trend")
-    elif "proportion" in q or "percentage" in q or "share" in q:
-        return px.pie(df, names=df.columns[0], values=df.columns[1], title=f"{query} Distribution")
-    elif "scatter" in q or "correlation" in q:
-        if len(df.columns) >= 3:
-            return px.scatter(df, x=df.columns[1], y=df.columns[2], color=df.columns[0], title=f"{query} Correlation")
-        else:
-            return px.scatter(df, x=df.columns[0], y=df.columns[1], title=f"{query} Correlation")
-    else:
-        return None
+# Sample overview: every sample question fetched in one batched request
+sample_reports = {
+    "Users by device": {"dimensions": ["deviceCategory"], "metrics": ["activeUsers"]},
+    "Top countries": {"dimensions": ["country"], "metrics": ["activeUsers"]},
+    "Popular pages": {"dimensions": ["pagePath"], "metrics": ["screenPageViews"]},
+    "Traffic sources": {"dimensions": ["sessionSourceMedium"], "metrics": ["sessions"]},
+    "New vs returning": {"dimensions": ["newVsReturning"], "metrics": ["activeUsers"]},
+}
+
+if st.session_state.get("show_overview"):
+    st.divider()
+    st.subheader("📋 Overview")
+    overview_frames = run_ga_reports_batch(list(sample_reports.values()))
+    tabs = st.tabs(list(sample_reports))
+    for tab, (name, spec), df in zip(tabs, sample_reports.items(), overview_frames):
+        with tab:
+            fig = generate_chart(df, f"{spec['metrics'][0]} by {spec['dimensions'][0]}")
+            if fig:
+                st.plotly_chart(fig, use_container_width=True)
+                if reduced_view(fig):
+                    st.caption(reduced_view(fig))
+            st.dataframe(df, use_container_width=True)
+    if st.button("Hide Overview"):
+        st.session_state.show_overview = False
+        st.rerun()
+
+rerun_timer.mark("overview")
 
 # Process query
 if submit and user_query.strip():
-    # Enhance prompt
-    if enable_enhancement:
-        enhanced_query = enhance_prompt(user_query)
-        st.session_state.enhanced_query = enhanced_query
-    else:
-        st.session_state.enhanced_query = user_query
-
-    # Store in history
-    st.session_state.history.append({
-        "original": user_query,
-        "enhanced": st.session_state.enhanced_query
-    })
+    # Every stage of answering this question is recorded under one trace
+    with tracing.span("question") as question_span:
+        st.session_state.last_trace = question_span.trace_id
 
+        # Enhance prompt; the same pass picks out the date range and chart type
+        intent = analyze_query(user_query)
+        if enable_enhancement:
+            st.session_state.enhanced_query = intent.enhanced
+        else:
+            st.session_state.enhanced_query = user_query
+
+        # Questions asked before, in any wording, reuse their request and explanation
+        with tracing.span("query.parse") as parse_span:
+            spec = get_intent_cache().get(user_query, st.session_state.ga_property_id)
+            parse_span.set(cache="miss" if spec is None else "hit")
+            problems = []
+            if spec is None:
+                schema = get_property_schema()
+                # Filters, ordering and "top N" limits are applied by GA4, not after download
+                spec = extract_query_spec(st.session_state.enhanced_query, schema)
+                # Combinations GA4 would reject are caught here, without an API call
+                problems = schema.check(spec["dimensions"], spec["metrics"])
+                start_date, end_date = intent.time_range or ("30daysAgo", "today")
+                spec.update({"date_range": start_date, "end_date": end_date,
+                             "chart_type": intent.chart_type, "explanation": None})
+                if intent.comparison:
+                    # "vs last month" / "year over year": every period comes back in the same call
+                    spec["date_ranges"] = comparison_ranges(start_date, end_date, intent.comparison)
+                if not problems:
+                    get_intent_cache().put(user_query, st.session_state.ga_property_id, spec)
+        dimensions, metrics = spec["dimensions"], spec["metrics"]
+
+        # Get data from GA (repeated questions are served from the report cache)
+        if problems:
+            st.error("❌ This question can't be answered in one report:\n\n" +
+                     "\n".join(f"- {problem}" for problem in problems))
+            report_df, trend = pd.DataFrame(), []
+        else:
+            # The breakdown and its daily trend are fetched concurrently
+            date_range = {"date_range": spec["date_range"], "end_date": spec["end_date"],
+                          "date_ranges": spec.get("date_ranges")}
+            pushdown = {key: spec[key] for key in PUSHDOWN_KEYS if spec.get(key)}
+            reports = [{"dimensions": dimensions, "metrics": metrics, **date_range, **pushdown}]
+            if "date" not in dimensions:
+                # The trend covers the same slice of traffic, not just the top rows
+                trend_filters = {"dimension_filters": spec.get("dimension_filters")}
+                reports.append({"dimensions": ["date"], "metrics": metrics, **date_range, **trend_filters})
+            with tracing.span("ga.fetch", reports=len(reports)):
+                report_df, *trend = run_ga_reports_concurrently(reports)
+
+        # Keep the report so widget clicks (e.g. exports) don't lose it on rerun
+        trend_fig = None
+        if spec.get("date_ranges"):
+            # Periods are overlaid in the charts and side by side, with changes, in the table
+            periods = [period["name"] for period in spec["date_ranges"]]
+            fig = comparison_chart(align_periods(report_df), user_query, metrics[0], periods)
+            if trend and not trend[0].empty:
+                trend_fig = comparison_chart(
+                    align_periods(trend[0]), f"{metrics[0]} over time", metrics[0], periods
+                )
+            report_df = compare_periods(report_df, metrics, periods)
+        else:
+            fig = generate_chart(report_df, user_query, kind=spec["chart_type"])
+            if trend and not trend[0].empty:
+                trend_fig = generate_chart(trend[0], f"{metrics[0]} over time", kind="line")
+        st.session_state.current_report = {
+            "question": user_query,
+            "explanation": spec["explanation"],
+            "enhanced": st.session_state.enhanced_query,
+            "df": report_df,
+            "fig": fig,
+            "trend_fig": trend_fig,
+            "fingerprint": export_utils.report_fingerprint(report_df, fig),
+        }
+
+        # Store in history; the result is kept so the question reopens without refetching
+        with tracing.span("history.save", rows=len(report_df)):
+            history = get_history_store()
+            if not report_df.empty:
+                history.save_result(st.session_state.current_report)
+            history.add(
+                st.session_state.ga_property_id, user_query, st.session_state.enhanced_query, spec,
+                fingerprint=None if report_df.empty else st.session_state.current_report["fingerprint"],
+                rows=len(report_df),
+            )
+        st.session_state.history_page = 0
+        question_span.set(rows=len(report_df))
+
+rerun_timer.mark("query")
+
+# Show the latest report
+report = st.session_state.get("current_report")
+if report:
     # Show enhanced prompt
     st.divider()
     st.subheader("🔍 Your Enhanced Question")
-    st.info(st.session_state.enhanced_query)
+    st.info(report["enhanced"])
 
-    # Get data from GA (simulated for now)
     st.subheader("📊 Your Report")
 
-    # Sample data - in real app this would come from GA
-    sample_data = pd.DataFrame({
-        "Device": ["Desktop", "Mobile", "Tablet"],
-        "Users": [1200, 850, 150],
-        "Sessions": [1800, 920, 180],
-        "Bounce Rate": [25, 42, 35]
-    })
-
     # Display table
-    st.dataframe(sample_data, use_container_width=True)
+    st.dataframe(report["df"], use_container_width=True)
+    totals = report["df"].attrs.get("totals")
+    if totals:
+        st.caption("Σ All rows: " + ", ".join(f"{name} {value:,.0f}" if float(value).is_integer()
+                                             else f"{name} {value:,.2f}" for name, value in totals.items()))
 
-    # Generate and display chart
-    fig = generate_chart(sample_data, user_query)
-    if fig:
-        st.plotly_chart(fig, use_container_width=True)
+    # Display chart
+    if report["fig"]:
+        st.plotly_chart(report["fig"], use_container_width=True)
+        if reduced_view(report["fig"]):
+            st.caption(reduced_view(report["fig"]))
 
-    # Export options
+    if report["trend_fig"]:
+        st.caption("📈 Daily trend")
+        st.plotly_chart(report["trend_fig"], use_container_width=True)
+        if reduced_view(report["trend_fig"]):
+            st.caption(reduced_view(report["trend_fig"]))
+
+    # Plain-language explanation, streamed from the AI provider as it is written
+    if not report["df"].empty:
+        st.subheader("🧠 What This Means")
+        if report.get("explanation"):
+            st.markdown(report["explanation"])
+        elif st.button("💡 Explain this report", help="Asks your AI assistant; click anything else to stop"):
+            with tracing.span("llm.explain", provider=st.session_state.llm_provider) as explain_span:
+                explanation = st.write_stream(llm_handler.stream_explanation(report["enhanced"], report["df"]))
+                report["explanation"] = explanation if isinstance(explanation, str) else "".join(explanation)
+                explain_span.set(chars=len(report["explanation"]))
+            if report["explanation"]:
+                get_intent_cache().set_explanation(
+                    report["question"], st.session_state.ga_property_id, report["explanation"]
+                )
+                get_history_store().save_result(report)
+            call = llm_handler.get_provider(
+                st.session_state.llm_provider, st.session_state.api_key
+            ).last_call
+            if call and call["ttft"] is not None:
+                st.caption(
+                    f"First words after {call['ttft']:.2f}s · done in {call['seconds']:.1f}s"
+                    + (" · reused connection" if call["reused"] else "")
+                )
+
+    # Export options: each file (and the chart image) is only built when asked for
     st.divider()
     st.subheader("📤 Export Report")
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.download_button("💾 CSV", sample_data.to_csv(), "analytics.csv")
-    with col2:
-        st.download_button("📊 Excel", export_utils.to_excel(sample_data, fig=fig), "analytics.xlsx")
-    with col3:
-        st.download_button("📄 PDF", export_utils.to_pdf(sample_data, fig=fig), "analytics.pdf")
-    with col4:
-        st.download_button("📝 Word", export_utils.to_word(sample_data, fig=fig), "analytics.docx")
+    export_formats = [
+        ("💾 CSV", "csv", "analytics.csv"),
+        ("📊 Excel", "xlsx", "analytics.xlsx"),
+        ("📄 PDF", "pdf", "analytics.pdf"),
+        ("📝 Word", "docx", "analytics.docx"),
+    ]
+    # Typed data files for pandas, DuckDB, Spark, ...
+    data_formats = [
+        ("🗜️ CSV (gzip)", "csv.gz", "analytics.csv.gz"),
+        ("🧱 Parquet", "parquet", "analytics.parquet"),
+        ("🪶 Feather", "feather", "analytics.feather"),
+    ]
+    for formats in (export_formats, data_formats):
+        for col, (label, fmt, filename) in zip(st.columns(len(export_formats)), formats):
+            with col:
+                data = export_utils.cached_export(fmt, report["fingerprint"])
+                if data is None and st.button(f"Prepare {label}", key=f"prepare_{fmt}", use_container_width=True):
+                    with st.spinner(f"Building {label.split(' ', 1)[1]} file..."):
+                        data = export_utils.build_export(
+                            fmt, report["df"], fig=report["fig"], fingerprint=report["fingerprint"]
+                        )
+                if data is not None:
+                    st.download_button(label, data, filename, key=f"download_{fmt}", use_container_width=True)
+
+rerun_timer.mark("report")
+
+# Where the time went for the last question, and the totals per stage since start
+if st.session_state.get("show_timing"):
+    with st.expander("⏱️ Timing breakdown", expanded=True):
+        spans = tracing.get_tracer().trace(st.session_state.get("last_trace"))
+        if spans:
+            st.caption("Last question")
+            st.dataframe(pd.DataFrame(tracing.trace_rows(spans)), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Ask a question to see how long each stage took.")
+        stages = tracing.get_tracer().stage_summary()
+        if stages:
+            st.caption("All stages since the app started")
+            st.dataframe(pd.DataFrame([
+                {"stage": name, "count": stage["count"],
+                 "avg ms": round(stage["seconds"] / stage["count"] * 1000, 1),
+                 "rows": stage["rows"], "bytes": stage["bytes"], "tokens": stage["tokens"],
+                 "cache hits": stage["cache"].get("hit", 0), "cache misses": stage["cache"].get("miss", 0),
+                 "errors": stage["errors"]}
+                for name, stage in sorted(stages.items())
+            ]), use_container_width=True, hide_index=True)
+            metrics_col, traces_col = st.columns(2)
+            metrics_col.download_button("📈 Prometheus metrics", tracing.prometheus_text(),
+                                        file_name="ga4_assistant_metrics.prom", mime="text/plain",
+                                        use_container_width=True)
+            traces_col.download_button("🧵 Traces (OTLP JSON)", tracing.otlp_json(spans or None),
+                                       file_name="ga4_assistant_traces.json", mime="application/json",
+                                       use_container_width=True)
+
+rerun_timer.mark("timing")
 
 # Query History
 st.divider()
 st.subheader("🕒 Your Question History")
 
-if not st.session_state.history:
+# Only the current page of entries is read and drawn
+history = get_history_store()
+history_total = history.count(st.session_state.ga_property_id)
+if not history_total:
     st.info("Your questions will appear here after you ask them")
 else:
-    for i, item in enumerate(st.session_state.history[::-1]):
-        with st.expander(f"{i+1}. {item['original'][:50]}...", expanded=False):
+    pages = (history_total - 1) // HISTORY_PAGE_SIZE + 1
+    page = min(st.session_state.history_page, pages - 1)
+    entries = history.page(st.session_state.ga_property_id, page)
+    for i, item in enumerate(entries, start=page * HISTORY_PAGE_SIZE + 1):
+        with st.expander(f"{i}. {item['question'][:50]}...", expanded=False):
             st.caption(f"**Enhanced version:** {item['enhanced']}")
-            if st.button("Re-run this question", key=f"rerun_{i}"):
-                st.session_state.user_query = item['original']
+            open_col, rerun_col = st.columns(2)
+            if item["fingerprint"] and open_col.button("⚡ Open saved report", key=f"open_{item['id']}"):
+                stored = history.load_result(item["fingerprint"])
+                if stored is None:
+                    st.warning("This saved report has expired, please re-run the question")
+                else:
+                    st.session_state.current_report = stored
+                    st.rerun()
+            if rerun_col.button("Re-run this question", key=f"rerun_{item['id']}"):
+                st.session_state.user_query = item['question']
                 st.rerun()
+    if pages > 1:
+        newer, position, older = st.columns([1, 2, 1])
+        if newer.button("◀ Newer", disabled=page == 0, use_container_width=True):
+            st.session_state.history_page = page - 1
+            st.rerun()
+        position.caption(f"Page {page + 1} of {pages} · {history_total} questions")
+        if older.button("Older ▶", disabled=page >= pages - 1, use_container_width=True):
+            st.session_state.history_page = page + 1
+            st.rerun()
+
+rerun_timer.mark("history")
+recent_runs = rerun_timer.record()
+last_ms = recent_runs[-1]["total"]
+slowest = max(recent_runs[-1]["sections"].items(), key=lambda item: item[1])
+rerun_slot.caption(
+    f"{'⏱️' if last_ms <= settings.RERUN_BUDGET_MS else '🐢'} Page updated in **{last_ms:.0f} ms** "
+    f"(budget {settings.RERUN_BUDGET_MS:.0f} ms, slowest part: {slowest[0]} {slowest[1]:.0f} ms) · "
+    f"average of last {len(recent_runs)}: {sum(run['total'] for run in recent_runs) / len(recent_runs):.0f} ms"
+)
@@ -0,0 +1,294 @@
+"""Offline benchmarks for the report pipeline
+
+Reports come from fake_ga, an in-process stand-in for the GA4 Data API,
+so no credentials or network are needed.
+
+Usage:
+    python benchmarks.py decode --rows 100000
+    python benchmarks.py exports --rows 10000 100000
+    python benchmarks.py all --rows 1000 10000 100000 1000000 --save --compare
+
+--save appends the results to BENCH_RESULTS_PATH; --compare shows each
+timing against the last saved run and exits with status 1 when one is
+more than REGRESSION_THRESHOLD times slower.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+from google.analytics.data_v1beta.types import RunReportResponse
+
+import export_utils
+import fake_ga
+import ga_query
+from charts import generate_chart
+from decoder import response_to_dataframe
+from prompt_enhancer import analyze_query, enhance_prompt
+from query_parser import extract_ga_parameters
+
+# Saved results, one JSON object per line
+BENCH_RESULTS_PATH = os.environ.get(
+    "GA4_BENCH_RESULTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.jsonl")
+)
+
+# Slower than the last saved run by this factor counts as a regression
+REGRESSION_THRESHOLD = 1.25
+
+# Timings below this are too noisy to compare (seconds)
+NOISE_FLOOR = 0.02
+
+QUESTIONS = [
+    "Users by country last week",
+    "top 10 pages from Germany on mobile",
+    "sessions by device this month vs last month",
+    "bounce rate trend over the past 3 months",
+    "pages with more than 1,000 page views",
+    "share of traffic by source",
+    "new users by city year over year",
+    "average session duration by browser in a pie chart",
+]
+
+
+def synthetic_response(rows, dimensions=("country", "date"),
+                       metrics=(("activeUsers", 1), ("bounceRate", 2))):
+    """Build a RunReportResponse with `rows` rows of plausible GA4 values"""
+    pb = RunReportResponse.pb(RunReportResponse())
+    for name in dimensions:
+        pb.dimension_headers.add(name=name)
+    for name, metric_type in metrics:
+        pb.metric_headers.add(name=name, type_=metric_type)
+    for i in range(rows):
+        row = pb.rows.add()
+        for name in dimensions:
+            value = f"2024{i % 12 + 1:02d}{i % 28 + 1:02d}" if name == "date" else f"{name}-{i % 250}"
+            row.dimension_values.add(value=value)
+        for name, metric_type in metrics:
+            value = str(i % 5000) if metric_type == 1 else f"{(i % 1000) / 1000:.6f}"
+            row.metric_values.add(value=value)
+    pb.row_count = rows
+    return RunReportResponse.wrap(pb)
+
+
+def legacy_decode(response):
+    """The original per-row decoder, kept as the baseline"""
+    dim_headers = [header.name for header in response.dimension_headers]
+    met_headers = [header.name for header in response.metric_headers]
+    rows = []
+    for row in response.rows:
+        row_data = [dim.value for dim in row.dimension_values]
+        row_data += [met.value for met in row.metric_values]
+        rows.append(row_data)
+    return pd.DataFrame(rows, columns=dim_headers + met_headers)
+
+
+def measure(func, *args, repeat=3):
+    """Best wall time over `repeat` runs, plus peak traced memory of one run"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def bench_decode(rows, repeat=3):
+    response = synthetic_response(rows)
+    results = []
+    for name, func in [("legacy", legacy_decode), ("typed", response_to_dataframe)]:
+        seconds, peak, df = measure(func, response, repeat=repeat)
+        results.append({
+            "benchmark": f"decode/{name}",
+            "rows": rows,
+            "seconds": seconds,
+            "peak_mb": peak / 1024 / 1024,
+            "frame_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
+        })
+    return results
+
+
+def bench_exports(rows, repeat=1):
+    """Time each export writer on a typed report of `rows` rows"""
+    df = response_to_dataframe(synthetic_response(rows))
+    results = []
+    for fmt, exporter in export_utils.EXPORTERS.items():
+        exporter(df.head(10))  # Writers import their libraries on first use
+        seconds, peak, data = measure(exporter, df, repeat=repeat)
+        results.append({
+            "benchmark": f"export/{fmt}",
+            "rows": rows,
+            "seconds": seconds,
+            "peak_mb": peak / 1024 / 1024,
+            "output_mb": len(data) / 1024 / 1024,
+        })
+    return results
+
+
+def bench_fetch(rows, repeat=1):
+    """Fetch a `rows`-row report from the fake API: paging, scheduling and decoding
+
+    fetch/fake-server is the time the fake takes to build the responses
+    alone, so the pipeline's own cost is the difference.
+    """
+    client = fake_ga.FakeDataClient(cardinality={"pagePath": rows})
+    ga_query.set_client_factory(*fake_ga.client_factory(client))
+    request = ga_query.build_report_request(
+        fake_ga.FAKE_PROPERTY_ID, ["pagePath"], ["screenPageViews", "bounceRate"]
+    )
+    results = []
+    try:
+        for name, func, args in [
+            ("fake-server", client.run_report, (request,)),
+            ("pipeline", ga_query.fetch_all_pages, (request, fake_ga.FAKE_CREDENTIALS)),
+        ]:
+            client.reset_quota()
+            seconds, peak, _ = measure(func, *args, repeat=repeat)
+            results.append({
+                "benchmark": f"fetch/{name}",
+                "rows": rows,
+                "seconds": seconds,
+                "peak_mb": peak / 1024 / 1024,
+            })
+    finally:
+        ga_query.set_client_factory()
+    return results
+
+
+def bench_charts(rows, repeat=1):
+    """Build each chart type from a typed report of `rows` rows"""
+    df = response_to_dataframe(synthetic_response(rows))
+    columns = {
+        "bar": ["country", "activeUsers"],
+        "line": ["date", "activeUsers"],
+        "pie": ["country", "activeUsers"],
+        "scatter": ["country", "activeUsers", "bounceRate"],
+    }
+    results = []
+    for kind, selected in columns.items():
+        generate_chart(df[selected].head(10), "Warm-up", kind)  # Imports Plotly on first use
+        seconds, peak, fig = measure(generate_chart, df[selected], "Benchmark", kind, repeat=repeat)
+        results.append({
+            "benchmark": f"chart/{kind}",
+            "rows": rows,
+            "seconds": seconds,
+            "peak_mb": peak / 1024 / 1024,
+            "output_mb": len(fig.to_json()) / 1024 / 1024,
+        })
+    return results
+
+
+def bench_parse(repeat=3):
+    """Enhance and parse QUESTIONS with the prompt cache cleared; seconds are per question"""
+    results = []
+    for name, func in [("enhance_prompt", enhance_prompt), ("extract_ga_parameters", extract_ga_parameters)]:
+        def run():
+            analyze_query.cache_clear()
+            for question in QUESTIONS:
+                func(question)
+        seconds, peak, _ = measure(run, repeat=repeat)
+        results.append({
+            "benchmark": f"parse/{name}",
+            "rows": len(QUESTIONS),
+            "seconds": seconds / len(QUESTIONS),
+            "peak_mb": peak / 1024 / 1024,
+        })
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_results(path=BENCH_RESULTS_PATH):
+    """Every saved result, oldest first"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_results(results, path=BENCH_RESULTS_PATH):
+    run = {
+        "run": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+    }
+    with open(path, "a") as f:
+        for result in results:
+            f.write(json.dumps({**run, **result}) + "\n")
+
+
+def compare_results(results, saved):
+    """Add each result's ratio to the last saved timing; returns the regressions"""
+    last = {(item["benchmark"], item["rows"]): item for item in saved}
+    regressions = []
+    for result in results:
+        previous = last.get((result["benchmark"], result["rows"]))
+        if previous is None:
+            continue
+        result["vs_last"] = result["seconds"] / previous["seconds"] if previous["seconds"] else None
+        if result["vs_last"] and result["vs_last"] > REGRESSION_THRESHOLD \
+                and result["seconds"] > NOISE_FLOOR:
+            regressions.append({**result, "last_commit": previous.get("commit")})
+    return regressions
+
+
+def print_results(results):
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=["decode", "exports", "fetch", "charts", "parse", "all"])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000])
+    parser.add_argument("--repeat", type=int, default=None)
+    parser.add_argument("--save", action="store_true", help="append the results to the results file")
+    parser.add_argument("--compare", action="store_true", help="compare with the last saved results")
+    parser.add_argument("--results", default=BENCH_RESULTS_PATH, help="results file (JSON lines)")
+    args = parser.parse_args()
+    selected = ["decode", "exports", "fetch", "charts", "parse"] if args.benchmark == "all" else [args.benchmark]
+    results = []
+    if "parse" in selected:
+        results += bench_parse(args.repeat or 3)
+    for rows in args.rows:
+        if "decode" in selected:
+            results += bench_decode(rows, args.repeat or 3)
+        if "exports" in selected:
+            results += bench_exports(rows, args.repeat or 1)
+        if "fetch" in selected:
+            results += bench_fetch(rows, args.repeat or 1)
+        if "charts" in selected:
+            results += bench_charts(rows, args.repeat or 1)
+    regressions = compare_results(results, load_results(args.results)) if args.compare else []
+    print_results(results)
+    if args.save:
+        save_results(results, args.results)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {REGRESSION_THRESHOLD}x the last saved run:")
+        print_results(regressions)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# On-disk store shared by every session on this machine
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ga4_assistant_cache.sqlite")
+
+
+class TwoTierCache:
+    """LRU cache with TTLs, kept in memory and persisted to SQLite
+
+    Values are pickled on disk. A ttl of None means the entry never expires.
+    The disk tier is best effort: if SQLite is unavailable the cache keeps
+    working from memory only.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, table="reports", default_ttl=3600,
+                 max_memory_entries=128, max_disk_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.table = table
+        self.default_ttl = default_ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self._conn = None
+        self._disk_failed = False
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    # ----- SQLite tier -----
+    def _db(self):
+        if self._conn is None and not self._disk_failed and self.path:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        namespace TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        expires REAL,
+                        accessed REAL NOT NULL,
+                        size INTEGER NOT NULL,
+                        payload BLOB NOT NULL,
+                        PRIMARY KEY (namespace, key)
+                    )""")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed)")
+                self._conn = conn
+            except sqlite3.Error:
+                self._disk_failed = True
+        return self._conn
+
+    def _disk_get(self, namespace, key, now):
+        db = self._db()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                f"SELECT expires, payload FROM {self.table} WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            expires, payload = row
+            if expires is not None and expires <= now:
+                db.execute(f"DELETE FROM {self.table} WHERE namespace = ? AND key = ?", (namespace, key))
+                db.commit()
+                return None
+            try:
+                value = pickle.loads(payload)
+            except Exception:
+                # Written by an older version (renamed class, moved module, ...): drop it
+                db.execute(f"DELETE FROM {self.table} WHERE namespace = ? AND key = ?", (namespace, key))
+                db.commit()
+                return None
+            db.execute(f"UPDATE {self.table} SET accessed = ? WHERE namespace = ? AND key = ?",
+                       (now, namespace, key))
+            db.commit()
+            return expires, value
+        except sqlite3.Error:
+            return None
+
+    def _disk_set(self, namespace, key, value, expires, now):
+        db = self._db()
+        if db is None:
+            return
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, expires, now, len(payload), sqlite3.Binary(payload)),
+            )
+            self._evict_disk(db, now)
+            db.commit()
+        except (sqlite3.Error, pickle.PickleError):
+            pass  # Disk caching is best effort
+
+    def _evict_disk(self, db, now):
+        """Drop expired rows, then least recently used rows over the size budget"""
+        db.execute(f"DELETE FROM {self.table} WHERE expires IS NOT NULL AND expires <= ?", (now,))
+        total = db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = db.execute(f"SELECT namespace, key, size FROM {self.table} ORDER BY accessed").fetchall()
+        for namespace, key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            db.execute(f"DELETE FROM {self.table} WHERE namespace = ? AND key = ?", (namespace, key))
+            total -= size
+            self.stats["evictions"] += 1
+
+    # ----- Public API -----
+    def get(self, key, namespace=""):
+        """Return the cached value or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((namespace, key))
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > now:
+                    self._memory.move_to_end((namespace, key))
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[(namespace, key)]
+            entry = self._disk_get(namespace, key, now)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(namespace, key, *entry)
+            return entry[1]
+
+    def set(self, key, value, ttl=None, namespace=""):
+        """Store a value; ttl defaults to default_ttl, None there means no expiry"""
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = None if ttl is None else now + ttl
+        with self._lock:
+            self._remember(namespace, key, expires, value)
+            self._disk_set(namespace, key, value, expires, now)
+
+    def _remember(self, namespace, key, expires, value):
+        self._memory[(namespace, key)] = (expires, value)
+        self._memory.move_to_end((namespace, key))
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, namespace=None):
+        """Remove every entry, or only the entries of one namespace"""
+        with self._lock:
+            if namespace is None:
+                self._memory.clear()
+            else:
+                for cache_key in [k for k in self._memory if k[0] == namespace]:
+                    del self._memory[cache_key]
+            db = self._db()
+            if db is not None:
+                try:
+                    if namespace is None:
+                        db.execute(f"DELETE FROM {self.table}")
+                    else:
+                        db.execute(f"DELETE FROM {self.table} WHERE namespace = ?", (namespace,))
+                    db.commit()
+                except sqlite3.Error:
+                    pass
+
+    def summary(self):
+        """Counters plus current entry counts for display in the sidebar"""
+        with self._lock:
+            info = dict(self.stats, memory_entries=len(self._memory), disk_entries=0, disk_bytes=0)
+            db = self._db()
+            if db is not None:
+                try:
+                    count, size = db.execute(
+                        f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+                    info.update(disk_entries=count, disk_bytes=size)
+                except sqlite3.Error:
+                    pass
+            lookups = info["memory_hits"] + info["disk_hits"] + info["misses"]
+            info["hit_rate"] = (info["memory_hits"] + info["disk_hits"]) / lookups if lookups else 0.0
+            return info
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one upstream call
+
+    The first caller for a key (the leader) does the work; callers that
+    arrive while it is running wait for the leader's result instead of
+    repeating the call. Results are shared, so callers must not mutate them.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "followers": 0}
+
+    def claim(self, key):
+        """Return (future, is_leader); the leader must call resolve() when done"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.stats["followers"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.stats["leaders"] += 1
+            return future, True
+
+    def resolve(self, key, future, result=None, error=None):
+        """Publish the leader's result (or error) to every waiting caller"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func):
+        """Run func() unless an identical call is already in flight"""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    async def do_async(self, key, coro_func):
+        """Async do(); also joins calls started by synchronous callers"""
+        future, leader = self.claim(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await coro_func()
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result
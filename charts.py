@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+
+import tracing
+
+from partitions import ADDITIVE_METRICS
+from prompt_enhancer import analyze_query
+
+# Point budgets per chart type; larger results are reduced before plotting
+MAX_BAR_CATEGORIES = 25
+MAX_PIE_SLICES = 10
+MAX_LINE_POINTS = 2000
+MAX_SCATTER_POINTS = 20000
+
+# Scatters with more points than this are drawn with WebGL (scattergl)
+WEBGL_POINTS = 2000
+
+# Upper bound for the figure JSON sent to the browser and to Kaleido
+MAX_PAYLOAD_BYTES = 2 * 1024 * 1024
+
+OTHER_LABEL = "Other"
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape
+
+    x and y are numeric arrays sorted by x. The first and last points are
+    always kept; every bucket in between contributes the point forming the
+    largest triangle with the previous pick and the next bucket's average.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0] = 0
+    picked[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(area)) if not np.isnan(area).all() else start
+        picked[i + 1] = previous
+    return picked
+
+
+def downsample_series(df, x, y, max_points=MAX_LINE_POINTS):
+    """Sort by x and keep at most max_points rows with LTTB (order kept)"""
+    df = df.sort_values(x)
+    if len(df) <= max_points:
+        return df
+    x_values = df[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype("int64")
+    elif not pd.api.types.is_numeric_dtype(x_values):
+        x_values = np.arange(len(df))
+    y_values = df[y].fillna(0).to_numpy(dtype=np.float64)
+    return df.iloc[lttb(np.asarray(x_values, dtype=np.float64), y_values, max_points)]
+
+
+def top_n(df, label, value, n):
+    """Keep the n-1 largest labels and roll the rest into one "Other" row
+
+    Additive metrics are summed; ratios and user counts can't be added
+    across rows, so "Other" shows their mean instead.
+    """
+    how = "sum" if value in ADDITIVE_METRICS else "mean"
+    grouped = df.groupby(label, observed=True, sort=False)[value].agg(how)
+    grouped = grouped.sort_values(ascending=False)
+    if len(grouped) <= n:
+        return grouped.reset_index()
+    head = grouped.iloc[:n - 1]
+    other = grouped.iloc[n - 1:].agg(how)
+    rolled = pd.DataFrame({
+        label: [str(item) for item in head.index] + [OTHER_LABEL if how == "sum" else f"{OTHER_LABEL} (avg)"],
+        value: list(head.values) + [other],
+    })
+    return rolled
+
+
+def _sample(df, max_points):
+    if len(df) <= max_points:
+        return df
+    return df.sample(n=max_points, random_state=0).sort_index()
+
+
+def _build(df, query, kind, budget):
+    """Reduce df for the chart kind and return (figure, plotted rows)"""
+    import plotly.express as px
+    label, value = df.columns[0], df.columns[1]
+    if kind == "bar":
+        data = top_n(df, label, value, max(2, int(MAX_BAR_CATEGORIES * budget)))
+        return px.bar(data, x=label, y=value, title=f"{query}", color=label), len(data)
+    if kind == "line":
+        data = downsample_series(df, label, value, max(3, int(MAX_LINE_POINTS * budget)))
+        return px.line(data, x=label, y=value, title=f"{query} Trend"), len(data)
+    if kind == "pie":
+        data = top_n(df, label, value, max(2, int(MAX_PIE_SLICES * budget)))
+        return px.pie(data, names=label, values=value, title=f"{query} Distribution"), len(data)
+    data = _sample(df, max(100, int(MAX_SCATTER_POINTS * budget)))
+    render_mode = "webgl" if len(data) > WEBGL_POINTS else "auto"
+    if len(df.columns) >= 3:
+        fig = px.scatter(data, x=df.columns[1], y=df.columns[2], color=df.columns[0],
+                         title=f"{query} Correlation", render_mode=render_mode)
+    else:
+        fig = px.scatter(data, x=label, y=value, title=f"{query} Correlation", render_mode=render_mode)
+    return fig, len(data)
+
+
+def generate_chart(df, query, kind=None):
+    """Build a Plotly figure sized for the browser, whatever the report size
+
+    `kind` is the chart type from prompt_enhancer.analyze_query; when not
+    given it is looked up for `query` (memoized, so this is cheap).
+
+    Large results are reduced first (top-N + "Other" for bar and pie, LTTB
+    for lines, sampling plus WebGL for scatters) and the budget is halved
+    until the figure JSON fits MAX_PAYLOAD_BYTES. Reduced figures carry
+    their row counts in layout.meta, see reduced_view().
+    """
+    if df is None or df.empty or len(df.columns) < 2:
+        return None
+    kind = kind or analyze_query(query).chart_type
+    if kind is None:
+        return None
+    with tracing.span("chart.build", kind=kind, rows=len(df)) as span:
+        budget = 1.0
+        while True:
+            fig, plotted = _build(df, query, kind, budget)
+            size = len(fig.to_json())
+            if budget < 0.05 or size <= MAX_PAYLOAD_BYTES:
+                break
+            budget /= 2
+        if plotted < len(df):
+            fig.update_layout(meta={"reduced": True, "rows": len(df), "plotted": plotted, "kind": kind})
+        span.set(plotted=plotted, bytes=size)
+    return fig
+
+
+def comparison_chart(df, query, metric, periods):
+    """Overlay the periods of a comparison report (see decoder.align_periods)
+
+    Daily reports become one line per period over the day within the
+    period; other reports grouped bars for the current period's largest
+    categories. Each period gets the same point budget as a single chart.
+    """
+    from decoder import PERIOD_COLUMN
+    if df is None or df.empty or PERIOD_COLUMN not in df.columns or metric not in df.columns:
+        return None
+    import plotly.express as px
+    with tracing.span("chart.build", kind="comparison", rows=len(df)) as span:
+        order = {PERIOD_COLUMN: list(periods)}
+        if "day" in df.columns:
+            budget = max(3, MAX_LINE_POINTS // len(periods))
+            data = pd.concat([
+                downsample_series(part, "day", metric, budget)
+                for _, part in df.groupby(PERIOD_COLUMN, observed=True)
+            ])
+            hover = ["date"] if "date" in data.columns else None
+            fig = px.line(data, x="day", y=metric, color=PERIOD_COLUMN, category_orders=order,
+                          hover_data=hover, title=f"{query} Trend")
+            kind = "line"
+        else:
+            label = next((column for column in df.columns
+                          if column not in (PERIOD_COLUMN, metric, "day")
+                          and not pd.api.types.is_numeric_dtype(df[column])), None)
+            if label is None:
+                # Metric-only comparison: one bar per period
+                data = df
+                fig = px.bar(data, x=PERIOD_COLUMN, y=metric, color=PERIOD_COLUMN,
+                             category_orders=order, title=f"{query}")
+            else:
+                current = df[df[PERIOD_COLUMN] == periods[0]]
+                labels = current.groupby(label, observed=True)[metric].sum().nlargest(MAX_BAR_CATEGORIES).index
+                data = df[df[label].isin(labels)]
+                fig = px.bar(data, x=label, y=metric, color=PERIOD_COLUMN, barmode="group",
+                             category_orders=order, title=f"{query}")
+            kind = "comparison"
+        if len(data) < len(df):
+            fig.update_layout(meta={"reduced": True, "rows": len(df), "plotted": len(data), "kind": kind})
+        span.set(plotted=len(data))
+    return fig
+
+
+def reduced_view(fig):
+    """A caption for figures that show a reduced view of the data, else None"""
+    meta = fig.layout.meta if fig is not None else None
+    if not isinstance(meta, dict) or not meta.get("reduced"):
+        return None
+    how = {
+        "bar": "largest categories, the rest grouped as Other",
+        "pie": "largest slices, the rest grouped as Other",
+        "line": "points, downsampled keeping the shape of the series",
+        "scatter": "points, randomly sampled",
+        "comparison": "rows, for the current period's largest categories",
+    }.get(meta.get("kind"), "points")
+    return f"ℹ️ Chart shows {meta['plotted']:,} of {meta['rows']:,} rows ({how}). The table and exports have every row."
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from google.analytics.data_v1beta.types import MetricType
+
+# Bumped whenever decoded DataFrames change shape or dtypes, so cached
+# reports written by an older decoder are not mixed with new ones
+DECODER_VERSION = 2
+
+# Every other metric type (float, currency, seconds, ...) decodes to float64
+INTEGER_METRIC_TYPES = {MetricType.TYPE_INTEGER}
+
+# Column GA4 adds to reports with several date ranges, holding each row's range name
+PERIOD_COLUMN = "dateRange"
+
+# Date-like dimensions and their GA4 string formats
+DATE_DIMENSION_FORMATS = {
+    "date": "%Y%m%d",
+    "firstSessionDate": "%Y%m%d",
+    "dateHour": "%Y%m%d%H",
+    "dateHourMinute": "%Y%m%d%H%M",
+}
+
+
+def _metric_column(values, metric_type):
+    """Parse metric strings straight into an int64/float64 array"""
+    dtype = np.int64 if metric_type in INTEGER_METRIC_TYPES else np.float64
+    try:
+        return np.array(values, dtype=dtype)
+    except (ValueError, OverflowError):
+        # Blank or non-numeric values ("(not set)") become NaN
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+
+
+def _dimension_column(name, values):
+    """Dates become datetime64, every other dimension a category"""
+    date_format = DATE_DIMENSION_FORMATS.get(name)
+    if date_format:
+        return pd.to_datetime(values, format=date_format, errors="coerce")
+    return pd.Categorical(values)
+
+
+def response_to_dataframe(response):
+    """Convert a RunReportResponse into a typed DataFrame
+
+    Values are read column by column from the raw protobuf message, which
+    avoids creating a proto-plus wrapper for every cell. Metric columns use
+    metric_headers[].type_ to pick int64 or float64.
+    """
+    pb = type(response).pb(response) if hasattr(type(response), "pb") else response
+    rows = pb.rows
+    columns = {}
+    for i, header in enumerate(pb.dimension_headers):
+        values = [row.dimension_values[i].value for row in rows]
+        columns[header.name] = _dimension_column(header.name, values)
+    for i, header in enumerate(pb.metric_headers):
+        values = [row.metric_values[i].value for row in rows]
+        columns[header.name] = _metric_column(values, header.type_)
+    df = pd.DataFrame(columns)
+    if len(pb.totals):
+        # Requested with metric_aggregations; covers every row, not just the ones returned
+        df.attrs["totals"] = {
+            header.name: _metric_column([pb.totals[0].metric_values[i].value], header.type_)[0].item()
+            for i, header in enumerate(pb.metric_headers)
+        }
+    return df
+
+
+def concat_frames(frames):
+    """Concatenate decoded pages, keeping dimension columns categorical"""
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    df.attrs = dict(frames[0].attrs)
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype) and df[column].dtype == object:
+            df[column] = union_categoricals([frame[column] for frame in frames])
+    return df
+
+
+def align_periods(df, date_column="date"):
+    """Add a "day" column counting days from the start of each row's period
+
+    Reports with several date ranges carry the range name in PERIOD_COLUMN;
+    "day" lines up the daily trend of one period with the other. The
+    start is each period's first day with data.
+    """
+    if PERIOD_COLUMN not in df.columns or date_column not in df.columns:
+        return df
+    df = df.copy()
+    start = df.groupby(PERIOD_COLUMN, observed=True)[date_column].transform("min")
+    df["day"] = (df[date_column] - start).dt.days
+    return df
+
+
+def compare_periods(df, metrics, periods):
+    """Wide comparison frame: each metric per period plus its change against the first
+
+    `df` is a decoded report with several date ranges and `periods` their
+    names, current period first. Rows are dimension values (or the day
+    within the period); GA4 leaves out rows whose metrics are all zero, so
+    a value missing from one period is 0 there. Percent changes from 0 are NaN.
+    """
+    if df.empty or PERIOD_COLUMN not in df.columns:
+        return df
+    df = align_periods(df)
+    keys = [column for column in df.columns
+            if column not in metrics and column != PERIOD_COLUMN and not (column == "date" and "day" in df)]
+    if keys:
+        values = df.groupby(keys + [PERIOD_COLUMN], observed=True)[metrics].sum().unstack(PERIOD_COLUMN)
+    else:
+        # Metric-only reports have one row per period; unstacking those gives a Series
+        values = df.groupby(PERIOD_COLUMN, observed=True)[metrics].sum().unstack().to_frame().T
+    values = values.reindex(columns=pd.MultiIndex.from_product([metrics, periods])).fillna(0)
+
+    current, baselines = periods[0], periods[1:]
+    columns = {}
+    for metric in metrics:
+        for period in periods:
+            values[(metric, period)] = values[(metric, period)].astype(df[metric].dtype)
+            columns[f"{metric} ({period})"] = values[(metric, period)]
+        for baseline in baselines:
+            change = values[(metric, current)] - values[(metric, baseline)]
+            columns[f"{metric} change vs {baseline}"] = change
+            columns[f"{metric} % change vs {baseline}"] = (
+                change / values[(metric, baseline)].replace(0, np.nan) * 100
+            )
+    wide = pd.DataFrame(columns, index=values.index).reset_index(drop=not keys)
+    if "day" in wide:
+        return wide.sort_values("day", ignore_index=True)
+    return wide.sort_values(f"{metrics[0]} ({current})", ascending=False, ignore_index=True)
@@ -1,113 +1,353 @@
 import pandas as pd
 import io
-from fpdf import FPDF
-from docx import Document
-import plotly.io as pio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from cache import SingleFlight
+import tracing
+
+# fpdf, python-docx, openpyxl, pyarrow and plotly.io are imported inside the
+# writers that need them, so importing this module stays cheap on every rerun
+
+# Rendered chart PNGs and built export files, most recently used last
+PNG_CACHE_SIZE = 16
+EXPORT_CACHE_SIZE = 16
+# Built files are shared by every session; large reports are bounded by size, not count
+EXPORT_CACHE_MB = int(os.environ.get("GA4_EXPORT_CACHE_MB", 128))
+_png_cache = OrderedDict()
+_export_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_inflight = SingleFlight()
+
+def _cache_get(store, key):
+    with _cache_lock:
+        if key in store:
+            store.move_to_end(key)
+            return store[key]
+    return None
+
+def _cache_put(store, key, value, size, max_bytes=None):
+    with _cache_lock:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > size:
+            store.popitem(last=False)
+        if max_bytes is not None:
+            # The newest file stays even when it alone is over the limit
+            total = sum(len(data) for data in store.values())
+            while total > max_bytes and len(store) > 1:
+                total -= len(store.popitem(last=False)[1])
+
+def figure_fingerprint(fig):
+    """Hash of everything that affects how a figure renders (data and layout)"""
+    return hashlib.sha256(fig.to_json().encode("utf-8")).hexdigest()
+
+def report_fingerprint(df, fig=None):
+    """Hash of a report table plus its chart, used to key built exports"""
+    digest = hashlib.sha256()
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    if fig is not None:
+        digest.update(figure_fingerprint(fig).encode("utf-8"))
+    return digest.hexdigest()
+
+def chart_png(fig):
+    """Render a figure to PNG through Kaleido once; every export reuses the image"""
+    with tracing.span("export.png") as span:
+        key = figure_fingerprint(fig)
+        img_bytes = _cache_get(_png_cache, key)
+        span.set(cache="miss" if img_bytes is None else "hit")
+        if img_bytes is None:
+            import plotly.io as pio
+            img_bytes = _inflight.do(("png", key), lambda: pio.to_image(fig, format="png", engine="kaleido"))
+            _cache_put(_png_cache, key, img_bytes, PNG_CACHE_SIZE)
+        span.set(bytes=len(img_bytes))
+    return img_bytes
+
+# Rows converted at a time when writing large tables
+CHUNK_ROWS = 5000
+
+def iter_chunks(data, chunk_rows=None):
+    """Yield DataFrame chunks from a DataFrame or any iterable of DataFrames"""
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+    for frame in frames:
+        if chunk_rows is None or len(frame) <= chunk_rows:
+            yield frame
+        else:
+            for start in range(0, len(frame), chunk_rows):
+                yield frame.iloc[start:start + chunk_rows]
+
+def _peek_columns(data, chunk_rows=CHUNK_ROWS):
+    """Column names plus a chunk iterator that still includes the first chunk"""
+    chunks = iter_chunks(data, chunk_rows)
+    first = next(chunks, None)
+    if first is None:
+        return [], iter(())
+    def all_chunks():
+        yield first
+        yield from chunks
+    return list(first.columns), all_chunks()
+
+def _text_rows(chunk):
+    """Rows of display strings: dates without midnight times, blanks for missing values"""
+    columns = []
+    for name in chunk.columns:
+        col = chunk[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            midnight = (col.dropna().dt.normalize() == col.dropna()).all()
+            text = col.dt.strftime("%Y-%m-%d" if midnight else "%Y-%m-%d %H:%M")
+        elif pd.api.types.is_float_dtype(col):
+            text = col.map(lambda value: f"{value:,.4f}".rstrip("0").rstrip("."))
+        else:
+            text = col.astype(str)
+        columns.append(text.where(col.notna(), "").tolist())
+    return zip(*columns)
+
+def _cell_values(chunk):
+    """Rows of Python values for spreadsheet cells (NaN/NaT become empty cells)"""
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+def to_csv(data):
+    """Export a DataFrame, or a stream of DataFrame chunks (e.g. ga_query.iter_report_pages), to CSV"""
+    output = io.StringIO()
+    header = True
+    for chunk in iter_chunks(data):
+        chunk.to_csv(output, index=False, header=header)
+        header = False
+    return output.getvalue().encode("utf-8")
+
+def to_csv_gzip(data):
+    """Gzip-compressed CSV, written chunk by chunk"""
+    import gzip
+    output = io.BytesIO()
+    with gzip.GzipFile(fileobj=output, mode="wb", compresslevel=6) as gz:
+        header = True
+        for chunk in iter_chunks(data, CHUNK_ROWS):
+            gz.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+            header = False
+    return output.getvalue()
+
+def _arrow_tables(data):
+    """Yield pyarrow Tables with one fixed schema from a DataFrame or chunk stream
+
+    Categorical columns keep one growing category list, so every chunk's
+    dictionary extends the previous one (IPC files only allow deltas).
+    Dictionary indices are widened to int32 for the same reason.
+    """
+    import pyarrow as pa
+    categories = {}
+    schema = None
+    for chunk in iter_chunks(data, CHUNK_ROWS):
+        updates = {}
+        for name in chunk.columns:
+            if isinstance(chunk[name].dtype, pd.CategoricalDtype):
+                known = categories.get(name, pd.Index([], dtype=object))
+                new = pd.Index(chunk[name].cat.categories).difference(known, sort=False)
+                categories[name] = known.append(new)
+                updates[name] = chunk[name].cat.set_categories(categories[name])
+        if updates:
+            chunk = chunk.assign(**updates)
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if schema is None:
+            fields = [
+                pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type))
+                if pa.types.is_dictionary(f.type) else f
+                for f in table.schema
+            ]
+            schema = pa.schema(fields, metadata=table.schema.metadata)
+        yield table.cast(schema)
+
+def to_parquet(data, compression="snappy"):
+    """Parquet export (snappy or zstd) that keeps dates, ints, floats and categories typed"""
+    import pyarrow.parquet as pq
+    output = io.BytesIO()
+    writer = None
+    for table in _arrow_tables(data):
+        if writer is None:
+            writer = pq.ParquetWriter(output, table.schema, compression=compression)
+        writer.write_table(table)
+    if writer is None:
+        return b""
+    writer.close()
+    return output.getvalue()
+
+def to_feather(data, compression="zstd"):
+    """Feather v2 (Arrow IPC file) export, compressed with zstd or lz4"""
+    import pyarrow as pa
+    output = io.BytesIO()
+    writer = None
+    for table in _arrow_tables(data):
+        if writer is None:
+            options = pa.ipc.IpcWriteOptions(compression=compression, emit_dictionary_deltas=True)
+            writer = pa.ipc.new_file(output, table.schema, options=options)
+        writer.write_table(table)
+    if writer is None:
+        return b""
+    writer.close()
+    return output.getvalue()
 
 def to_excel(df, fig=None):
-    """Export DataFrame to Excel, optionally with chart as image (if fig provided)"""
+    """Export a DataFrame or chunk stream to Excel, optionally with the chart as an image
+
+    Uses openpyxl's write-only mode: rows are streamed to disk as they are
+    appended instead of building every cell object in memory.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Analytics Report')
+    columns, chunks = _peek_columns(df)
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+    for chunk in chunks:
+        for row in _cell_values(chunk):
+            ws.append(row)
+    if fig is not None:
+        try:
+            from openpyxl.drawing.image import Image as XLImage
+            ws.add_image(XLImage(io.BytesIO(chart_png(fig))), 'E2')
+        except Exception as e:
+            pass  # Chart embedding is best effort
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Analytics Report')
-        if fig is not None:
-            try:
-                import openpyxl
-                from openpyxl.drawing.image import Image as XLImage
-                import tempfile
-                img_bytes = pio.to_image(fig, format="png")
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_img:
-                    tmp_img.write(img_bytes)
-                    tmp_img.flush()
-                    wb = writer.book
-                    ws = writer.sheets['Analytics Report']
-                    img = XLImage(tmp_img.name)
-                    ws.add_image(img, 'E2')
-            except Exception as e:
-                pass  # Chart embedding is best effort
+    wb.save(output)
     return output.getvalue()
 
+def _latin1(text):
+    # The core PDF fonts only cover latin-1
+    return text.encode("latin-1", "replace").decode("latin-1")
+
 def to_pdf(df, fig=None, title="Analytics Report"):
-    """Export DataFrame to PDF with optional chart image"""
-    import tempfile
+    """Export a DataFrame or chunk stream to PDF with optional chart image
+
+    The table is written chunk by chunk and continues over as many pages
+    as needed, repeating the header row at the top of each page.
+    """
+    from fpdf import FPDF
     pdf = FPDF()
+    pdf.set_auto_page_break(False)
     pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, title, 0, 1, 'C')
+    pdf.set_font("Helvetica", 'B', 16)
+    pdf.cell(0, 10, _latin1(title), 0, 1, 'C')
     pdf.ln(5)
-    img_path = None
     # Add chart if exists
     if fig is not None:
         try:
-            img_bytes = pio.to_image(fig, format="png", engine="kaleido")
-            img_path = "temp_chart.png"
-            with open(img_path, "wb") as f:
-                f.write(img_bytes)
-            pdf.image(img_path, x=10, w=190)
+            pdf.image(io.BytesIO(chart_png(fig)), x=10, w=190)
             pdf.ln(5)
         except Exception as e:
             pass
     # Table
-    pdf.set_font("Arial", size=12)
-    col_width = pdf.w / (len(df.columns) + 1)
+    columns, chunks = _peek_columns(df)
+    pdf.set_font("Helvetica", size=12)
+    col_width = pdf.w / (len(columns) + 1)
     row_height = pdf.font_size * 1.5
-    pdf.set_fill_color(200, 220, 255)
-    for col in df.columns:
-        pdf.cell(col_width, row_height, str(col), border=1, fill=True)
-    pdf.ln(row_height)
-    pdf.set_fill_color(255, 255, 255)
-    for _, row in df.iterrows():
-        for col in df.columns:
-            pdf.cell(col_width, row_height, str(row[col]), border=1)
+    header = [_latin1(str(col)) for col in columns]
+
+    def table_header():
+        pdf.set_fill_color(200, 220, 255)
+        for text in header:
+            pdf.cell(col_width, row_height, text, border=1, fill=True)
         pdf.ln(row_height)
+
+    table_header()
+    for chunk in chunks:
+        for row in _text_rows(chunk):
+            if pdf.get_y() + row_height > pdf.page_break_trigger:
+                pdf.add_page()
+                table_header()
+            for text in row:
+                pdf.cell(col_width, row_height, _latin1(text), border=1)
+            pdf.ln(row_height)
+    if pdf.get_y() + 20 > pdf.page_break_trigger:
+        pdf.add_page()
     pdf.ln(10)
     pdf.set_font_size(10)
     pdf.cell(0, 10, "Generated by GA4 Analytics Assistant", 0, 0, 'C')
-    output = pdf.output(dest='S').encode('latin1')
-    # Cleanup temp file
-    import os
-    if img_path and os.path.exists(img_path):
-        os.remove(img_path)
-    return output
+    return bytes(pdf.output())
+
+def _word_rows_xml(rows):
+    """WordprocessingML for table rows, built as one string per chunk"""
+    from xml.sax.saxutils import escape
+    parts = []
+    for row in rows:
+        parts.append("<w:tr>")
+        for text in row:
+            parts.append(
+                f'<w:tc><w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p></w:tc>'
+            )
+        parts.append("</w:tr>")
+    return "".join(parts)
 
 def to_word(df, fig=None, title="Analytics Report"):
-    """Export DataFrame to Word document with optional chart image"""
-    import tempfile
+    """Export a DataFrame or chunk stream to a Word document with optional chart image
+
+    Data rows are generated as table XML in bulk, one chunk at a time;
+    python-docx's add_row() rescans the whole table per row and gets
+    quadratic on large reports.
+    """
+    from docx import Document
     from docx.shared import Inches
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
     doc = Document()
     doc.add_heading(title, 0)
-    img_path = None
     # Add chart if exists
     if fig is not None:
         try:
-            img_bytes = pio.to_image(fig, format="png", engine="kaleido")
-            img_path = "temp_chart.png"
-            with open(img_path, "wb") as f:
-                f.write(img_bytes)
-            doc.add_picture(img_path, width=Inches(5.5))
+            doc.add_picture(io.BytesIO(chart_png(fig)), width=Inches(5.5))
         except Exception as e:
             pass
     # Add table
-    table = doc.add_table(rows=1, cols=len(df.columns))
+    columns, chunks = _peek_columns(df)
+    table = doc.add_table(rows=1, cols=max(len(columns), 1))
     table.style = 'Table Grid'
     # Header row
     hdr_cells = table.rows[0].cells
-    for i, col in enumerate(df.columns):
+    for i, col in enumerate(columns):
         hdr_cells[i].text = str(col)
     # Data rows
-    for _, row in df.iterrows():
-        row_cells = table.add_row().cells
-        for i, col in enumerate(df.columns):
-            row_cells[i].text = str(row[col])
+    tbl = table._tbl
+    for chunk in chunks:
+        fragment = parse_xml(f"<w:tbl {nsdecls('w')}>{_word_rows_xml(_text_rows(chunk))}</w:tbl>")
+        for tr in list(fragment):
+            tbl.append(tr)
     # Footer
     doc.add_paragraph("Generated by GA4 Analytics Assistant")
     doc_stream = io.BytesIO()
     doc.save(doc_stream)
-    # Cleanup
-    import os
-    if 'img_path' in locals() and img_path and os.path.exists(img_path):
-        os.remove(img_path)
-    return doc_stream.getvalue()
-    doc.add_paragraph("Generated by GA4 Analytics Assistant")
-    doc_stream = io.BytesIO()
-    doc.save(doc_stream)
     return doc_stream.getvalue()
+
+# Export builders by format; each takes (df, fig)
+EXPORTERS = {
+    "csv": lambda df, fig=None: to_csv(df),
+    "csv.gz": lambda df, fig=None: to_csv_gzip(df),
+    "parquet": lambda df, fig=None: to_parquet(df, compression="zstd"),
+    "feather": lambda df, fig=None: to_feather(df),
+    "xlsx": to_excel,
+    "pdf": to_pdf,
+    "docx": to_word,
+}
+
+def cached_export(fmt, fingerprint):
+    """Bytes of an export already built for this report fingerprint, or None"""
+    return _cache_get(_export_cache, (fingerprint, fmt))
+
+def build_export(fmt, df, fig=None, fingerprint=None):
+    """Build one export format on demand, reusing an earlier build of the same report"""
+    with tracing.span(f"export.{fmt}", rows=len(df)) as span:
+        fingerprint = fingerprint or report_fingerprint(df, fig)
+        data = cached_export(fmt, fingerprint)
+        span.set(cache="miss" if data is None else "hit")
+        if data is None:
+            data = _inflight.do((fmt, fingerprint), lambda: EXPORTERS[fmt](df, fig=fig))
+            _cache_put(_export_cache, (fingerprint, fmt), data, EXPORT_CACHE_SIZE,
+                       max_bytes=EXPORT_CACHE_MB * 1024 * 1024)
+        span.set(bytes=len(data))
+    return data
@@ -0,0 +1,284 @@
+"""In-process stand-in for the GA4 Data API, for offline runs and benchmarks
+
+FakeDataClient answers run_report, batch_run_reports and get_metadata with
+synthetic responses shaped like the real ones: one row per combination of
+dimension values (every day of the range for date dimensions), a
+dateRange column when several ranges are asked for, limit/offset paging,
+totals, and property_quota token accounting. Filters and ordering are not
+applied. Values are deterministic, so the same request gives the same
+response.
+
+    GA4_FAKE_API=1 streamlit run app.py
+
+or, in code, ga_query.set_client_factory(*fake_ga.client_factory()).
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsResponse, Metadata, MetricType, RunReportResponse,
+)
+from google.api_core.exceptions import ResourceExhausted
+
+# Distinct values per dimension, unless listed in DIMENSION_VALUES
+FAKE_CARDINALITY = int(os.environ.get("GA4_FAKE_CARDINALITY", 50))
+
+# Simulated round trip per call, plus a transfer cost per returned row
+FAKE_LATENCY_MS = float(os.environ.get("GA4_FAKE_LATENCY_MS", 0))
+FAKE_LATENCY_PER_1K_ROWS_MS = float(os.environ.get("GA4_FAKE_LATENCY_PER_1K_ROWS_MS", 0))
+
+# Share of calls failing with ResourceExhausted, as when a quota is hit
+FAKE_QUOTA_ERROR_RATE = float(os.environ.get("GA4_FAKE_QUOTA_ERROR_RATE", 0))
+
+# Hourly and daily token budgets of a standard GA4 property, refilled each window
+TOKENS_PER_HOUR = 40000
+TOKENS_PER_DAY = 200000
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Connection details the app uses when GA4_FAKE_API is set
+FAKE_PROPERTY_ID = "000000000"
+FAKE_CREDENTIALS = {
+    "type": "service_account",
+    "client_email": "fake-ga4@offline.invalid",
+    "private_key_id": "fake",
+}
+
+# Realistic values for low-cardinality dimensions
+DIMENSION_VALUES = {
+    "deviceCategory": ["desktop", "mobile", "tablet"],
+    "newVsReturning": ["new", "returning"],
+    "platform": ["web", "Android", "iOS"],
+    "sessionMedium": ["organic", "(none)", "referral", "cpc", "email"],
+    "sessionDefaultChannelGroup": ["Organic Search", "Direct", "Referral", "Paid Search",
+                                   "Organic Social", "Email"],
+    "country": ["United States", "United Kingdom", "Germany", "France", "India", "Canada",
+                "Australia", "Brazil", "Japan", "Spain", "Italy", "Netherlands", "Mexico",
+                "Poland", "Sweden"],
+}
+
+# Metrics decoded as floats, with the range of their values
+FLOAT_METRICS = {
+    "bounceRate": (MetricType.TYPE_FLOAT, 1.0),
+    "engagementRate": (MetricType.TYPE_FLOAT, 1.0),
+    "averageSessionDuration": (MetricType.TYPE_SECONDS, 600.0),
+    "userEngagementDuration": (MetricType.TYPE_SECONDS, 36000.0),
+    "totalRevenue": (MetricType.TYPE_CURRENCY, 5000.0),
+    "purchaseRevenue": (MetricType.TYPE_CURRENCY, 5000.0),
+}
+MAX_INTEGER_VALUE = 5000
+
+# Metrics whose totals are averages rather than sums
+AVERAGED_METRICS = {"bounceRate", "engagementRate", "averageSessionDuration"}
+
+_DATE_FORMATS = {"date": "%Y%m%d", "dateHour": "%Y%m%d%H", "firstSessionDate": "%Y%m%d"}
+
+
+def _dates(date_range):
+    import ga_query
+    start = ga_query.resolve_date(date_range.start_date)
+    end = ga_query.resolve_date(date_range.end_date)
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+class FakeDataClient:
+    """Synchronous fake of BetaAnalyticsDataClient
+
+    `cardinality` is the number of values per dimension, as an int or a
+    {dimension: count} dict (other dimensions use FAKE_CARDINALITY).
+    """
+
+    def __init__(self, cardinality=None, latency_ms=None, latency_per_1k_rows_ms=None,
+                 quota_error_rate=None, seed=0):
+        if isinstance(cardinality, dict):
+            self.cardinality = dict(cardinality)
+            self.default_cardinality = FAKE_CARDINALITY
+        else:
+            self.cardinality = {}
+            self.default_cardinality = cardinality or FAKE_CARDINALITY
+        self.latency_ms = FAKE_LATENCY_MS if latency_ms is None else latency_ms
+        self.latency_per_1k_rows_ms = (FAKE_LATENCY_PER_1K_ROWS_MS if latency_per_1k_rows_ms is None
+                                       else latency_per_1k_rows_ms)
+        self.quota_error_rate = FAKE_QUOTA_ERROR_RATE if quota_error_rate is None else quota_error_rate
+        self.calls = 0
+        self.tokens_used = 0
+        self.tokens_used_today = 0
+        self.hour_started = self.day_started = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.transport = _Transport()
+
+    def _values(self, name, date_range):
+        """Every value a dimension takes in one date range"""
+        if name in _DATE_FORMATS:
+            return [day.strftime(_DATE_FORMATS[name]) for day in _dates(date_range)]
+        if name in self.cardinality:
+            count = self.cardinality[name]
+        elif name in DIMENSION_VALUES:
+            return DIMENSION_VALUES[name]
+        else:
+            count = self.default_cardinality
+        known = DIMENSION_VALUES.get(name, [])
+        return known[:count] + [f"{name} {i}" for i in range(len(known), count)]
+
+    def _roll_windows(self, now):
+        """Start new hourly and daily quota windows once the current ones are over"""
+        if now - self.hour_started >= HOUR:
+            self.tokens_used = 0
+            self.hour_started = now
+        if now - self.day_started >= DAY:
+            self.tokens_used_today = 0
+            self.day_started = now
+
+    def _admit(self, rows):
+        """Count the call against the token budget; returns (tokens, delay) or raises"""
+        with self._lock:
+            self.calls += 1
+            if self._random.random() < self.quota_error_rate:
+                raise ResourceExhausted("Fake GA4 API: simulated quota error")
+            self._roll_windows(time.monotonic())
+            tokens = 1 + rows // 10000
+            if self.tokens_used + tokens > TOKENS_PER_HOUR:
+                raise ResourceExhausted("Fake GA4 API: hourly token quota exhausted")
+            if self.tokens_used_today + tokens > TOKENS_PER_DAY:
+                raise ResourceExhausted("Fake GA4 API: daily token quota exhausted")
+            self.tokens_used += tokens
+            self.tokens_used_today += tokens
+        return tokens, (self.latency_ms + self.latency_per_1k_rows_ms * rows / 1000) / 1000
+
+    def _respond(self, request):
+        """Build the response for a RunReportRequest and the simulated delay"""
+        dimensions = [dim.name for dim in request.dimensions]
+        metrics = [metric.name for metric in request.metrics]
+        ranges = list(request.date_ranges)
+        # One block of rows per date range, every combination of dimension values in each
+        blocks = []
+        for i, date_range in enumerate(ranges):
+            columns = [self._values(name, date_range) for name in dimensions]
+            if len(ranges) > 1:
+                columns.append([date_range.name or f"date_range_{i}"])
+            blocks.append(columns)
+        if len(ranges) > 1:
+            dimensions.append("dateRange")
+        sizes = [int(np.prod([len(values) for values in columns])) for columns in blocks]
+        total = sum(sizes)
+        offset = min(request.offset, total)
+        limit = request.limit or total
+        index = np.arange(offset, min(total, offset + limit), dtype=np.int64)
+        tokens, delay = self._admit(len(index))
+
+        pb = RunReportResponse.pb(RunReportResponse())
+        for name in dimensions:
+            pb.dimension_headers.add(name=name)
+        metric_values = []
+        for position, name in enumerate(metrics):
+            metric_type, scale = FLOAT_METRICS.get(name, (MetricType.TYPE_INTEGER, None))
+            pb.metric_headers.add(name=name, type_=metric_type)
+            metric_values.append(self._metric(position, scale, index))
+
+        row_number = 0
+        block_start = 0
+        for columns, size in zip(blocks, sizes):
+            local = index[(index >= block_start) & (index < block_start + size)] - block_start
+            block_start += size
+            # Mixed-radix digits of the row number pick each dimension's value
+            strides = np.cumprod([1] + [len(values) for values in columns[:0:-1]])[::-1]
+            digits = [(local // stride) % len(values) for stride, values in zip(strides, columns)]
+            for position in range(len(local)):
+                row = pb.rows.add()
+                for values, digit in zip(columns, digits):
+                    row.dimension_values.add(value=values[digit[position]])
+                for values in metric_values:
+                    row.metric_values.add(value=values[row_number])
+                row_number += 1
+        pb.row_count = total
+
+        if request.metric_aggregations:
+            everything = np.arange(total, dtype=np.int64)
+            totals = pb.totals.add()
+            for _ in dimensions:
+                totals.dimension_values.add(value="RESERVED_TOTAL")
+            for position, name in enumerate(metrics):
+                scale = FLOAT_METRICS.get(name, (None, None))[1]
+                values = self._metric(position, scale, everything, as_text=False)
+                total_value = values.mean() if name in AVERAGED_METRICS else values.sum()
+                totals.metric_values.add(value=repr(total_value.item()))
+
+        if request.return_property_quota:
+            with self._lock:
+                used, used_today = self.tokens_used, self.tokens_used_today
+            pb.property_quota.tokens_per_hour.consumed = tokens
+            pb.property_quota.tokens_per_hour.remaining = TOKENS_PER_HOUR - used
+            pb.property_quota.tokens_per_day.consumed = tokens
+            pb.property_quota.tokens_per_day.remaining = TOKENS_PER_DAY - used_today
+        return RunReportResponse.wrap(pb), delay
+
+    @staticmethod
+    def _metric(position, scale, index, as_text=True):
+        """Deterministic pseudo-random values for one metric column"""
+        mixed = (index * 2654435761 + position * 40503) % 1000003
+        if scale is None:
+            # GA4 leaves out rows of zeros, so every value is at least 1
+            values = mixed % MAX_INTEGER_VALUE + 1
+            return values.astype(str).tolist() if as_text else values
+        values = (mixed % 100000) / 100000 * scale
+        return [f"{value:.6f}" for value in values] if as_text else values
+
+    def reset_quota(self):
+        with self._lock:
+            self.tokens_used = self.tokens_used_today = 0
+            self.hour_started = self.day_started = time.monotonic()
+
+    def run_report(self, request=None, **kwargs):
+        response, delay = self._respond(request)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    def batch_run_reports(self, request=None, **kwargs):
+        reports = [self.run_report(report) for report in request.requests]
+        return BatchRunReportsResponse(reports=reports)
+
+    def get_metadata(self, name=None, **kwargs):
+        from ga_schema import BUILTIN_DIMENSIONS, BUILTIN_METRICS
+        return Metadata(
+            name=name,
+            dimensions=[{"api_name": dim, "ui_name": dim} for dim in BUILTIN_DIMENSIONS],
+            metrics=[{"api_name": metric, "ui_name": metric} for metric in BUILTIN_METRICS],
+        )
+
+
+class FakeAsyncDataClient:
+    """Async fake of BetaAnalyticsDataAsyncClient, sharing a FakeDataClient's data and quota"""
+
+    def __init__(self, client=None):
+        self.client = client or FakeDataClient()
+        self.transport = _AsyncTransport()
+
+    async def run_report(self, request=None, **kwargs):
+        response, delay = self.client._respond(request)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+
+class _Transport:
+    def close(self):
+        pass
+
+
+class _AsyncTransport:
+    async def close(self):
+        pass
+
+
+def client_factory(client=None):
+    """Client factories for ga_query.set_client_factory, all sharing one FakeDataClient"""
+    client = client or FakeDataClient()
+    return (lambda credentials_info, scopes: client,
+            lambda credentials_info, scopes: FakeAsyncDataClient(client))
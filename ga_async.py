@@ -0,0 +1,205 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import pandas as pd
+import streamlit as st
+from google.analytics.data_v1beta import BetaAnalyticsDataAsyncClient
+from google.analytics.data_v1beta.types import RunReportRequest
+from google.oauth2 import service_account
+
+import ga_query
+import tracing
+from decoder import concat_frames, response_to_dataframe
+from ga_scheduler import INTERACTIVE, get_scheduler
+
+# API calls allowed in flight at once for one batch of concurrent reports
+MAX_CONCURRENT_REPORTS = int(os.environ.get("GA4_MAX_CONCURRENT_REPORTS", 6))
+
+# Responses larger than this are decoded in a worker thread, off the event loop
+DECODE_IN_THREAD_ROWS = 10000
+
+# Async clients are bound to the event loop that created them: {loop: {client_key: client}}
+_async_pools = weakref.WeakKeyDictionary()
+_async_pools_lock = threading.Lock()
+
+# Long-lived loop used by the sync facade, so pooled clients survive between reruns
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_async_client(credentials_info, scopes=ga_query.GA_SCOPES):
+    """Return a pooled BetaAnalyticsDataAsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    factory = ga_query.client_factories()[1]
+    key = ga_query.client_key(credentials_info, scopes)
+    with _async_pools_lock:
+        pool = _async_pools.setdefault(loop, {})
+        client = pool.get(key)
+        if client is None:
+            if factory is not None:
+                client = factory(credentials_info, scopes)
+            else:
+                credentials = service_account.Credentials.from_service_account_info(
+                    credentials_info, scopes=list(scopes)
+                )
+                client = BetaAnalyticsDataAsyncClient(credentials=credentials)
+            pool[key] = client
+    return client
+
+
+def _release_async_clients(credentials_info):
+    """Close async clients when ga_query.release_client drops the sync ones"""
+    email = None if credentials_info is None else credentials_info.get("client_email", "")
+    with _async_pools_lock:
+        for loop, pool in list(_async_pools.items()):
+            for key in [key for key in pool if email is None or key[0] == email]:
+                client = pool.pop(key)
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(
+                        lambda client=client: asyncio.ensure_future(client.transport.close())
+                    )
+
+
+ga_query.on_release(_release_async_clients)
+
+
+async def _decode(response):
+    with tracing.span("ga.decode", rows=len(response.rows)):
+        if len(response.rows) > DECODE_IN_THREAD_ROWS:
+            return await asyncio.to_thread(response_to_dataframe, response)
+        return response_to_dataframe(response)
+
+
+async def fetch_report_async(request, credentials_info, semaphore=None, use_cache=True,
+                             priority=INTERACTIVE):
+    """Async counterpart of ga_query.fetch_report, raising API errors
+
+    Every run_report call (including extra pages) waits on `semaphore`,
+    so callers sharing one semaphore share one concurrency budget, and then
+    on the process-wide quota scheduler. Reports that split by day are
+    rebuilt from the same day partitions as the sync path.
+    """
+    semaphore = semaphore or asyncio.Semaphore(MAX_CONCURRENT_REPORTS)
+    with tracing.span("ga.report", property=request.property) as span:
+        df = await _fetch_report_async(request, credentials_info, semaphore, use_cache, priority, span)
+        span.set(rows=len(df))
+        return df
+
+
+async def _fetch_report_async(request, credentials_info, semaphore, use_cache, priority, span):
+    cache = ga_query.get_report_cache()
+    key = ga_query.request_key(request)
+    if use_cache:
+        cached = cache.get(key, namespace=request.property)
+        if cached is not None:
+            span.set(cache="hit")
+            return cached.copy()
+    span.set(cache="miss")
+
+    client = get_async_client(credentials_info)
+    scheduler = get_scheduler()
+    page_size = ga_query.REPORT_PAGE_SIZE
+    cap = request.limit or None
+
+    # Extra pages of this report in flight at once, as for ga_query.iter_report_pages
+    pages = asyncio.Semaphore(ga_query.MAX_PAGE_WORKERS)
+
+    async def fetch_page(offset):
+        page = RunReportRequest(request)
+        page.offset = request.offset + offset
+        page.limit = page_size if cap is None else min(page_size, cap - offset)
+        async with pages, semaphore:
+            with tracing.span("ga.run_report", offset=page.offset) as page_span:
+                return ga_query.trace_response(page_span, await scheduler.call_async(
+                    request.property, lambda: client.run_report(page), priority
+                ))
+
+    async def fetch():
+        df = None
+        if use_cache and ga_query.partition_range(request) is not None:
+            # Settled days come from the shared day partitions; only missing days are fetched
+            df = await asyncio.to_thread(ga_query.fetch_partitioned, request, credentials_info, priority)
+        if df is None:
+            first = await fetch_page(0)
+            total = first.row_count if cap is None else min(first.row_count, cap)
+            rest = await asyncio.gather(*(fetch_page(offset) for offset in range(page_size, total, page_size)))
+            df = concat_frames([await _decode(response) for response in [first, *rest]])
+        cache.set(key, df, ttl=ga_query.report_ttl(request), namespace=request.property)
+        return df
+
+    # Joins an identical request already running in any session, sync or async
+    df = await ga_query.get_inflight().do_async(key, fetch)
+    return df.copy()
+
+
+async def run_reports_async(requests, credentials_info, max_concurrency=None, use_cache=True,
+                            priority=INTERACTIVE):
+    """Fetch several reports concurrently with at most max_concurrency calls in flight
+
+    Returns a DataFrame, or the exception that request raised, for each
+    request in order. One failing report does not cancel the others.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or MAX_CONCURRENT_REPORTS)
+    return await asyncio.gather(
+        *(fetch_report_async(request, credentials_info, semaphore, use_cache, priority)
+          for request in requests),
+        return_exceptions=True,
+    )
+
+
+async def run_ga_report_async(dimensions, metrics, property_id, credentials_info,
+                              date_range="30daysAgo", use_cache=True):
+    """Async counterpart of ga_query.run_ga_report for code running in an event loop
+
+    Credentials are passed explicitly because st.session_state is only
+    available on the Streamlit script thread. API errors are raised.
+    """
+    request = ga_query.build_report_request(property_id, dimensions, metrics, date_range)
+    return await fetch_report_async(request, credentials_info, use_cache=use_cache)
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="ga4-async", daemon=True).start()
+        return _loop
+
+
+def run_ga_reports_concurrently(reports, use_cache=True, max_concurrency=None, priority=INTERACTIVE):
+    """Run report dicts concurrently from the Streamlit script, with friendly errors
+
+    Total latency is that of the slowest report rather than the sum.
+    Returns one DataFrame per report, empty for reports that failed.
+    """
+    if not st.session_state.get('ga_credentials'):
+        st.error("🔌 Please connect Google Analytics first using the sidebar")
+        return [pd.DataFrame() for _ in reports]
+
+    credentials_info = st.session_state.ga_credentials
+    try:
+        requests = ga_query.build_report_requests(st.session_state.ga_property_id, reports)
+        parent = tracing.current()
+
+        async def run():
+            # The loop thread has its own context; report spans belong to the caller's trace
+            with tracing.attach(parent):
+                return await run_reports_async(requests, credentials_info, max_concurrency, use_cache, priority)
+
+        future = asyncio.run_coroutine_threadsafe(run(), _background_loop())
+        results = future.result()
+    except Exception as e:
+        ga_query.show_report_error(e)
+        return [pd.DataFrame() for _ in reports]
+
+    frames = []
+    for result in results:
+        if isinstance(result, Exception):
+            ga_query.show_report_error(result)
+            frames.append(pd.DataFrame())
+        else:
+            frames.append(result)
+    return frames
@@ -1,73 +1,711 @@
 from google.analytics.data_v1beta import BetaAnalyticsDataClient
 from google.analytics.data_v1beta.types import RunReportRequest, DateRange, Dimension, Metric
+from google.analytics.data_v1beta.types import BatchRunReportsRequest
+from google.analytics.data_v1beta.types import Filter, FilterExpression, FilterExpressionList
+from google.analytics.data_v1beta.types import MetricAggregation, OrderBy
 from google.oauth2 import service_account
-from google.api_core.exceptions import PermissionDenied, InvalidArgument
+from google.api_core.exceptions import PermissionDenied, InvalidArgument, ResourceExhausted
 import pandas as pd
 import streamlit as st
+from cache import SingleFlight, TwoTierCache
+from decoder import DECODER_VERSION, concat_frames, response_to_dataframe
+from ga_scheduler import INTERACTIVE, get_scheduler
+import partitions
+import tracing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import hashlib
+import os
+import re
+import threading
+import time
 
-def run_ga_report(dimensions, metrics, date_range="30daysAgo"):
-    """Run GA4 report with beginner-friendly error handling"""
-    if 'ga_credentials' not in st.session_state:
-        st.error("🔌 Please connect Google Analytics first using the sidebar")
-        return pd.DataFrame()
-    
+GA_SCOPES = ("https://www.googleapis.com/auth/analytics.readonly",)
+
+# Idle clients are closed after this many seconds without a report
+CLIENT_IDLE_TTL = 30 * 60
+
+# Report cache settings (seconds / megabytes), overridable from the environment
+REPORT_CACHE_TTL = int(os.environ.get("GA4_REPORT_CACHE_TTL", 24 * 60 * 60))
+REPORT_CACHE_TTL_RECENT = int(os.environ.get("GA4_REPORT_CACHE_TTL_RECENT", 15 * 60))
+REPORT_CACHE_MEMORY_ENTRIES = int(os.environ.get("GA4_REPORT_CACHE_ENTRIES", 128))
+REPORT_CACHE_DISK_MB = int(os.environ.get("GA4_REPORT_CACHE_MB", 256))
+
+# Rows per run_report page (the API allows up to 250,000) and pages fetched at once.
+# GA4 allows 10 concurrent requests per property, leave room for other sessions.
+REPORT_PAGE_SIZE = int(os.environ.get("GA4_REPORT_PAGE_SIZE", 100000))
+MAX_PAGE_WORKERS = int(os.environ.get("GA4_MAX_PAGE_WORKERS", 4))
+
+# batchRunReports accepts at most this many reports per call
+BATCH_REPORT_LIMIT = 5
+
+# GA4 keeps reprocessing the most recent days, so they are never "settled"
+GA_PROCESSING_DAYS = 3
+
+# GA4_FAKE_API=1 answers every request from fake_ga instead of Google (offline runs, benchmarks)
+FAKE_API = os.environ.get("GA4_FAKE_API", "").lower() in ("1", "true", "yes")
+
+# (sync, async) callables building clients from (credentials_info, scopes); None means Google's
+_client_factories = (None, None)
+
+# Process-wide pool of Data API clients: {pool_key: {"client", "last_used"}}
+_client_pool = {}
+_client_pool_lock = threading.Lock()
+
+# Called with the released credentials (or None) so other client pools can follow
+_release_hooks = []
+
+
+def client_key(credentials_info, scopes=GA_SCOPES):
+    """Identify a service account by email, key id and scopes"""
+    return (
+        credentials_info.get("client_email", ""),
+        credentials_info.get("private_key_id", ""),
+        tuple(sorted(scopes)),
+    )
+
+
+def _close_client(client):
     try:
-        # Get credentials from session state
-        credentials = service_account.Credentials.from_service_account_info(
-            st.session_state.ga_credentials,
-            scopes=["https://www.googleapis.com/auth/analytics.readonly"]
+        client.transport.close()
+    except Exception:
+        pass  # Closing is best effort, the channel may already be gone
+
+
+def _evict_idle_clients(now):
+    """Drop clients nobody has used for CLIENT_IDLE_TTL (caller holds the lock)"""
+    stale = [key for key, entry in _client_pool.items()
+             if now - entry["last_used"] > CLIENT_IDLE_TTL]
+    return [_client_pool.pop(key)["client"] for key in stale]
+
+
+def set_client_factory(factory=None, async_factory=None):
+    """Build Data API clients with these callables, e.g. fake_ga.client_factory()
+
+    Each is called with (credentials_info, scopes). Pooled clients are
+    released so the next request uses the new factory; no arguments
+    restore the real API.
+    """
+    global _client_factories
+    _client_factories = (factory, async_factory)
+    release_client()
+
+
+def client_factories():
+    """The (sync, async) client factories in use, or (None, None) for the real API"""
+    if _client_factories == (None, None) and FAKE_API:
+        import fake_ga
+        set_client_factory(*fake_ga.client_factory())
+    return _client_factories
+
+
+def get_client(credentials_info, scopes=GA_SCOPES):
+    """Return a pooled BetaAnalyticsDataClient for these service account credentials
+
+    The gRPC channel and the refreshed access token are shared by every
+    Streamlit rerun and session that connects with the same service account.
+    """
+    factory = client_factories()[0]
+    key = client_key(credentials_info, scopes)
+    now = time.monotonic()
+    with _client_pool_lock:
+        stale = _evict_idle_clients(now)
+        entry = _client_pool.get(key)
+        if entry is None:
+            # A rotated key for the same account replaces the old client
+            rotated = [k for k in _client_pool if k[0] == key[0] and k[2] == key[2]]
+            stale += [_client_pool.pop(k)["client"] for k in rotated]
+            entry = {"client": _new_client(credentials_info, scopes, factory)}
+            _client_pool[key] = entry
+        entry["last_used"] = now
+    for client in stale:
+        _close_client(client)
+    return entry["client"]
+
+
+def _new_client(credentials_info, scopes, factory=None):
+    if factory is not None:
+        return factory(credentials_info, scopes)
+    credentials = service_account.Credentials.from_service_account_info(
+        credentials_info, scopes=list(scopes)
+    )
+    return BetaAnalyticsDataClient(credentials=credentials)
+
+
+def release_client(credentials_info=None):
+    """Close pooled clients for one service account, or every client if none given"""
+    with _client_pool_lock:
+        if credentials_info is None:
+            released = list(_client_pool.values())
+            _client_pool.clear()
+        else:
+            email = credentials_info.get("client_email", "")
+            keys = [key for key in _client_pool if key[0] == email]
+            released = [_client_pool.pop(key) for key in keys]
+    for entry in released:
+        _close_client(entry["client"])
+    for hook in _release_hooks:
+        hook(credentials_info)
+
+
+def on_release(hook):
+    """Register a callback run whenever release_client is called"""
+    _release_hooks.append(hook)
+
+
+_report_cache = None
+_partition_cache = None
+_report_cache_lock = threading.Lock()
+
+# Identical requests in flight at the same time share one upstream call
+_inflight = SingleFlight()
+
+
+def get_report_cache():
+    """Process-wide memory + SQLite cache of report DataFrames"""
+    global _report_cache
+    with _report_cache_lock:
+        if _report_cache is None:
+            _report_cache = TwoTierCache(
+                table="reports",
+                default_ttl=REPORT_CACHE_TTL,
+                max_memory_entries=REPORT_CACHE_MEMORY_ENTRIES,
+                max_disk_bytes=REPORT_CACHE_DISK_MB * 1024 * 1024,
+            )
+        return _report_cache
+
+
+def get_partition_cache():
+    """Per-day report partitions; settled days never expire"""
+    global _partition_cache
+    with _report_cache_lock:
+        if _partition_cache is None:
+            _partition_cache = TwoTierCache(
+                table="partitions",
+                default_ttl=None,
+                max_memory_entries=REPORT_CACHE_MEMORY_ENTRIES * 8,
+                max_disk_bytes=REPORT_CACHE_DISK_MB * 1024 * 1024,
+            )
+        return _partition_cache
+
+
+def get_inflight():
+    """Process-wide single-flight registry keyed by request_key"""
+    return _inflight
+
+
+def resolve_date(value, today=None):
+    """Turn a GA4 date string ("today", "7daysAgo", "2024-01-31") into a date"""
+    today = today or date.today()
+    value = str(value).strip()
+    if value == "today":
+        return today
+    if value == "yesterday":
+        return today - timedelta(days=1)
+    match = re.fullmatch(r"(\d+)daysAgo", value)
+    if match:
+        return today - timedelta(days=int(match.group(1)))
+    return date.fromisoformat(value)
+
+
+# Names of compared periods; GA4 labels rows with them in a "dateRange" column
+CURRENT_PERIOD = "This period"
+COMPARISON_PERIODS = {"previous": "Previous period", "year": "Same period last year"}
+
+
+def _days_ago(value):
+    """Days before today for a relative GA4 date ("today", "yesterday", "NdaysAgo"), else None"""
+    value = str(value).strip()
+    if value == "today":
+        return 0
+    if value == "yesterday":
+        return 1
+    match = re.fullmatch(r"(\d+)daysAgo", value)
+    return int(match.group(1)) if match else None
+
+
+def comparison_ranges(start_date, end_date, against):
+    """Named date ranges for a period-over-period report, current period first
+
+    `against` is "previous" (the same number of days just before) or
+    "year" (the same days a year earlier). Relative dates stay relative, so
+    the request, and its cache key, is the same whichever day it runs.
+    """
+    start, end = _days_ago(start_date), _days_ago(end_date)
+    if start is None or end is None:
+        start_day, end_day = resolve_date(start_date), resolve_date(end_date)
+        span = (end_day - start_day).days + 1
+        shift = timedelta(days=365) if against == "year" else timedelta(days=span)
+        other = ((start_day - shift).isoformat(), (end_day - shift).isoformat())
+    else:
+        shift = 365 if against == "year" else start - end + 1
+        other = (f"{start + shift}daysAgo", f"{end + shift}daysAgo")
+    return [
+        {"name": CURRENT_PERIOD, "start_date": str(start_date).strip(), "end_date": str(end_date).strip()},
+        {"name": COMPARISON_PERIODS[against], "start_date": other[0], "end_date": other[1]},
+    ]
+
+
+# Filter conditions: {"field", "op", "value"}; string ops match case-insensitively
+STRING_FILTER_OPS = {
+    "eq": Filter.StringFilter.MatchType.EXACT,
+    "contains": Filter.StringFilter.MatchType.CONTAINS,
+    "begins_with": Filter.StringFilter.MatchType.BEGINS_WITH,
+    "ends_with": Filter.StringFilter.MatchType.ENDS_WITH,
+    "regex": Filter.StringFilter.MatchType.FULL_REGEXP,
+}
+NUMERIC_FILTER_OPS = {
+    "=": Filter.NumericFilter.Operation.EQUAL,
+    "<": Filter.NumericFilter.Operation.LESS_THAN,
+    "<=": Filter.NumericFilter.Operation.LESS_THAN_OR_EQUAL,
+    ">": Filter.NumericFilter.Operation.GREATER_THAN,
+    ">=": Filter.NumericFilter.Operation.GREATER_THAN_OR_EQUAL,
+}
+
+
+def _numeric_value(value):
+    if isinstance(value, int) or float(value).is_integer():
+        return {"int64_value": int(value)}
+    return {"double_value": float(value)}
+
+
+def build_filter(conditions):
+    """AND of filter condition dicts as a FilterExpression, or None if there are none
+
+    Ops: eq/contains/begins_with/ends_with/regex and in (list of values)
+    for dimensions; =, <, <=, >, >= and between (pair of values) for metrics.
+    """
+    expressions = []
+    for condition in conditions or []:
+        field, op, value = condition["field"], condition["op"], condition["value"]
+        if op in STRING_FILTER_OPS:
+            filter_ = Filter(field_name=field, string_filter=Filter.StringFilter(
+                match_type=STRING_FILTER_OPS[op], value=str(value), case_sensitive=False))
+        elif op == "in":
+            filter_ = Filter(field_name=field, in_list_filter=Filter.InListFilter(
+                values=[str(item) for item in value], case_sensitive=False))
+        elif op in NUMERIC_FILTER_OPS:
+            filter_ = Filter(field_name=field, numeric_filter=Filter.NumericFilter(
+                operation=NUMERIC_FILTER_OPS[op], value=_numeric_value(value)))
+        elif op == "between":
+            filter_ = Filter(field_name=field, between_filter=Filter.BetweenFilter(
+                from_value=_numeric_value(value[0]), to_value=_numeric_value(value[1])))
+        else:
+            raise ValueError(f"Unknown filter operator: {op}")
+        expressions.append(FilterExpression(filter=filter_))
+    if not expressions:
+        return None
+    if len(expressions) == 1:
+        return expressions[0]
+    return FilterExpression(and_group=FilterExpressionList(expressions=expressions))
+
+
+def build_report_request(property_id, dimensions, metrics, date_range="30daysAgo", end_date="today",
+                         dimension_filters=None, metric_filters=None, order_by=None, limit=None,
+                         totals=False, date_ranges=None):
+    """Build a normalized RunReportRequest so equal questions share one cache key
+
+    Filters, ordering, the row limit and totals are applied by GA4, so only
+    the rows asked for are sent back. order_by is a list of
+    {"field", "desc"} dicts naming requested dimensions or metrics.
+    date_ranges (see comparison_ranges) replaces date_range/end_date with
+    several named periods fetched in the same call.
+    """
+    property_id = str(property_id).strip()
+    if not property_id.startswith("properties/"):
+        property_id = f"properties/{property_id}"
+    metrics = [metric.strip() for metric in metrics]
+    request = RunReportRequest(
+        property=property_id,
+        dimensions=[Dimension(name=dim.strip()) for dim in dimensions],
+        metrics=[Metric(name=metric) for metric in metrics],
+        date_ranges=[DateRange(**period) for period in date_ranges] if date_ranges
+        else [DateRange(start_date=str(date_range).strip(), end_date=end_date)],
+        return_property_quota=True,
+    )
+    dimension_filter = build_filter(dimension_filters)
+    if dimension_filter is not None:
+        request.dimension_filter = dimension_filter
+    metric_filter = build_filter(metric_filters)
+    if metric_filter is not None:
+        request.metric_filter = metric_filter
+    for order in order_by or []:
+        if order["field"] in metrics:
+            request.order_bys.append(OrderBy(
+                metric=OrderBy.MetricOrderBy(metric_name=order["field"]), desc=order.get("desc", False)))
+        else:
+            request.order_bys.append(OrderBy(
+                dimension=OrderBy.DimensionOrderBy(dimension_name=order["field"]), desc=order.get("desc", False)))
+    if limit:
+        request.limit = int(limit)
+    if totals:
+        request.metric_aggregations.append(MetricAggregation.TOTAL)
+    return request
+
+
+# Report dict keys passed through to build_report_request
+PUSHDOWN_KEYS = ("dimension_filters", "metric_filters", "order_by", "limit", "totals")
+
+
+def build_report_requests(property_id, reports):
+    """Build requests from report dicts: dimensions, metrics, optional date_range/end_date
+    or date_ranges, and the optional PUSHDOWN_KEYS"""
+    return [
+        build_report_request(
+            property_id, report["dimensions"], report["metrics"],
+            report.get("date_range", "30daysAgo"), report.get("end_date", "today"),
+            date_ranges=report.get("date_ranges"),
+            **{key: report[key] for key in PUSHDOWN_KEYS if report.get(key)},
         )
-        
-        client = BetaAnalyticsDataClient(credentials=credentials)
-        
-        request = RunReportRequest(
-            property=f"properties/{st.session_state.ga_property_id}",
-            dimensions=[Dimension(name=dim) for dim in dimensions],
-            metrics=[Metric(name=metric) for metric in metrics],
-            date_ranges=[DateRange(start_date=date_range, end_date="today")],
+        for report in reports
+    ]
+
+
+def request_key(request):
+    """Stable hash of a RunReportRequest, used as the cache key"""
+    payload = RunReportRequest.to_json(request, sort_keys=True, indent=0)
+    payload = f"v{DECODER_VERSION}:{payload}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def report_ttl(request):
+    """Short TTL while a report still covers days GA4 may reprocess"""
+    settled = date.today() - timedelta(days=GA_PROCESSING_DAYS)
+    for date_range in request.date_ranges:
+        try:
+            if resolve_date(date_range.end_date) > settled:
+                return REPORT_CACHE_TTL_RECENT
+        except ValueError:
+            return REPORT_CACHE_TTL_RECENT
+    return REPORT_CACHE_TTL
+
+
+def trace_response(span, response):
+    """Add a response's rows, size and quota tokens to a span; returns the response"""
+    for report in getattr(response, "reports", None) or [response]:
+        pb = type(report).pb(report)
+        span.add(rows=len(pb.rows), bytes=pb.ByteSize(), tokens=pb.property_quota.tokens_per_hour.consumed)
+    return response
+
+
+def _decode(response):
+    with tracing.span("ga.decode", rows=len(response.rows)):
+        return response_to_dataframe(response)
+
+
+def iter_report_pages(request, credentials_info, page_size=None, max_workers=None, priority=INTERACTIVE):
+    """Yield a report as DataFrame chunks, one per page of rows
+
+    The first page tells us row_count; the remaining pages are fetched
+    concurrently, at most max_workers at a time, and yielded in order so
+    only a few pages are held in memory at once. A limit already set on
+    the request caps the total number of rows. Every page goes through the
+    quota scheduler at the given priority.
+    """
+    page_size = page_size or REPORT_PAGE_SIZE
+    max_workers = max_workers or MAX_PAGE_WORKERS
+    client = get_client(credentials_info)
+    scheduler = get_scheduler()
+    cap = request.limit or None
+
+    def fetch_page(offset):
+        page = RunReportRequest(request)
+        page.offset = request.offset + offset
+        page.limit = page_size if cap is None else min(page_size, cap - offset)
+        with tracing.span("ga.run_report", offset=page.offset) as span:
+            return trace_response(
+                span, scheduler.call(request.property, lambda: client.run_report(page), priority)
+            )
+
+    first = fetch_page(0)
+    total = first.row_count if cap is None else min(first.row_count, cap)
+    yield _decode(first)
+    del first
+
+    offsets = iter(range(page_size, total, page_size))
+    pending = deque()
+    fetch_traced = tracing.propagate(fetch_page)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for offset in offsets:
+                pending.append(pool.submit(fetch_traced, offset))
+                if len(pending) >= max_workers:
+                    break
+            while pending:
+                response = pending.popleft().result()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(pool.submit(fetch_traced, offset))
+                yield _decode(response)
+        finally:
+            # Stop fetching when the consumer closes the generator early
+            for future in pending:
+                future.cancel()
+
+
+def fetch_all_pages(request, credentials_info, priority=INTERACTIVE):
+    """Fetch every page of a report into a single DataFrame"""
+    return concat_frames(list(iter_report_pages(request, credentials_info, priority=priority)))
+
+
+def partition_range(request):
+    """(start, end, settled) dates when a report can be rebuilt from day partitions, else None
+
+    Row limits, metric filters, ordering and totals apply to the whole range,
+    so those requests are never split; dimension filters are fine per day.
+    """
+    dimensions = [dim.name for dim in request.dimensions]
+    metrics = [metric.name for metric in request.metrics]
+    if len(request.date_ranges) != 1 or not partitions.is_partitionable(dimensions, metrics):
+        return None
+    if request.limit or request.offset or request.order_bys or request.metric_aggregations \
+            or "metric_filter" in request:
+        return None
+    try:
+        start = resolve_date(request.date_ranges[0].start_date)
+        end = resolve_date(request.date_ranges[0].end_date)
+    except ValueError:
+        return None
+    settled = date.today() - timedelta(days=GA_PROCESSING_DAYS)
+    if end < start or start > settled:
+        return None
+    return start, end, settled
+
+
+def fetch_partitioned(request, credentials_info, priority=INTERACTIVE):
+    """Rebuild a report from cached settled days, fetching only missing days
+
+    Returns None when the report can't be split into day partitions (see
+    partition_range). Used by both the sync and the async fetch paths.
+    """
+    days = partition_range(request)
+    if days is None:
+        return None
+    start, end, settled = days
+    dimensions = [dim.name for dim in request.dimensions]
+    metrics = [metric.name for metric in request.metrics]
+
+    # Partitions are keyed by the request without its date range
+    base = RunReportRequest(request)
+    del base.date_ranges[:]
+    base_key = request_key(base)
+    store = get_partition_cache()
+
+    frames = {}
+    for day in partitions.days_between(start, min(end, settled)):
+        cached = store.get(f"{base_key}:{day.isoformat()}", namespace=request.property)
+        if cached is not None:
+            frames[day] = cached
+    missing = [day for day in partitions.days_between(start, end) if day not in frames]
+    tracing.annotate(cached_days=len(frames), missing_days=len(missing))
+
+    # One request per run of consecutive missing days, split by the date dimension
+    keep_date = "date" in dimensions
+    for first, last in partitions.contiguous_spans(missing):
+        span_request = RunReportRequest(base)
+        if not keep_date:
+            span_request.dimensions.append(Dimension(name="date"))
+        span_request.date_ranges.append(
+            DateRange(start_date=first.isoformat(), end_date=last.isoformat())
         )
-        
-        response = client.run_report(request)
-        
-        # Parse response to DataFrame
-        dim_headers = [header.name for header in response.dimension_headers]
-        met_headers = [header.name for header in response.metric_headers]
-        
-        rows = []
-        for row in response.rows:
-            row_data = [dim.value for dim in row.dimension_values]
-            row_data += [met.value for met in row.metric_values]
-            rows.append(row_data)
-            
-        return pd.DataFrame(rows, columns=dim_headers + met_headers)
-    
-    except PermissionDenied:
+        span_days = partitions.days_between(first, last)
+        parts = partitions.split_by_day(
+            fetch_all_pages(span_request, credentials_info, priority), span_days, keep_date=keep_date
+        )
+        for day, part in parts.items():
+            if day <= settled:
+                store.set(f"{base_key}:{day.isoformat()}", part, namespace=request.property)
+            frames[day] = part
+
+    return partitions.combine_partitions(
+        [frames[day] for day in sorted(frames)], dimensions, metrics
+    )
+
+
+def fetch_report(request, credentials_info, use_cache=True, priority=INTERACTIVE):
+    """Run one RunReportRequest through the report cache, raising API errors
+
+    Concurrent callers asking for the same request wait for a single
+    upstream call and each get their own copy of the shared result.
+    """
+    cache = get_report_cache()
+    key = request_key(request)
+    with tracing.span("ga.report", property=request.property) as span:
+        if use_cache:
+            cached = cache.get(key, namespace=request.property)
+            if cached is not None:
+                span.set(cache="hit", rows=len(cached))
+                return cached.copy()
+        span.set(cache="miss")
+
+        def fetch():
+            df = fetch_partitioned(request, credentials_info, priority) if use_cache else None
+            if df is None:
+                df = fetch_all_pages(request, credentials_info, priority)
+            cache.set(key, df, ttl=report_ttl(request), namespace=request.property)
+            return df
+
+        df = _inflight.do(key, fetch).copy()
+        span.set(rows=len(df))
+        return df
+
+
+def _run_batch(requests, credentials_info, priority=INTERACTIVE):
+    """One batchRunReports call for up to BATCH_REPORT_LIMIT requests of one property"""
+    batch = BatchRunReportsRequest(property=requests[0].property, requests=requests)
+    client = get_client(credentials_info)
+    with tracing.span("ga.batch_run_reports", reports=len(requests)) as span:
+        response = get_scheduler().call(batch.property, lambda: client.batch_run_reports(batch), priority)
+        trace_response(span, response)
+    return list(response.reports)
+
+
+def fetch_reports_batch(requests, credentials_info, use_cache=True, max_workers=None, priority=INTERACTIVE):
+    """Fetch several RunReportRequests with as few round trips as possible
+
+    Cached reports are answered locally and reports already being fetched
+    by another caller are waited for. The rest are grouped by property
+    into batchRunReports calls of BATCH_REPORT_LIMIT reports, and the calls
+    run concurrently on a bounded thread pool. Results come back in the
+    order of `requests`.
+    """
+    with tracing.span("ga.batch", reports=len(requests)):
+        return _fetch_reports_batch(requests, credentials_info, use_cache, max_workers, priority)
+
+
+def _fetch_reports_batch(requests, credentials_info, use_cache, max_workers, priority):
+    cache = get_report_cache()
+    keys = [request_key(request) for request in requests]
+    results = [None] * len(requests)
+    claims = {}
+    by_property = {}
+    for i, request in enumerate(requests):
+        if use_cache:
+            cached = cache.get(keys[i], namespace=request.property)
+            if cached is not None:
+                results[i] = cached.copy()
+                continue
+        claims[i] = _inflight.claim(keys[i])
+        if claims[i][1]:
+            by_property.setdefault(request.property, []).append(i)
+    tracing.annotate(cache="hit" if not claims else "miss", cached=len(requests) - len(claims))
+
+    chunks = []
+    for indexes in by_property.values():
+        for start in range(0, len(indexes), BATCH_REPORT_LIMIT):
+            chunks.append(indexes[start:start + BATCH_REPORT_LIMIT])
+
+    try:
+        if chunks:
+            workers = min(len(chunks), max_workers or MAX_PAGE_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                responses = pool.map(
+                    tracing.propagate(
+                        lambda chunk: _run_batch([requests[i] for i in chunk], credentials_info, priority)
+                    ),
+                    chunks,
+                )
+                for chunk, chunk_responses in zip(chunks, responses):
+                    for i, response in zip(chunk, chunk_responses):
+                        request = requests[i]
+                        if not request.limit and response.row_count > len(response.rows):
+                            # Too many rows for one batch page, fetch the rest page by page
+                            df = fetch_all_pages(request, credentials_info, priority)
+                        else:
+                            df = _decode(response)
+                        cache.set(keys[i], df, ttl=report_ttl(request), namespace=request.property)
+                        _inflight.resolve(keys[i], claims[i][0], df)
+                        results[i] = df.copy()
+    except BaseException as e:
+        # Never leave callers waiting on a report this batch failed to fetch
+        for i, (future, leader) in claims.items():
+            if leader and not future.done():
+                _inflight.resolve(keys[i], future, error=e)
+        raise
+
+    for i, (future, leader) in claims.items():
+        if not leader:
+            results[i] = future.result().copy()
+    return results
+
+
+def show_report_error(error):
+    """Explain a failed GA4 request in beginner-friendly terms"""
+    if isinstance(error, PermissionDenied):
         st.error("""
         ❌ Permission denied! Please verify:
         1. Service account has **Viewer** access in GA4
         2. You've added the service account email in GA4 Admin
         3. Waited 5-10 minutes after granting permissions
         """)
-        return pd.DataFrame()
+    elif isinstance(error, ResourceExhausted):
+        st.error("""
+        ⏳ Google Analytics quota reached for this property.
         
-    except InvalidArgument as e:
+        **What you can do:**
+        - Wait a few minutes and ask again
+        - Re-use questions you already asked, they are served from the cache
+        - [About GA4 API quotas](https://developers.google.com/analytics/devguides/reporting/data/v1/quotas)
+        """)
+    elif isinstance(error, InvalidArgument):
         st.error(f"""
-        ❌ Invalid request: {str(e)}
+        ❌ Invalid request: {str(error)}
         
         **Common fixes:**
         - Check your property ID is correct
         - Verify dimensions/metrics exist in GA4
         - [GA4 Dimensions & Metrics Reference](https://developers.google.com/analytics/devguides/reporting/data/v1/api-schema)
         """)
-        return pd.DataFrame()
-        
-    except Exception as e:
+    else:
         st.error(f"""
-        ❌ Unexpected error: {str(e)}
+        ❌ Unexpected error: {str(error)}
         
         **Troubleshooting:**
         - Try reconnecting Google Analytics
         - Check your GA4 property has data
         - [Get Help](https://support.google.com/analytics)
         """)
+
+
+def run_ga_report(dimensions, metrics, date_range="30daysAgo", use_cache=True, priority=INTERACTIVE,
+                  **pushdown):
+    """Run GA4 report with beginner-friendly error handling
+
+    Keyword arguments (dimension_filters, metric_filters, order_by, limit,
+    totals) are passed on to build_report_request.
+    """
+    if not st.session_state.get('ga_credentials'):
+        st.error("🔌 Please connect Google Analytics first using the sidebar")
+        return pd.DataFrame()
+    
+    try:
+        request = build_report_request(
+            st.session_state.ga_property_id, dimensions, metrics, date_range, **pushdown
+        )
+        return fetch_report(
+            request, st.session_state.ga_credentials, use_cache=use_cache, priority=priority
+        )
+    except Exception as e:
+        show_report_error(e)
         return pd.DataFrame()
+
+
+def run_ga_reports_batch(reports, use_cache=True, priority=INTERACTIVE):
+    """Run several GA4 reports in as few API calls as possible
+
+    `reports` is a list of dicts with "dimensions", "metrics" and an optional
+    "date_range". Returns one DataFrame per report, in the same order.
+    """
+    if not st.session_state.get('ga_credentials'):
+        st.error("🔌 Please connect Google Analytics first using the sidebar")
+        return [pd.DataFrame() for _ in reports]
+
+    try:
+        requests = build_report_requests(st.session_state.ga_property_id, reports)
+        return fetch_reports_batch(
+            requests, st.session_state.ga_credentials, use_cache=use_cache, priority=priority
+        )
+    except Exception as e:
+        show_report_error(e)
+        return [pd.DataFrame() for _ in reports]
@@ -0,0 +1,236 @@
+import asyncio
+import itertools
+import os
+import random
+import threading
+import time
+
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted, ServiceUnavailable
+
+# Request priorities, lower runs first
+INTERACTIVE = 0
+EXPORT = 1
+PREFETCH = 2
+
+# GA4 allows 10 concurrent requests per property, keep a little headroom
+MAX_CONCURRENT_PER_PROPERTY = int(os.environ.get("GA4_MAX_CONCURRENT_PER_PROPERTY", 8))
+REQUESTS_PER_SECOND = float(os.environ.get("GA4_REQUESTS_PER_SECOND", 5))
+REQUEST_BURST = int(os.environ.get("GA4_REQUEST_BURST", 10))
+
+# Share of the hourly token quota kept for interactive questions
+INTERACTIVE_RESERVE = 0.2
+
+# Quota readings older than this are ignored, the hourly window has moved on
+QUOTA_STALE_AFTER = 5 * 60
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+RETRYABLE_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded)
+
+QUOTA_FIELDS = (
+    "tokens_per_day",
+    "tokens_per_hour",
+    "concurrent_requests",
+    "server_errors_per_project_per_hour",
+    "potentially_thresholded_requests_per_hour",
+    "tokens_per_project_per_hour",
+)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` banked"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Take one token; returns 0 on success or the seconds until one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self, seconds, now):
+        """Push the next available token `seconds` into the future"""
+        self.take(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class QuotaScheduler:
+    """Gatekeeper in front of every GA4 Data API call
+
+    Requests for one property are admitted in priority order, limited by a
+    per-property token bucket and concurrency cap. ResourceExhausted and
+    Unavailable errors are retried with full-jitter exponential backoff, and
+    the property_quota returned with each response is kept for display.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_PER_PROPERTY, rate=REQUESTS_PER_SECOND,
+                 burst=REQUEST_BURST, max_retries=MAX_RETRIES):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.quota = {}
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0}
+        self._cond = threading.Condition()
+        self._sequence = itertools.count()
+        self._waiting = []
+        self._active = {}
+        self._buckets = {}
+
+    def _bucket(self, prop):
+        if prop not in self._buckets:
+            self._buckets[prop] = TokenBucket(self.rate, self.burst)
+        return self._buckets[prop]
+
+    def _reserved(self, prop, priority, now):
+        """True if background work should leave the remaining hourly tokens alone"""
+        if priority == INTERACTIVE:
+            return False
+        quota = self.quota.get(prop)
+        if not quota or now - quota["updated"] > QUOTA_STALE_AFTER:
+            return False
+        consumed, remaining = quota.get("tokens_per_hour", (0, 0))
+        total = consumed + remaining
+        return total > 0 and remaining < total * INTERACTIVE_RESERVE
+
+    def acquire(self, prop, priority=INTERACTIVE):
+        """Block until this request may run; pair with release()"""
+        ticket = (priority, next(self._sequence), prop)
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    first = min(t for t in self._waiting if t[2] == prop)
+                    if first != ticket or self._active.get(prop, 0) >= self.max_concurrent:
+                        self._cond.wait()
+                        continue
+                    if self._reserved(prop, priority, time.time()):
+                        self.stats["throttled"] += 1
+                        self._cond.wait(30)
+                        continue
+                    wait = self._bucket(prop).take(now)
+                    if wait:
+                        self._cond.wait(wait)
+                        continue
+                    self._active[prop] = self._active.get(prop, 0) + 1
+                    self.stats["calls"] += 1
+                    return
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def release(self, prop):
+        with self._cond:
+            self._active[prop] -= 1
+            self._cond.notify_all()
+
+    def _backoff(self, prop, attempt, error):
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        with self._cond:
+            self.stats["retries"] += 1
+            if isinstance(error, ResourceExhausted):
+                # Slow every request for this property, not just the one that failed
+                self._bucket(prop).drain(delay, time.monotonic())
+        return delay
+
+    def record_quota(self, prop, response):
+        """Remember the property_quota of a RunReportResponse or BatchRunReportsResponse"""
+        for report in getattr(response, "reports", None) or [response]:
+            quota = getattr(report, "property_quota", None)
+            if quota is None or not (quota.tokens_per_hour.consumed or quota.tokens_per_hour.remaining):
+                continue
+            values = {"updated": time.time()}
+            for field in QUOTA_FIELDS:
+                status = getattr(quota, field)
+                values[field] = (status.consumed, status.remaining)
+            with self._cond:
+                self.quota[prop] = values
+
+    def call(self, prop, func, priority=INTERACTIVE):
+        """Run func() once admitted, retrying quota and availability errors"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(prop, priority)
+            try:
+                response = func()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(prop, attempt, e)
+            else:
+                self.record_quota(prop, response)
+                return response
+            finally:
+                self.release(prop)
+            time.sleep(delay)
+
+    async def acquire_async(self, prop, priority=INTERACTIVE):
+        """acquire() from a coroutine; pair with release()
+
+        Waiting happens in a worker thread, which can't be interrupted. If
+        the coroutine is cancelled meanwhile, the slot the thread goes on to
+        get is released straight away instead of being held forever.
+        """
+        lock = threading.Lock()
+        state = {"admitted": False, "abandoned": False}
+
+        def admit():
+            self.acquire(prop, priority)
+            with lock:
+                if state["abandoned"]:
+                    self.release(prop)
+                else:
+                    state["admitted"] = True
+
+        try:
+            await asyncio.to_thread(admit)
+        except asyncio.CancelledError:
+            with lock:
+                state["abandoned"] = True
+                if state["admitted"]:
+                    self.release(prop)
+            raise
+
+    async def call_async(self, prop, coro_func, priority=INTERACTIVE):
+        """Async version of call(); waiting for admission happens in a worker thread"""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(prop, priority)
+            try:
+                response = await coro_func()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(prop, attempt, e)
+            else:
+                self.record_quota(prop, response)
+                return response
+            finally:
+                self.release(prop)
+            await asyncio.sleep(delay)
+
+    def quota_summary(self, prop):
+        """Latest {field: (consumed, remaining)} for a property, or None"""
+        with self._cond:
+            quota = self.quota.get(prop)
+            return dict(quota) if quota else None
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by every session"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = QuotaScheduler()
+        return _scheduler
@@ -0,0 +1,304 @@
+import difflib
+import os
+import re
+import threading
+
+import streamlit as st
+
+import ga_query
+from cache import TwoTierCache
+from ga_scheduler import INTERACTIVE, get_scheduler
+
+# Property metadata is refetched after this many seconds (custom fields change rarely)
+SCHEMA_TTL = int(os.environ.get("GA4_SCHEMA_TTL", 24 * 60 * 60))
+
+# runReport limits
+MAX_DIMENSIONS = 9
+MAX_METRICS = 10
+
+# Fuzzy matching for typos ("contry", "sesions") on words no phrase matched
+FUZZY_CUTOFF = 0.85
+FUZZY_MIN_LENGTH = 5
+
+# Used when no property is connected or its metadata can't be loaded
+BUILTIN_DIMENSIONS = [
+    "country", "region", "city", "language", "deviceCategory", "browser", "operatingSystem",
+    "platform", "pagePath", "pageTitle", "landingPage", "sessionSourceMedium", "sessionSource",
+    "sessionMedium", "sessionCampaignName", "sessionDefaultChannelGroup", "newVsReturning",
+    "eventName", "date", "itemName", "itemCategory", "itemBrand",
+]
+BUILTIN_METRICS = [
+    "activeUsers", "totalUsers", "newUsers", "sessions", "engagedSessions", "bounceRate",
+    "engagementRate", "averageSessionDuration", "screenPageViews", "eventCount", "conversions",
+    "totalRevenue", "purchaseRevenue", "transactions", "userEngagementDuration",
+    "itemRevenue", "itemsViewed", "itemsPurchased",
+]
+
+# Everyday words for common fields; these win over names derived from metadata
+SYNONYMS = {
+    "activeUsers": ["users", "visitors", "people", "active users"],
+    "totalUsers": ["total users"],
+    "newUsers": ["new users", "new visitors"],
+    "sessions": ["visits", "sessions"],
+    "engagedSessions": ["engaged sessions"],
+    "bounceRate": ["bounce", "bounces", "bounce rate"],
+    "engagementRate": ["engagement", "engagement rate"],
+    "averageSessionDuration": ["session duration", "time on site", "avgSessionDuration"],
+    "screenPageViews": ["views", "page views", "pageviews"],
+    "eventCount": ["events", "event count"],
+    "totalRevenue": ["revenue", "sales"],
+    "transactions": ["purchases", "orders", "transactions"],
+    "country": ["country", "countries", "location"],
+    "city": ["city", "cities"],
+    "deviceCategory": ["device", "devices", "device type"],
+    "operatingSystem": ["os", "operating system"],
+    "pagePath": ["page", "pages", "url", "urls", "page path"],
+    "landingPage": ["landing page", "landing pages"],
+    "sessionSourceMedium": ["source", "sources", "source medium", "sourceMedium", "referrer"],
+    "sessionDefaultChannelGroup": ["channel", "channels", "channel group"],
+    "sessionCampaignName": ["campaign", "campaigns"],
+    "newVsReturning": ["new vs returning", "returning"],
+    "date": ["date", "daily"],
+}
+
+# Names that are usually time ranges in a question ("last month"), never fields by themselves
+AMBIGUOUS_PHRASES = {"day", "week", "month", "year", "hour", "minute", "time", "today", "yesterday"}
+
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "show", "what", "which", "how", "many", "much",
+    "last", "this", "that", "please", "explain", "simple", "chart", "table", "graph",
+}
+
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+_GLOSS = re.compile(r"\([^()]*\)")
+
+
+def tokenize(text):
+    """Lowercase word tokens; camelCase is split and plurals are folded"""
+    tokens = []
+    for word in _WORD.findall(text):
+        word = word.lower()
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class SchemaIndex:
+    """Dimensions and metrics of one GA4 property, with a phrase matcher
+
+    API names, UI names, deprecated names and SYNONYMS are tokenized into a
+    word trie, so a question is resolved in one left-to-right pass that
+    takes the longest phrase at each position, whatever the number of
+    custom fields. Unmatched words get a difflib fallback for typos.
+    """
+
+    def __init__(self, fields, property_id=None):
+        # fields: {api_name: {"kind", "ui_name", "category", "custom", "aliases"}}
+        self.fields = fields
+        self.property_id = property_id
+        self._trie = {}
+        self._words = {}
+        for api_name, field in fields.items():
+            for alias in SYNONYMS.get(api_name, []):
+                self._add(alias, api_name, priority=0)
+        for api_name, field in fields.items():
+            for phrase in [api_name, field["ui_name"], *field["aliases"]]:
+                self._add(phrase, api_name, priority=1)
+            self._add(api_name.lower(), api_name, priority=1)
+
+    def _add(self, phrase, api_name, priority):
+        tokens = tuple(tokenize(phrase))
+        if not tokens or " ".join(tokens) in AMBIGUOUS_PHRASES:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        current = node.get(None)
+        if current is None or priority < current[1]:
+            node[None] = (api_name, priority)
+            if len(tokens) == 1:
+                self._words[tokens[0]] = api_name
+
+    @classmethod
+    def builtin(cls):
+        fields = {name: _field("dimension", name) for name in BUILTIN_DIMENSIONS}
+        fields.update({name: _field("metric", name) for name in BUILTIN_METRICS})
+        return cls(fields)
+
+    @classmethod
+    def from_metadata(cls, metadata, property_id=None):
+        """Build the index from a get_metadata response"""
+        fields = {}
+        for kind, items in (("dimension", metadata.dimensions), ("metric", metadata.metrics)):
+            for item in items:
+                fields[item.api_name] = _field(
+                    kind, item.api_name, item.ui_name, item.category,
+                    item.custom_definition, list(item.deprecated_api_names),
+                )
+        return cls(fields, property_id)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def kind(self, name):
+        field = self.fields.get(name)
+        return field["kind"] if field else None
+
+    def match(self, text):
+        """API names mentioned in text, in order of first mention"""
+        tokens = tokenize(text)
+        found = []
+        unmatched = []
+        i = 0
+        while i < len(tokens):
+            node, best, end = self._trie, None, i
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    best, end = node[None][0], j + 1
+            if best is None:
+                unmatched.append((i, tokens[i]))
+                i += 1
+            else:
+                found.append((i, best))
+                i = end
+        for position, token in unmatched:
+            if len(token) < FUZZY_MIN_LENGTH or token in STOPWORDS:
+                continue
+            close = difflib.get_close_matches(token, self._words, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                found.append((position, self._words[close[0]]))
+        names = []
+        for _, name in sorted(found):
+            if name not in names:
+                names.append(name)
+        return names
+
+    def resolve(self, text):
+        """Split the fields mentioned in text into (dimensions, metrics)"""
+        names = self.match(text)
+        dimensions = [name for name in names if self.kind(name) == "dimension"]
+        metrics = [name for name in names if self.kind(name) == "metric"]
+        return dimensions, metrics
+
+    def check(self, dimensions, metrics):
+        """Problems the API would reject this combination for, as friendly messages
+
+        Covers unknown names, the runReport limits and item-scoped
+        dimensions mixed with event-scoped metrics. An empty list means the
+        request is worth sending.
+        """
+        problems = []
+        for name, kind in [(d, "dimension") for d in dimensions] + [(m, "metric") for m in metrics]:
+            if self.kind(name) is None:
+                if self.property_id:
+                    problems.append(f"`{name}` is not a {kind} of this property")
+            elif self.kind(name) != kind:
+                problems.append(f"`{name}` is a {self.kind(name)}, not a {kind}")
+        if len(dimensions) > MAX_DIMENSIONS:
+            problems.append(f"At most {MAX_DIMENSIONS} dimensions fit in one report ({len(dimensions)} asked)")
+        if len(metrics) > MAX_METRICS:
+            problems.append(f"At most {MAX_METRICS} metrics fit in one report ({len(metrics)} asked)")
+        item_dimensions = [d for d in dimensions if _item_scoped(d)]
+        event_metrics = [m for m in metrics if not _item_scoped(m)]
+        if item_dimensions and event_metrics:
+            problems.append(
+                f"Item dimensions ({', '.join(item_dimensions)}) only work with item metrics "
+                f"such as itemRevenue, not {', '.join(event_metrics)}"
+            )
+        return problems
+
+
+def _field(kind, api_name, ui_name="", category="", custom=False, aliases=()):
+    return {"kind": kind, "ui_name": ui_name or api_name, "category": category,
+            "custom": custom, "aliases": list(aliases)}
+
+
+def _item_scoped(name):
+    return name.startswith("item") or name == "grossItemRevenue"
+
+
+_builtin = None
+_schema_cache = None
+_indexes = {}
+_schema_lock = threading.Lock()
+
+
+def builtin_schema():
+    """Schema of common GA4 fields, for when no property metadata is available"""
+    global _builtin
+    with _schema_lock:
+        if _builtin is None:
+            _builtin = SchemaIndex.builtin()
+        return _builtin
+
+
+def get_schema_cache():
+    """Process-wide memory + SQLite cache of property fields, one entry per property
+
+    Entries are the plain `fields` dicts, not SchemaIndex objects, so
+    changes to the index class never make the disk tier unreadable.
+    """
+    global _schema_cache
+    with _schema_lock:
+        if _schema_cache is None:
+            _schema_cache = TwoTierCache(table="schema_fields", default_ttl=SCHEMA_TTL, max_memory_entries=32)
+        return _schema_cache
+
+
+def _index(prop, fields):
+    """SchemaIndex for cached fields, rebuilt only when the fields change"""
+    with _schema_lock:
+        schema = _indexes.get(prop)
+        if schema is None or schema.fields is not fields:
+            schema = _indexes[prop] = SchemaIndex(fields, prop)
+        return schema
+
+
+def load_schema(property_id, credentials_info, use_cache=True):
+    """SchemaIndex for a property, from the cache or the Metadata API; raises API errors"""
+    prop = str(property_id).strip()
+    if not prop.startswith("properties/"):
+        prop = f"properties/{prop}"
+    cache = get_schema_cache()
+    if use_cache:
+        fields = cache.get(prop)
+        if fields is not None:
+            return _index(prop, fields)
+
+    def fetch():
+        client = ga_query.get_client(credentials_info)
+        metadata = get_scheduler().call(
+            prop, lambda: client.get_metadata(name=f"{prop}/metadata"), INTERACTIVE
+        )
+        schema = SchemaIndex.from_metadata(metadata, prop)
+        cache.set(prop, schema.fields)
+        with _schema_lock:
+            _indexes[prop] = schema
+        return schema
+
+    return ga_query.get_inflight().do(f"metadata:{prop}", fetch)
+
+
+def get_property_schema():
+    """Schema of the connected property, falling back to the built-in one"""
+    if not st.session_state.get('ga_credentials'):
+        return builtin_schema()
+    try:
+        return load_schema(st.session_state.ga_property_id, st.session_state.ga_credentials)
+    except Exception:
+        # Questions still resolve against common fields; report errors surface on fetch
+        return builtin_schema()
+
+
+def strip_glosses(text):
+    """Drop parenthesised explanations such as those added by prompt_enhancer"""
+    previous = None
+    while previous != text:
+        previous, text = text, _GLOSS.sub(" ", text)
+    return text
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import DEFAULT_CACHE_PATH, TwoTierCache
+
+# Questions kept per property; older ones are dropped as new ones are asked
+HISTORY_MAX_ENTRIES = int(os.environ.get("GA4_HISTORY_ENTRIES", 500))
+
+# Disk budget for stored report results (tables, charts, explanations)
+RESULTS_DISK_MB = int(os.environ.get("GA4_HISTORY_RESULTS_MB", 256))
+
+# Entries per page in the history panel
+HISTORY_PAGE_SIZE = 10
+
+
+class HistoryStore:
+    """Asked questions per property, in SQLite with bounded retention
+
+    Entries hold the question, its request spec and the fingerprint of the
+    report it produced. The report itself lives in a TwoTierCache keyed by
+    that fingerprint, so identical results are stored once and reopening a
+    past question needs no API call. Results can be evicted before their
+    history entry; callers then re-run the question.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=HISTORY_MAX_ENTRIES, results=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.results = results or TwoTierCache(
+            path=path, table="results", default_ttl=None,
+            max_memory_entries=16, max_disk_bytes=RESULTS_DISK_MB * 1024 * 1024,
+        )
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False, timeout=5)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    property TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    question TEXT NOT NULL,
+                    enhanced TEXT NOT NULL,
+                    spec TEXT NOT NULL,
+                    fingerprint TEXT,
+                    rows INTEGER NOT NULL DEFAULT 0
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_property ON history (property, id)")
+            self._conn = conn
+        return self._conn
+
+    def add(self, property_id, question, enhanced, spec=None, fingerprint=None, rows=0):
+        """Record a question and return its entry id"""
+        with self._lock:
+            db = self._db()
+            cursor = db.execute(
+                "INSERT INTO history (property, created, question, enhanced, spec, fingerprint, rows) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(property_id), time.time(), question, enhanced, json.dumps(spec or {}), fingerprint, rows),
+            )
+            db.execute(
+                "DELETE FROM history WHERE property = ? AND id NOT IN "
+                "(SELECT id FROM history WHERE property = ? ORDER BY id DESC LIMIT ?)",
+                (str(property_id), str(property_id), self.max_entries),
+            )
+            db.commit()
+            return cursor.lastrowid
+
+    def count(self, property_id):
+        with self._lock:
+            return self._db().execute(
+                "SELECT COUNT(*) FROM history WHERE property = ?", (str(property_id),)
+            ).fetchone()[0]
+
+    def page(self, property_id, page=0, page_size=HISTORY_PAGE_SIZE):
+        """One page of entries, newest first"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, created, question, enhanced, spec, fingerprint, rows FROM history "
+                "WHERE property = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (str(property_id), page_size, page * page_size),
+            ).fetchall()
+        return [
+            {"id": row[0], "created": row[1], "question": row[2], "enhanced": row[3],
+             "spec": json.loads(row[4]), "fingerprint": row[5], "rows": row[6]}
+            for row in rows
+        ]
+
+    def clear(self, property_id=None):
+        with self._lock:
+            db = self._db()
+            if property_id is None:
+                db.execute("DELETE FROM history")
+            else:
+                db.execute("DELETE FROM history WHERE property = ?", (str(property_id),))
+            db.commit()
+
+    def save_result(self, report):
+        """Store a report dict (df, fig, trend_fig, explanation, ...) under its fingerprint
+
+        Figures are kept as Plotly JSON so loading a result doesn't import Plotly.
+        """
+        stored = dict(report)
+        for key in ("fig", "trend_fig"):
+            if stored.get(key) is not None:
+                stored[key] = stored[key].to_json()
+        self.results.set(report["fingerprint"], stored)
+
+    def load_result(self, fingerprint):
+        """The stored report for a fingerprint, with figures rebuilt, or None"""
+        if not fingerprint:
+            return None
+        stored = self.results.get(fingerprint)
+        if stored is None:
+            return None
+        report = dict(stored)
+        for key in ("fig", "trend_fig"):
+            if report.get(key) is not None:
+                import plotly.io as pio
+                report[key] = pio.from_json(report[key])
+        report["df"] = report["df"].copy()
+        return report
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Process-wide HistoryStore"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+from datetime import date, timedelta
+
+import ga_query
+from cache import TwoTierCache
+from ga_schema import tokenize
+from prompt_enhancer import COMPARISON_PHRASES, TIME_PHRASES, analyze_query
+from query_parser import extract_query_spec
+
+# Question -> request spec entries are kept this long (seconds); explanations of
+# reports covering days GA4 still reprocesses use GA4_REPORT_CACHE_TTL_RECENT
+INTENT_CACHE_TTL = int(os.environ.get("GA4_INTENT_CACHE_TTL", 7 * 24 * 60 * 60))
+INTENT_CACHE_ENTRIES = int(os.environ.get("GA4_INTENT_CACHE_ENTRIES", 512))
+INTENT_CACHE_DISK_MB = int(os.environ.get("GA4_INTENT_CACHE_MB", 32))
+
+# Part of every key; bump when prompt_enhancer or query_parser change what a question maps to,
+# so specs parsed by an older version are not reused
+INTENT_VERSION = 1
+
+# Words that don't change what a question asks for (tokenized like questions are)
+STOPWORDS = set(tokenize(
+    "a an the me my our your i we you show give get see tell list find what which how many "
+    "much is are was were do does did of for in on at to per and with please about site "
+    "website data report number can could would there"
+))
+
+
+def canonical_question(question, today=None):
+    """Normalized form of a question: same request, same string
+
+    Lowercased word stems without stopwords or time phrases, followed by
+    the filters the parser reads from the enhanced question (the text the
+    request spec is parsed from) and the absolute date range (and the
+    period compared against, if any), so "Users by country
+    last week" and "show me users by country for the past 7 days" match on
+    the same day, but "users on mobile" and "users mobile" do not.
+    """
+    today = today or date.today()
+    intent = analyze_query(question)
+    start, end = intent.time_range or ("30daysAgo", "today")
+    text = TIME_PHRASES.sub(" ", COMPARISON_PHRASES.sub(" ", question))
+    words = [word for word in tokenize(text) if word not in STOPWORDS]
+    filters = sorted(
+        f"{f['field']} {f['op']} {','.join(map(str, f['value'])) if isinstance(f['value'], list) else f['value']}"
+        for f in extract_query_spec(intent.enhanced)["dimension_filters"]
+    )
+    if filters:
+        words.append(f"[{'; '.join(filters)}]")
+    resolved = f"{ga_query.resolve_date(start, today)}..{ga_query.resolve_date(end, today)}"
+    if intent.comparison:
+        resolved += f" vs {intent.comparison}"
+    return f"{' '.join(words)} @{resolved}"
+
+
+class IntentCache:
+    """Canonical question -> GA4 request spec (and explanation), per property
+
+    Entries are dicts with dimensions, metrics, date_range, end_date,
+    date_ranges (comparisons only), chart_type and explanation. Backed by a TwoTierCache, so answers
+    survive restarts and are shared by every session.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or TwoTierCache(
+            table="intents",
+            default_ttl=INTENT_CACHE_TTL,
+            max_memory_entries=INTENT_CACHE_ENTRIES,
+            max_disk_bytes=INTENT_CACHE_DISK_MB * 1024 * 1024,
+        )
+
+    @staticmethod
+    def _key(question):
+        payload = f"v{INTENT_VERSION}:{canonical_question(question)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _namespace(property_id):
+        property_id = str(property_id).strip()
+        return property_id if property_id.startswith("properties/") else f"properties/{property_id}"
+
+    @staticmethod
+    def _ttl(entry):
+        if not entry.get("explanation"):
+            return INTENT_CACHE_TTL
+        settled = date.today() - timedelta(days=ga_query.GA_PROCESSING_DAYS)
+        try:
+            if ga_query.resolve_date(entry.get("end_date", "today")) > settled:
+                return ga_query.REPORT_CACHE_TTL_RECENT
+        except ValueError:
+            return ga_query.REPORT_CACHE_TTL_RECENT
+        return INTENT_CACHE_TTL
+
+    def get(self, question, property_id):
+        """The cached entry for this question, or None"""
+        entry = self.cache.get(self._key(question), namespace=self._namespace(property_id))
+        return dict(entry) if entry is not None else None
+
+    def put(self, question, property_id, entry):
+        """Remember the request spec (and explanation, if any) for this question"""
+        entry = dict(entry)
+        self.cache.set(self._key(question), entry, ttl=self._ttl(entry),
+                       namespace=self._namespace(property_id))
+
+    def set_explanation(self, question, property_id, explanation):
+        """Attach an LLM explanation to an existing entry"""
+        entry = self.get(question, property_id)
+        if entry is not None:
+            entry["explanation"] = explanation
+            self.put(question, property_id, entry)
+
+    def invalidate(self, property_id=None):
+        self.cache.invalidate(None if property_id is None else self._namespace(property_id))
+
+    def summary(self):
+        return self.cache.summary()
+
+
+_intent_cache = None
+_intent_cache_lock = threading.Lock()
+
+
+def get_intent_cache():
+    """Process-wide IntentCache"""
+    global _intent_cache
+    with _intent_cache_lock:
+        if _intent_cache is None:
+            _intent_cache = IntentCache()
+        return _intent_cache
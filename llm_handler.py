@@ -1,3 +1,412 @@
-def enhance_prompt(prompt):
-    # This would use OpenAI API in production
-    return f"Enhanced report for: {prompt}"
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+# Seconds to open a connection, to wait for each streamed chunk, and for a whole answer
+CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", 30))
+TOTAL_TIMEOUT = float(os.environ.get("LLM_TOTAL_TIMEOUT", 120))
+
+MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", 800))
+
+# Keep-alive connections per provider session
+POOL_SIZE = 4
+
+# OpenAI-compatible endpoint used by the "Custom" provider (Ollama, vLLM, LM Studio, ...)
+CUSTOM_BASE_URL = os.environ.get("LLM_CUSTOM_BASE_URL", "http://localhost:11434/v1")
+
+# Report rows included in the prompt; the model gets the row count for the rest
+PROMPT_ROWS = 50
+
+# Sidebar labels (and the old session default) to provider names
+PROVIDER_NAMES = {
+    "OpenAI (ChatGPT)": "openai",
+    "OpenAI": "openai",
+    "Claude": "anthropic",
+    "Gemini (Google)": "gemini",
+    "Mistral": "mistral",
+    "Cohere": "cohere",
+    "Custom": "custom",
+    "Fake": "fake",
+}
+
+DEFAULT_MODELS = {
+    "openai": "gpt-4o-mini",
+    "anthropic": "claude-3-haiku-20240307",
+    "gemini": "gemini-1.5-flash",
+    "mistral": "mistral-small-latest",
+    "cohere": "command-r",
+    "custom": os.environ.get("LLM_CUSTOM_MODEL", "llama3"),
+    "fake": "fake",
+}
+
+SYSTEM_PROMPT = (
+    "You are a friendly Google Analytics assistant for beginners. Explain reports in plain "
+    "language, point out the most important numbers and suggest one next step. Be brief."
+)
+
+
+class LLMError(Exception):
+    """A provider returned an error or an unreadable stream"""
+
+
+class LLMTimeout(LLMError):
+    """The answer took longer than TOTAL_TIMEOUT"""
+
+
+class Provider(ABC):
+    """Streaming chat client for one provider and API key
+
+    Each instance owns a requests.Session, so the TLS connection is kept
+    alive between calls. Subclasses describe the HTTP request and how to
+    read text out of each streamed event; stream() does the rest:
+    timeouts, cancellation and the per-call timing in `last_call`.
+    """
+
+    name = ""
+
+    def __init__(self, api_key="", model=None, base_url=None):
+        self.api_key = api_key
+        self.model = model or DEFAULT_MODELS.get(self.name)
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {"calls": 0, "errors": 0, "reused": 0, "first_tokens": 0, "ttft_total": 0.0}
+        self.last_call = None
+        self._lock = threading.Lock()
+        self._sockets = weakref.WeakSet()
+
+    @abstractmethod
+    def request(self, prompt, system):
+        """Return (url, headers, json_body) for a streaming call"""
+
+    @abstractmethod
+    def text(self, event):
+        """Text carried by one decoded event, or None; raise LLMError on error events"""
+
+    def _reused(self, response):
+        """True if the response came over a socket an earlier call opened"""
+        connection = getattr(response.raw, "connection", None)
+        sock = getattr(connection, "sock", None)
+        if sock is None:
+            return False
+        with self._lock:
+            reused = sock in self._sockets
+            self._sockets.add(sock)
+        return reused
+
+    def _events(self, response):
+        """Decoded JSON events from an SSE or newline-delimited JSON stream"""
+        response.encoding = "utf-8"
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or line.startswith((":", "event:")):
+                continue
+            payload = line[5:].strip() if line.startswith("data:") else line
+            if payload == "[DONE]":
+                # Read on to the end of the body so the connection goes back to the pool
+                continue
+            try:
+                yield json.loads(payload)
+            except ValueError:
+                raise LLMError(f"Unreadable response from {self.name}: {payload[:200]}")
+
+    def stream(self, prompt, system=SYSTEM_PROMPT, cancel=None):
+        """Yield the answer as text chunks while it is generated
+
+        `cancel` is an optional threading.Event checked between chunks;
+        closing the generator (e.g. a Streamlit rerun) also aborts the call.
+        """
+        url, headers, body = self.request(prompt, system)
+        start = time.perf_counter()
+        call = {"provider": self.name, "model": self.model, "ttft": None, "seconds": None,
+                "chars": 0, "reused": False, "cancelled": False}
+        self.last_call = call
+        with self._lock:
+            self.stats["calls"] += 1
+        response = None
+        try:
+            response = self.session.post(url, headers=headers, json=body, stream=True,
+                                         timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            call["reused"] = self._reused(response)
+            if response.status_code >= 400:
+                raise LLMError(f"{self.name} returned HTTP {response.status_code}: {response.text[:300]}")
+            for event in self._events(response):
+                if cancel is not None and cancel.is_set():
+                    call["cancelled"] = True
+                    return
+                if time.perf_counter() - start > TOTAL_TIMEOUT:
+                    raise LLMTimeout(f"{self.name} did not finish within {TOTAL_TIMEOUT:.0f}s")
+                text = self.text(event)
+                if text:
+                    if call["ttft"] is None:
+                        call["ttft"] = time.perf_counter() - start
+                    call["chars"] += len(text)
+                    yield text
+        except requests.Timeout as e:
+            self._failed()
+            raise LLMTimeout(f"{self.name} timed out: {e}") from e
+        except (requests.RequestException, LLMError):
+            self._failed()
+            raise
+        finally:
+            call["seconds"] = time.perf_counter() - start
+            if response is not None:
+                response.close()
+            with self._lock:
+                self.stats["reused"] += call["reused"]
+                if call["ttft"] is not None:
+                    self.stats["first_tokens"] += 1
+                    self.stats["ttft_total"] += call["ttft"]
+
+    def _failed(self):
+        with self._lock:
+            self.stats["errors"] += 1
+
+    def complete(self, prompt, system=SYSTEM_PROMPT):
+        """The whole answer as one string"""
+        return "".join(self.stream(prompt, system))
+
+    def close(self):
+        self.session.close()
+
+
+class OpenAIProvider(Provider):
+    """OpenAI chat completions; Mistral and custom servers speak the same protocol"""
+
+    name = "openai"
+    default_base_url = "https://api.openai.com/v1"
+
+    def request(self, prompt, system):
+        base_url = (self.base_url or self.default_base_url).rstrip("/")
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        body = {
+            "model": self.model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+            "max_tokens": MAX_TOKENS,
+            "stream": True,
+        }
+        return f"{base_url}/chat/completions", headers, body
+
+    def text(self, event):
+        if "error" in event:
+            raise LLMError(f"{self.name}: {event['error']}")
+        choices = event.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content")
+
+
+class MistralProvider(OpenAIProvider):
+    name = "mistral"
+    default_base_url = "https://api.mistral.ai/v1"
+
+
+class CustomProvider(OpenAIProvider):
+    name = "custom"
+    default_base_url = CUSTOM_BASE_URL
+
+
+class AnthropicProvider(Provider):
+    name = "anthropic"
+
+    def request(self, prompt, system):
+        headers = {"x-api-key": self.api_key, "anthropic-version": "2023-06-01"}
+        body = {
+            "model": self.model,
+            "system": system,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": MAX_TOKENS,
+            "stream": True,
+        }
+        return "https://api.anthropic.com/v1/messages", headers, body
+
+    def text(self, event):
+        if event.get("type") == "error":
+            raise LLMError(f"anthropic: {event.get('error')}")
+        if event.get("type") == "content_block_delta":
+            return event["delta"].get("text")
+        return None
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+
+    def request(self, prompt, system):
+        url = (f"https://generativelanguage.googleapis.com/v1beta/models/"
+               f"{self.model}:streamGenerateContent?alt=sse")
+        body = {
+            "systemInstruction": {"parts": [{"text": system}]},
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {"maxOutputTokens": MAX_TOKENS},
+        }
+        return url, {"x-goog-api-key": self.api_key}, body
+
+    def text(self, event):
+        if "error" in event:
+            raise LLMError(f"gemini: {event['error']}")
+        parts = ((event.get("candidates") or [{}])[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+
+class CohereProvider(Provider):
+    name = "cohere"
+
+    def request(self, prompt, system):
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        body = {"model": self.model, "message": prompt, "preamble": system,
+                "max_tokens": MAX_TOKENS, "stream": True}
+        return "https://api.cohere.ai/v1/chat", headers, body
+
+    def text(self, event):
+        if event.get("event_type") == "stream-end" and event.get("finish_reason") == "ERROR":
+            raise LLMError(f"cohere: {event}")
+        if event.get("event_type") == "text-generation":
+            return event.get("text")
+        return None
+
+
+class FakeProvider(Provider):
+    """Offline provider for tests and demos: streams a canned answer, no network
+
+    `delay` is the pause before each word and `fail_after` raises LLMError
+    after that many words.
+    """
+
+    name = "fake"
+
+    def __init__(self, api_key="", model=None, base_url=None, delay=0.0, fail_after=None):
+        super().__init__(api_key, model, base_url)
+        self.delay = delay
+        self.fail_after = fail_after
+        self.prompts = []
+
+    def request(self, prompt, system):
+        # Never sent: stream() below answers without a network call
+        return "fake://", {}, {"prompt": prompt, "system": system}
+
+    def text(self, event):
+        return event.get("text")
+
+    def stream(self, prompt, system=SYSTEM_PROMPT, cancel=None):
+        self.prompts.append(prompt)
+        start = time.perf_counter()
+        call = {"provider": self.name, "model": self.model, "ttft": None, "seconds": None,
+                "chars": 0, "reused": self.stats["calls"] > 0, "cancelled": False}
+        self.last_call = call
+        self.stats["calls"] += 1
+        self.stats["reused"] += call["reused"]
+        words = f"This is a sample explanation for: {(prompt.splitlines() or [''])[0]}".split()
+        try:
+            for i, word in enumerate(words):
+                if cancel is not None and cancel.is_set():
+                    call["cancelled"] = True
+                    return
+                if self.fail_after is not None and i >= self.fail_after:
+                    self.stats["errors"] += 1
+                    raise LLMError("fake provider failure")
+                time.sleep(self.delay)
+                if call["ttft"] is None:
+                    call["ttft"] = time.perf_counter() - start
+                    self.stats["first_tokens"] += 1
+                    self.stats["ttft_total"] += call["ttft"]
+                text = word if i == 0 else f" {word}"
+                call["chars"] += len(text)
+                yield text
+        finally:
+            call["seconds"] = time.perf_counter() - start
+
+
+PROVIDER_CLASSES = {
+    cls.name: cls
+    for cls in (OpenAIProvider, MistralProvider, CustomProvider, AnthropicProvider,
+                GeminiProvider, CohereProvider, FakeProvider)
+}
+
+# Process-wide pool: {(provider, key hash, model, base_url): Provider}
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def provider_name(label):
+    """Provider name for a sidebar label such as "OpenAI (ChatGPT)" """
+    return PROVIDER_NAMES.get(label, str(label).lower())
+
+
+def get_provider(label, api_key="", model=None, base_url=None):
+    """Return the pooled Provider for this provider and API key"""
+    name = provider_name(label)
+    if name not in PROVIDER_CLASSES:
+        raise LLMError(f"Unknown AI provider: {label}")
+    key = (name, hashlib.sha256(api_key.encode("utf-8")).hexdigest(), model, base_url)
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = PROVIDER_CLASSES[name](api_key, model, base_url)
+            _providers[key] = provider
+        return provider
+
+
+def release_providers(label=None):
+    """Close pooled sessions for one provider, or all of them"""
+    name = None if label is None else provider_name(label)
+    with _providers_lock:
+        for key in [key for key in _providers if name is None or key[0] == name]:
+            _providers.pop(key).close()
+
+
+def provider_summary():
+    """Call counts, connection reuse and mean time to first token per provider"""
+    summary = {}
+    with _providers_lock:
+        providers = list(_providers.values())
+    for provider in providers:
+        info = summary.setdefault(
+            provider.name, {"calls": 0, "errors": 0, "reused": 0, "first_tokens": 0, "ttft_total": 0.0}
+        )
+        for field in info:
+            info[field] += provider.stats[field]
+    for info in summary.values():
+        # Calls that failed or were cancelled before any text have no time to first token
+        info["mean_ttft"] = info["ttft_total"] / info["first_tokens"] if info["first_tokens"] else None
+    return summary
+
+
+def explanation_prompt(question, df):
+    """Prompt asking for a plain-language explanation of a report"""
+    table = df.head(PROMPT_ROWS).to_csv(index=False)
+    more = f"\n(showing {PROMPT_ROWS} of {len(df):,} rows)" if len(df) > PROMPT_ROWS else ""
+    return f"Question: {question}\n\nGoogle Analytics report (CSV):\n{table}{more}"
+
+
+def enhance_prompt(prompt, provider="OpenAI", api_key=""):
+    """Ask the LLM to rephrase a question as a clear analytics request"""
+    return get_provider(provider, api_key).complete(
+        prompt, system="Rewrite this Google Analytics question so it is clear and specific. "
+                       "Reply with the rewritten question only."
+    )
+
+
+def stream_explanation(question, df):
+    """Stream an explanation of the report with the AI settings from the sidebar
+
+    Meant for st.write_stream. Errors are shown with st.error and end the
+    stream instead of raising.
+    """
+    try:
+        provider = get_provider(st.session_state.get("llm_provider", "OpenAI"),
+                                st.session_state.get("api_key", ""))
+        yield from provider.stream(explanation_prompt(question, df))
+    except LLMTimeout:
+        st.error("⏳ The AI assistant took too long to answer. Please try again.")
+    except LLMError as e:
+        st.error(f"❌ AI assistant error: {e}")
+    except requests.RequestException as e:
+        st.error(f"🔌 Could not reach the AI provider: {e}")
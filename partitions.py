@@ -0,0 +1,76 @@
+from datetime import timedelta
+import pandas as pd
+
+# Metrics whose value for a date range is the sum of their daily values.
+# User counts and ratios (activeUsers, bounceRate, ...) are not additive.
+ADDITIVE_METRICS = {
+    "sessions", "engagedSessions", "newUsers", "screenPageViews", "eventCount",
+    "conversions", "keyEvents", "userEngagementDuration", "transactions",
+    "ecommercePurchases", "purchaseRevenue", "totalRevenue", "grossPurchaseRevenue",
+    "itemRevenue", "itemsViewed", "itemsAddedToCart", "itemsPurchased", "addToCarts",
+    "checkouts", "publisherAdClicks", "publisherAdImpressions", "totalAdRevenue",
+    "adUnitExposure", "advertiserAdClicks", "advertiserAdCost", "advertiserAdImpressions",
+}
+
+# Dimensions that already split rows by day, so any metric can be partitioned
+DAILY_DIMENSIONS = {"date", "dateHour", "dateHourMinute"}
+
+
+def is_partitionable(dimensions, metrics):
+    """True if a report can be rebuilt from its per-day partitions"""
+    if not metrics:
+        return False
+    if DAILY_DIMENSIONS.intersection(dimensions):
+        return True
+    return all(metric in ADDITIVE_METRICS for metric in metrics)
+
+
+def days_between(start, end):
+    """Every date from start to end inclusive"""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def contiguous_spans(days):
+    """Group sorted dates into (first, last) runs of consecutive days"""
+    spans = []
+    for day in days:
+        if spans and day - spans[-1][1] == timedelta(days=1):
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return [tuple(span) for span in spans]
+
+
+def split_by_day(df, days, date_column="date", keep_date=False):
+    """Split a report fetched with a date dimension into {day: DataFrame}
+
+    Days without any rows get an empty frame so they are cached too.
+    """
+    keys = pd.to_datetime(df[date_column], format="%Y%m%d", errors="coerce").dt.date
+    columns = list(df.columns) if keep_date else [c for c in df.columns if c != date_column]
+    grouped = {day: part for day, part in df[columns].groupby(keys, sort=False)}
+    empty = df[columns].iloc[0:0]
+    return {day: grouped.get(day, empty).reset_index(drop=True) for day in days}
+
+
+def combine_partitions(frames, dimensions, metrics):
+    """Re-aggregate per-day frames into one report for the whole range"""
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=list(dimensions) + list(metrics))
+    df = pd.concat(frames, ignore_index=True)
+    for metric in metrics:
+        df[metric] = pd.to_numeric(df[metric], errors="coerce")
+    if DAILY_DIMENSIONS.intersection(dimensions):
+        # Rows are already per day, partitions only need stitching together
+        df = df[list(dimensions) + list(metrics)].reset_index(drop=True)
+    elif dimensions:
+        df = df.groupby(list(dimensions), sort=False, observed=True)[list(metrics)].sum().reset_index()
+        df = df.sort_values(metrics[0], ascending=False, kind="stable").reset_index(drop=True)
+    else:
+        df = df[list(metrics)].sum().to_frame().T
+    # Concatenating partitions with different categories falls back to object
+    for dimension in dimensions:
+        if df[dimension].dtype == object:
+            df[dimension] = df[dimension].astype("category")
+    return df
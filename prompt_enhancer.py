@@ -1,39 +1,162 @@
-def enhance_prompt(query):
-    """Transform queries into beginner-friendly analytics requests"""
-    # Simple mapping for common terms
-    term_map = {
-        "users": "number of visitors",
-        "traffic": "website visits",
-        "bounce": "visitors who left quickly",
-        "device": "device type (phone, computer, tablet)",
-        "country": "visitor location",
-        "source": "where visitors came from",
-        "page": "specific pages visited",
-        "sessions": "visits to your site",
-        "organic": "search engine traffic",
-        "direct": "people typing your URL",
-        "referral": "links from other sites"
-    }
-    
-    # Explain technical terms
-    enhanced = query
-    for term, explanation in term_map.items():
-        if term in enhanced.lower():
-            enhanced = enhanced.replace(term, f"{term} ({explanation})")
-    
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import tracing
+
+# Simple mapping for common terms
+TERM_MAP = {
+    "users": "number of visitors",
+    "traffic": "website visits",
+    "bounce": "visitors who left quickly",
+    "device": "device type (phone, computer, tablet)",
+    "country": "visitor location",
+    "source": "where visitors came from",
+    "page": "specific pages visited",
+    "sessions": "visits to your site",
+    "organic": "search engine traffic",
+    "direct": "people typing your URL",
+    "referral": "links from other sites"
+}
+
+# Days covered by "last N <unit>"
+TIME_UNITS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+# Words that hint at a chart type; "by <dimension>" and "bar/line/pie chart" win over these
+CHART_WORDS = {
+    "trend": "line", "over time": "line", "date": "line",
+    "proportion": "pie", "percentage": "pie", "share": "pie",
+    "scatter": "scatter", "correlation": "scatter",
+}
+CHART_PRIORITY = ["line", "pie", "scatter"]
+
+# Date range phrases ("last 3 months", "this week", "5 days ago", "yesterday")
+_TIME_RANGE = (
+    r"(?:last|past)\s+(?P<count>\d+)\s+(?P<unit>day|week|month|year)s?"
+    r"|(?:last|past|this)\s+(?P<single>day|week|month|year)"
+    r"|(?P<ago>\d+)\s+days?\s+ago"
+    r"|today|yesterday"
+)
+
+# Period-over-period phrases ("vs last month", "year over year"); "year" ones compare
+# with the same dates a year earlier, the rest with the period just before
+_COMPARISON = (
+    r"(?:vs\.?|versus|compared\s+(?:to|with)|against)\s+(?:the\s+)?"
+    r"(?:previous|prior|last|same)\s+(?:period|day|week|month|year)(?:\s+last\s+year)?"
+    r"|(?:day|week|month|year)[\s-]+over[\s-]+(?:day|week|month|year)"
+    r"|yoy|mom|wow"
+)
+
+# Comparison phrases, for callers that resolve fields without them ("year over year" is no "year" breakdown)
+COMPARISON_PHRASES = re.compile(r"\b(?:" + _COMPARISON + r")\b", re.IGNORECASE)
+
+# Every time phrase, for callers that want a question without them
+TIME_PHRASES = re.compile(r"\b(?:" + _TIME_RANGE + r"|(?:week|month|year|ago)s?)\b", re.IGNORECASE)
+
+# Everything the enhancer looks for, in one case-insensitive pass over the question.
+# Longer alternatives come first so "last 3 months" wins over "month".
+_PATTERN = re.compile(
+    r"\b(?:"
+    r"(?P<compare>" + _COMPARISON + r")"
+    r"|(?P<range>" + _TIME_RANGE + r")"
+    r"|(?P<time>week|month|year|ago)s?"
+    r"|(?P<explicit>bar|line|pie|scatter)\s+(?:chart|graph|plot)s?"
+    r"|(?P<chart>" + "|".join(sorted(CHART_WORDS, key=len, reverse=True)) + r")"
+    r"|(?P<viz>chart|graph)s?"
+    r"|by(?=\s+(?P<breakdown>[\w ]+?)\s*(?:[.,;:?!()]|\b(?:for|over|in|during|from|on|and|last|this|past)\b|$))"
+    r"|(?P<term>" + "|".join(sorted(TERM_MAP, key=len, reverse=True)) + r")s?"
+    r")\b",
+    re.IGNORECASE,
+)
+
+# What a question asks for, derived once and shared by the app and the charts
+QueryIntent = namedtuple("QueryIntent", "enhanced time_range breakdown chart_type comparison")
+
+
+def _time_range(match):
+    """(start_date, end_date) in GA4 relative syntax for a matched time phrase"""
+    text = match.group("range").lower()
+    if text == "today":
+        return ("today", "today")
+    if text == "yesterday":
+        return ("yesterday", "yesterday")
+    if match.group("ago"):
+        day = f"{int(match.group('ago'))}daysAgo"
+        return (day, day)
+    if match.group("count"):
+        days = int(match.group("count")) * TIME_UNITS[match.group("unit").lower()]
+    else:
+        days = TIME_UNITS[match.group("single").lower()]
+    return (f"{days}daysAgo", "today")
+
+
+@lru_cache(maxsize=512)
+def analyze_query(query):
+    """Enhance a question and extract its intent in a single regex pass
+
+    Returns a QueryIntent with the beginner-friendly question, the
+    (start, end) date range asked for (None means the default 30 days),
+    the text after "by", the chart type (bar/line/pie/scatter or None) and
+    the period to compare against ("previous", "year" or None).
+    Explanations are inserted as the question is scanned, so they are
+    never matched again.
+    """
+    found = {"time": False, "viz": False, "range": None, "breakdown": None, "explicit": None, "charts": [],
+             "compare": None}
+
+    def rewrite(match):
+        text = match.group(0)
+        if match.group("compare"):
+            lowered = text.lower()
+            year = lowered == "yoy" or lowered.endswith("year")
+            found["compare"] = found["compare"] or ("year" if year else "previous")
+        elif match.group("range"):
+            found["time"] = True
+            found["range"] = found["range"] or _time_range(match)
+        elif match.group("time"):
+            found["time"] = True
+        elif match.group("explicit"):
+            found["viz"] = True
+            found["explicit"] = found["explicit"] or match.group("explicit").lower()
+        elif match.group("chart"):
+            found["charts"].append(CHART_WORDS[match.group("chart").lower()])
+        elif match.group("viz"):
+            found["viz"] = True
+        elif match.group("breakdown") is not None:
+            found["breakdown"] = found["breakdown"] or match.group("breakdown").strip()
+        elif match.group("term"):
+            return f"{text} ({TERM_MAP[match.group('term').lower()]})"
+        return text
+
+    # Only recorded on cache misses; repeated questions cost a dict lookup
+    with tracing.span("prompt.analyze", cache="miss", chars=len(query)):
+        enhanced = _PATTERN.sub(rewrite, query)
+
     # Add date context if missing
-    time_terms = ["yesterday", "week", "month", "year", "today", "ago"]
-    if not any(term in enhanced.lower() for term in time_terms):
+    if not found["time"]:
         enhanced += " for the last 30 days"
-    
+
     # Add visualization suggestion
-    if "chart" not in enhanced.lower() and "graph" not in enhanced.lower():
-        if " by " in enhanced:
+    if not found["viz"]:
+        if found["breakdown"]:
             enhanced += ". Show in an easy-to-understand bar chart"
         else:
             enhanced += ". Display in a simple table"
-    
+
     # Add friendly explanation
     enhanced += " - Please explain what this means in simple terms!"
-    
-    return enhanced
+
+    if found["explicit"]:
+        chart_type = found["explicit"]
+    elif found["breakdown"]:
+        chart_type = "bar"
+    elif found["charts"]:
+        chart_type = min(found["charts"], key=CHART_PRIORITY.index)
+    else:
+        chart_type = None
+    return QueryIntent(enhanced, found["range"], found["breakdown"], chart_type, found["compare"])
+
+
+def enhance_prompt(query):
+    """Transform queries into beginner-friendly analytics requests"""
+    return analyze_query(query).enhanced
@@ -1,19 +1,219 @@
 import re
 
-def extract_ga_parameters(query):
-    """Extract dimensions and metrics from natural language query"""
-    # Predefined GA4 parameters
-    valid_dimensions = ["country", "city", "deviceCategory", "pagePath", "sourceMedium"]
-    valid_metrics = ["activeUsers", "sessions", "bounceRate", "avgSessionDuration"]
-    
-    # Extract mentioned parameters
-    found_dimensions = [dim for dim in valid_dimensions if dim in query]
-    found_metrics = [met for met in valid_metrics if met in query]
-    
+from ga_schema import MAX_DIMENSIONS, MAX_METRICS, builtin_schema, strip_glosses
+from prompt_enhancer import COMPARISON_PHRASES
+
+# Rows returned for "top pages" when no number is given
+DEFAULT_TOP_N = 10
+
+# deviceCategory values and the words people use for them
+DEVICE_WORDS = {
+    "mobile": "mobile", "phone": "mobile", "phones": "mobile", "smartphone": "mobile",
+    "smartphones": "mobile", "desktop": "desktop", "computer": "desktop", "computers": "desktop",
+    "tablet": "tablet", "tablets": "tablet",
+}
+
+# Country names as GA4 reports them
+COUNTRY_NAMES = (
+    "Afghanistan", "Albania", "Algeria", "Andorra", "Angola", "Argentina", "Armenia", "Australia",
+    "Austria", "Azerbaijan", "Bahamas", "Bahrain", "Bangladesh", "Barbados", "Belarus", "Belgium",
+    "Belize", "Benin", "Bhutan", "Bolivia", "Bosnia & Herzegovina", "Botswana", "Brazil", "Brunei",
+    "Bulgaria", "Burkina Faso", "Burundi", "Cambodia", "Cameroon", "Canada", "Cape Verde", "Chad",
+    "Chile", "China", "Colombia", "Costa Rica", "Côte d’Ivoire", "Croatia", "Cuba", "Cyprus",
+    "Czechia", "Denmark", "Djibouti", "Dominican Republic", "Ecuador", "Egypt", "El Salvador",
+    "Estonia", "Ethiopia", "Fiji", "Finland", "France", "Gabon", "Gambia", "Georgia", "Germany",
+    "Ghana", "Greece", "Guatemala", "Guinea", "Guyana", "Haiti", "Honduras", "Hong Kong", "Hungary",
+    "Iceland", "India", "Indonesia", "Iran", "Iraq", "Ireland", "Israel", "Italy", "Jamaica", "Japan",
+    "Jordan", "Kazakhstan", "Kenya", "Kosovo", "Kuwait", "Kyrgyzstan", "Laos", "Latvia", "Lebanon",
+    "Lesotho", "Liberia", "Libya", "Liechtenstein", "Lithuania", "Luxembourg", "Madagascar",
+    "Malawi", "Malaysia", "Maldives", "Mali", "Malta", "Mauritania", "Mauritius", "Mexico",
+    "Moldova", "Monaco", "Mongolia", "Montenegro", "Morocco", "Mozambique", "Myanmar (Burma)",
+    "Namibia", "Nepal", "Netherlands", "New Zealand", "Nicaragua", "Niger", "Nigeria",
+    "North Macedonia", "Norway", "Oman", "Pakistan", "Panama", "Papua New Guinea", "Paraguay", "Peru",
+    "Philippines", "Poland", "Portugal", "Puerto Rico", "Qatar", "Romania", "Russia", "Rwanda",
+    "Saudi Arabia", "Senegal", "Serbia", "Sierra Leone", "Singapore", "Slovakia", "Slovenia",
+    "Somalia", "South Africa", "South Korea", "Spain", "Sri Lanka", "Sudan", "Suriname", "Sweden",
+    "Switzerland", "Syria", "Taiwan", "Tajikistan", "Tanzania", "Thailand", "Togo",
+    "Trinidad & Tobago", "Tunisia", "Türkiye", "Turkmenistan", "Uganda", "Ukraine",
+    "United Arab Emirates", "United Kingdom", "United States", "Uruguay", "Uzbekistan", "Venezuela",
+    "Vietnam", "Yemen", "Zambia", "Zimbabwe",
+)
+
+# Other spellings of those names
+COUNTRY_ALIASES = {
+    "usa": "United States", "america": "United States",
+    "united states of america": "United States", "uk": "United Kingdom", "britain": "United Kingdom",
+    "great britain": "United Kingdom", "england": "United Kingdom", "uae": "United Arab Emirates",
+    "holland": "Netherlands", "czech republic": "Czechia", "turkey": "Türkiye", "korea": "South Korea",
+    "burma": "Myanmar (Burma)", "myanmar": "Myanmar (Burma)", "ivory coast": "Côte d’Ivoire",
+    "bosnia": "Bosnia & Herzegovina", "trinidad": "Trinidad & Tobago", "macedonia": "North Macedonia",
+}
+
+# Traffic sources matched against sessionSource
+SOURCE_NAMES = {"google", "facebook", "instagram", "bing", "twitter", "linkedin", "youtube", "yahoo",
+                "duckduckgo", "reddit", "tiktok", "pinterest"}
+
+# "top 5 pages", or "least visited 5 pages" with up to two words before the number;
+# "at least"/"at most" are thresholds, not rankings
+_GAP_STOP = r"(?:in|on|from|for|of|by|since|during|last|past|this|than|with|and|or)"
+_TOP = re.compile(
+    r"(?<!\bat\s)\b(?:(top|best|most)|(bottom|worst|least))"
+    rf"(?:\s+(\d{{1,5}})|\s+(?:(?!{_GAP_STOP}\b)[a-z]+\s+){{1,2}}(\d{{1,5}})(?=\s+[a-z]))?\b",
+    re.IGNORECASE,
+)
+_COUNT_FIRST = re.compile(r"\b(\d{1,5})\s+(?:most|top|best|(least|bottom|worst))\b", re.IGNORECASE)
+_DEVICE = re.compile(
+    r"\b(?:on|from|using|via)\s+(" + "|".join(DEVICE_WORDS) + r")\b|\b(" + "|".join(DEVICE_WORDS) + r")\s+(?:users|visitors|traffic|only)\b",
+    re.IGNORECASE,
+)
+_DEVICE_WORD = re.compile(r"\b(" + "|".join(DEVICE_WORDS) + r")\b", re.IGNORECASE)
+_COUNTRIES = {name.lower(): name for name in COUNTRY_NAMES}
+_COUNTRIES.update(COUNTRY_ALIASES)
+# Longest names first, so "United States of America" wins over "United States"
+_COUNTRY = "|".join(re.escape(name) for name in sorted(_COUNTRIES, key=len, reverse=True))
+# "us" is a pronoun ("bought from us"); only the capitals "US"/"U.S." mean the country
+_US = r"(?-i:US\b|U\.S\.(?:A\.)?)"
+_COUNTRY_NAME = re.compile(rf"\b(?:the\s+)?({_COUNTRY}\b|{_US})", re.IGNORECASE)
+_PLACE = re.compile(
+    rf"\b(?:from|in)\s+(?:the\s+)?(?:(?:{_COUNTRY})\b|{_US})"
+    rf"(?:\s*(?:,|and|or|,\s*and|,\s*or)\s*(?:the\s+)?(?:(?:{_COUNTRY})\b|{_US}))*",
+    re.IGNORECASE,
+)
+# A filtered field stays a breakdown only when asked for explicitly ("by country")
+_BREAKDOWN = {
+    "deviceCategory": re.compile(r"\bby\s+device", re.IGNORECASE),
+    "country": re.compile(r"\bby\s+countr", re.IGNORECASE),
+    "sessionSource": re.compile(r"\bby\s+(?:session\s+)?source", re.IGNORECASE),
+}
+_SOURCE = re.compile(r"\bfrom\s+(" + "|".join(SOURCE_NAMES) + r")\b", re.IGNORECASE)
+_THRESHOLD = re.compile(
+    r"\b(more than|over|above|at least|fewer than|less than|under|below|at most)\s+"
+    r"(\d[\d,]*(?:\.\d+)?)\s+([a-zA-Z][\w ]*?)(?=$|[.,;:?!()]|\s+(?:and|for|in|on|from|last|this|past|by)\b)",
+    re.IGNORECASE,
+)
+THRESHOLD_OPS = {
+    "more than": ">", "over": ">", "above": ">", "at least": ">=",
+    "fewer than": "<", "less than": "<", "under": "<", "below": "<", "at most": "<=",
+}
+
+
+def _places(text):
+    """Known countries mentioned as "from Germany" / "in the United States and Canada"
+
+    Matching ignores case; words that are not country names ("in Chrome",
+    "from New York") are left alone rather than filtering on nothing.
+    """
+    places = []
+    for match in _PLACE.finditer(text):
+        for name in _COUNTRY_NAME.finditer(match.group(0)):
+            country = _COUNTRIES.get(name.group(1).lower(), "United States")
+            if country not in places:
+                places.append(country)
+    return places
+
+
+def _devices(text):
+    """deviceCategory values named in a question, in order of mention"""
+    devices = []
+    for match in _DEVICE_WORD.finditer(text):
+        device = DEVICE_WORDS[match.group(1).lower()]
+        if device not in devices:
+            devices.append(device)
+    return devices
+
+
+def extract_query_spec(query, schema=None):
+    """Turn a question into a report spec that GA4 can filter, sort and cut server-side
+
+    Returns a dict with dimensions and metrics (as extract_ga_parameters)
+    plus dimension_filters, metric_filters, order_by, limit and totals in
+    the form ga_query.build_report_request accepts. "top 10 pages from
+    Germany on mobile" becomes a country and deviceCategory filter, a
+    descending order on the first metric and a limit of 10.
+    """
+    schema = schema or builtin_schema()
+    text = COMPARISON_PHRASES.sub(" ", strip_glosses(query))
+    dimensions, metrics = schema.resolve(text)
+    dimension_filters = []
+    metric_filters = []
+
+    # Filter values are not fields to break down by ("on mobile" is not "by device"),
+    # but "mobile vs desktop" compares devices: keep those and break down by device
+    devices = _devices(text)
+    compared = set()
+    if len(devices) > 1:
+        dimension_filters.append({"field": "deviceCategory", "op": "in", "value": devices})
+        if "deviceCategory" not in dimensions:
+            dimensions.insert(0, "deviceCategory")
+        compared.add("deviceCategory")
+    elif _DEVICE.search(text):
+        dimension_filters.append({"field": "deviceCategory", "op": "eq", "value": devices[0]})
+    places = _places(text)
+    if places:
+        dimension_filters.append(
+            {"field": "country", "op": "eq", "value": places[0]} if len(places) == 1
+            else {"field": "country", "op": "in", "value": places}
+        )
+    for match in _SOURCE.finditer(text):
+        dimension_filters.append({"field": "sessionSource", "op": "contains", "value": match.group(1).lower()})
+    filtered = {f["field"] for f in dimension_filters} - compared
+    dimensions = [d for d in dimensions if d not in filtered or _BREAKDOWN[d].search(text)]
+
+    for match in _THRESHOLD.finditer(text):
+        field_dims, field_metrics = schema.resolve(match.group(3))
+        if not field_metrics:
+            continue
+        value = float(match.group(2).replace(",", ""))
+        metric_filters.append({
+            "field": field_metrics[0],
+            "op": THRESHOLD_OPS[match.group(1).lower()],
+            "value": int(value) if value.is_integer() else value,
+        })
+        if field_metrics[0] not in metrics:
+            metrics.append(field_metrics[0])
+
+    dimensions = dimensions[:MAX_DIMENSIONS]
+    metrics = metrics[:MAX_METRICS]
+
     # Add defaults if none found
-    if not found_dimensions:
-        found_dimensions = ["deviceCategory"]
-    if not found_metrics:
-        found_metrics = ["activeUsers"]
-    
-    return found_dimensions, found_metrics
\ No newline at end of file
+    if not dimensions:
+        dimensions = ["deviceCategory"]
+    if not metrics:
+        metrics = ["activeUsers"]
+
+    limit = None
+    order_by = []
+    # Thresholds ("at least 5 sessions") are filters, never a row limit
+    ranking = _THRESHOLD.sub(" ", text)
+    top = _TOP.search(ranking)
+    count_first = _COUNT_FIRST.search(ranking)
+    if count_first:
+        limit = int(count_first.group(1))
+        order_by = [{"field": metrics[0], "desc": not count_first.group(2)}]
+    elif top:
+        number = top.group(3) or top.group(4)
+        limit = int(number) if number else DEFAULT_TOP_N
+        order_by = [{"field": metrics[0], "desc": not top.group(2)}]
+
+    return {
+        "dimensions": dimensions,
+        "metrics": metrics,
+        "dimension_filters": dimension_filters,
+        "metric_filters": metric_filters,
+        "order_by": order_by,
+        "limit": limit,
+        # Totals show what share of everything a top-N list covers
+        "totals": bool(limit),
+    }
+
+
+def extract_ga_parameters(query, schema=None):
+    """Extract dimensions and metrics from natural language query
+
+    Fields are resolved against `schema` (a ga_schema.SchemaIndex, the
+    connected property's when available) so custom dimensions and metrics
+    are recognised too. Parenthesised explanations added by the prompt
+    enhancer are ignored. See extract_query_spec for filters and limits.
+    """
+    spec = extract_query_spec(query, schema)
+    return spec["dimensions"], spec["metrics"]
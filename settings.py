@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+
+import streamlit as st
+
+# Saved connection and AI settings, used to auto-connect on the next visit
+CREDENTIALS_PATH = os.path.join(os.path.expanduser("~"), ".ga4_assistant_credentials.json")
+PROPERTY_ID_PATH = os.path.join(os.path.expanduser("~"), ".ga4_assistant_propertyid.txt")
+LLM_SETTINGS_PATH = os.path.join(os.path.expanduser("~"), ".ga4_assistant_llm.json")
+
+# Target time for one script rerun, shown in the sidebar (milliseconds)
+RERUN_BUDGET_MS = float(os.environ.get("GA4_RERUN_BUDGET_MS", 250))
+
+# Reruns kept for the sidebar average
+RERUN_HISTORY = 20
+
+# Parsed files: {path: ((mtime_ns, size), value)}
+_files = {}
+_files_lock = threading.Lock()
+
+
+def _load(path, parse):
+    """Return the parsed file, re-reading it only when its mtime or size changed
+
+    A rerun costs one stat() per file instead of a read and a parse.
+    Missing or unreadable files give None.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        with _files_lock:
+            _files.pop(path, None)
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _files_lock:
+        cached = _files.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    try:
+        with open(path, "r") as f:
+            value = parse(f)
+    except (OSError, ValueError):
+        return None
+    with _files_lock:
+        _files[path] = (version, value)
+    return value
+
+
+def load_json(path):
+    return _load(path, json.load)
+
+
+def load_text(path):
+    return _load(path, lambda f: f.read().strip())
+
+
+def save_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def save_text(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def remove(path):
+    """Delete a saved settings file if it exists"""
+    if os.path.exists(path):
+        os.remove(path)
+    with _files_lock:
+        _files.pop(path, None)
+
+
+def saved_connection():
+    """(credentials, property_id) saved by a previous session, or None"""
+    credentials = load_json(CREDENTIALS_PATH)
+    property_id = load_text(PROPERTY_ID_PATH)
+    if not credentials or not property_id:
+        return None
+    return credentials, property_id
+
+
+def saved_llm_settings():
+    """{"provider", "api_key"} saved by a previous session, or None"""
+    return load_json(LLM_SETTINGS_PATH)
+
+
+def info_once(key, message):
+    """Show an info banner on the first run of a session only"""
+    shown = st.session_state.setdefault("_banners_shown", set())
+    if key not in shown:
+        shown.add(key)
+        st.info(message)
+
+
+class RerunTimer:
+    """Wall time of one script run, split into named sections"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.sections = {}
+
+    def mark(self, name):
+        """Close the section that ended now"""
+        now = time.perf_counter()
+        self.sections[name] = self.sections.get(name, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def total_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def record(self):
+        """Store this run in the session and return the recent history"""
+        history = st.session_state.setdefault("_rerun_ms", [])
+        history.append({"total": self.total_ms(), "sections": dict(self.sections)})
+        del history[:-RERUN_HISTORY]
+        return history
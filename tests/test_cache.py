@@ -0,0 +1,97 @@
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+from cache import SingleFlight, TwoTierCache
+
+
+def test_two_tier_cache_expires_and_evicts(tmp_path):
+    cache = TwoTierCache(path=str(tmp_path / "cache.sqlite"), default_ttl=60, max_memory_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=-1)
+    cache.set("c", 3)
+    cache.set("d", 4)
+    assert cache.get("b") is None
+    # "a" fell out of memory but is still on disk
+    assert cache.get("a") == 1
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_two_tier_cache_survives_restart_and_namespaces(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    TwoTierCache(path=path).set("key", {"rows": 3}, namespace="properties/1")
+    cache = TwoTierCache(path=path)
+    assert cache.get("key", namespace="properties/1") == {"rows": 3}
+    assert cache.get("key", namespace="properties/2") is None
+    cache.invalidate("properties/1")
+    assert TwoTierCache(path=path).get("key", namespace="properties/1") is None
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "report"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert results == ["report"] * 4
+    assert calls == [1]
+    assert flight.stats == {"leaders": 1, "followers": 3}
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    flight = SingleFlight()
+    future, leader = flight.claim("key")
+    follower, is_leader = flight.claim("key")
+    assert leader and not is_leader and follower is future
+    flight.resolve("key", future, error=ValueError("boom"))
+    with pytest.raises(ValueError):
+        follower.result()
+    assert flight.do("key", lambda: 2) == 2
+
+
+def test_single_flight_async_joins_sync_call():
+    flight = SingleFlight()
+    future, _ = flight.claim("key")
+
+    async def follow():
+        waiter = asyncio.ensure_future(flight.do_async("key", lambda: None))
+        await asyncio.sleep(0)
+        flight.resolve("key", future, "report")
+        return await waiter
+
+    assert asyncio.run(follow()) == "report"
+
+
+class Renamed:
+    pass
+
+
+def test_unloadable_rows_are_misses_and_dropped(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite")
+    TwoTierCache(path=path).set("key", Renamed())
+    TwoTierCache(path=path).set("garbage", "value")
+    cache = TwoTierCache(path=path)
+    cache._db().execute("UPDATE reports SET payload = ? WHERE key = 'garbage'", (b"not a pickle",))
+    # The class the row was pickled with no longer exists
+    monkeypatch.delattr(sys.modules[__name__], "Renamed")
+    assert cache.get("key") is None
+    assert cache.get("garbage") is None
+    assert cache.stats["misses"] == 2
+    assert cache.summary()["disk_entries"] == 0
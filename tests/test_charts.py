@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from charts import OTHER_LABEL, downsample_series, generate_chart, lttb, reduced_view, top_n
+
+
+def test_lttb_keeps_ends_and_peaks():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[500] = 100
+    picked = lttb(x, y, 20)
+    assert len(picked) == 20
+    assert picked[0] == 0 and picked[-1] == 999
+    assert 500 in picked
+    assert np.all(np.diff(picked) > 0)
+
+
+def test_lttb_leaves_small_series_alone():
+    assert lttb(np.arange(5), np.arange(5), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_downsample_series_sorts_dates():
+    df = pd.DataFrame({"date": pd.date_range("2026-01-01", periods=300)[::-1], "sessions": range(300)})
+    reduced = downsample_series(df, "date", "sessions", 50)
+    assert len(reduced) == 50
+    assert reduced["date"].is_monotonic_increasing
+
+
+def test_top_n_sums_additive_metrics_into_other():
+    df = pd.DataFrame({"country": list("abcde"), "sessions": [50, 40, 30, 20, 10]})
+    rolled = top_n(df, "country", "sessions", 3)
+    assert rolled["country"].tolist() == ["a", "b", OTHER_LABEL]
+    assert rolled["sessions"].tolist() == [50, 40, 60]
+
+
+def test_top_n_averages_ratios():
+    df = pd.DataFrame({"country": list("abcd"), "bounceRate": [0.9, 0.5, 0.4, 0.2]})
+    rolled = top_n(df, "country", "bounceRate", 2)
+    assert rolled["country"].tolist() == ["a", f"{OTHER_LABEL} (avg)"]
+    assert rolled["bounceRate"].iloc[-1] == np.mean([0.5, 0.4, 0.2])
+
+
+def test_large_bar_chart_is_reduced_and_captioned():
+    df = pd.DataFrame({"pagePath": [f"/page/{i}" for i in range(500)], "sessions": range(500)})
+    fig = generate_chart(df, "sessions by page", kind="bar")
+    assert fig.layout.meta["plotted"] < 500
+    assert reduced_view(fig)
@@ -0,0 +1,76 @@
+import pandas as pd
+
+import ga_query
+from charts import comparison_chart
+from decoder import PERIOD_COLUMN, align_periods, compare_periods
+from prompt_enhancer import analyze_query
+
+PERIODS = [ga_query.CURRENT_PERIOD, ga_query.COMPARISON_PERIODS["previous"]]
+
+
+def daily():
+    return pd.DataFrame({
+        "date": list(pd.date_range("2026-09-01", periods=3)) + list(pd.date_range("2026-08-01", periods=3)),
+        PERIOD_COLUMN: [PERIODS[0]] * 3 + [PERIODS[1]] * 3,
+        "sessions": [10, 20, 30, 5, 10, 0],
+    })
+
+
+def test_comparison_ranges():
+    assert ga_query.comparison_ranges("2026-09-01", "2026-09-30", "previous") == [
+        {"name": PERIODS[0], "start_date": "2026-09-01", "end_date": "2026-09-30"},
+        {"name": PERIODS[1], "start_date": "2026-08-02", "end_date": "2026-08-31"},
+    ]
+    assert ga_query.comparison_ranges("2026-09-01", "2026-09-30", "year")[1]["start_date"] == "2025-09-01"
+
+
+def test_comparison_phrases():
+    assert analyze_query("sessions this month vs last month").comparison == "previous"
+    assert analyze_query("users year over year").comparison == "year"
+    assert analyze_query("users by country").comparison is None
+
+
+def test_align_periods_counts_days_within_each_period():
+    aligned = align_periods(daily())
+    assert aligned["day"].tolist() == [0, 1, 2, 0, 1, 2]
+
+
+def test_compare_periods_by_dimension_fills_missing_values():
+    df = pd.DataFrame({
+        "country": ["Germany", "France", "Germany"],
+        PERIOD_COLUMN: [PERIODS[0], PERIODS[0], PERIODS[1]],
+        "sessions": [30, 10, 20],
+    })
+    wide = compare_periods(df, ["sessions"], PERIODS).set_index("country")
+    assert wide.loc["Germany", f"sessions ({PERIODS[1]})"] == 20
+    assert wide.loc["France", f"sessions ({PERIODS[1]})"] == 0
+    assert wide.loc["Germany", f"sessions change vs {PERIODS[1]}"] == 10
+    assert wide.loc["Germany", f"sessions % change vs {PERIODS[1]}"] == 50
+    assert pd.isna(wide.loc["France", f"sessions % change vs {PERIODS[1]}"])
+    assert wide.index.tolist() == ["Germany", "France"]
+
+
+def test_compare_periods_by_day():
+    wide = compare_periods(daily(), ["sessions"], PERIODS)
+    assert wide["day"].tolist() == [0, 1, 2]
+    assert wide[f"sessions change vs {PERIODS[1]}"].tolist() == [5, 10, 30]
+
+
+def test_compare_periods_without_dimensions():
+    df = pd.DataFrame({PERIOD_COLUMN: PERIODS, "sessions": [120, 100], "activeUsers": [60, 80]})
+    wide = compare_periods(df, ["sessions", "activeUsers"], PERIODS)
+    assert len(wide) == 1
+    assert wide.loc[0, f"sessions % change vs {PERIODS[1]}"] == 20
+    assert wide.loc[0, f"activeUsers change vs {PERIODS[1]}"] == -20
+
+
+def test_comparison_chart_overlays_daily_periods():
+    fig = comparison_chart(align_periods(daily()), "sessions by date", "sessions", PERIODS)
+    assert [trace.type for trace in fig.data] == ["scatter", "scatter"]
+    assert [len(trace.x) for trace in fig.data] == [3, 3]
+
+
+def test_comparison_chart_without_dimensions():
+    df = pd.DataFrame({PERIOD_COLUMN: PERIODS, "sessions": [120, 100]})
+    fig = comparison_chart(df, "sessions", "sessions", PERIODS)
+    assert [trace.name for trace in fig.data] == PERIODS
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from google.analytics.data_v1beta.types import MetricType, RunReportResponse
+
+import decoder
+import ga_query
+from decoder import concat_frames, response_to_dataframe
+
+
+def response(dimensions, metrics, rows, totals=None):
+    """RunReportResponse with dimension names, (name, type) metrics and string rows"""
+    def row(values):
+        return {
+            "dimension_values": [{"value": value} for value in values[:len(dimensions)]],
+            "metric_values": [{"value": value} for value in values[len(dimensions):]],
+        }
+
+    return RunReportResponse(
+        dimension_headers=[{"name": name} for name in dimensions],
+        metric_headers=[{"name": name, "type_": type_} for name, type_ in metrics],
+        rows=[row(values) for values in rows],
+        totals=[row([""] * len(dimensions) + totals)] if totals else [],
+        row_count=len(rows),
+    )
+
+
+def test_column_types():
+    df = response_to_dataframe(response(
+        ["date", "country"],
+        [("sessions", MetricType.TYPE_INTEGER), ("bounceRate", MetricType.TYPE_FLOAT),
+         ("totalRevenue", MetricType.TYPE_CURRENCY)],
+        [["20260301", "Germany", "12", "0.5", "9.99"], ["20260302", "France", "3", "0.25", "0"]],
+        totals=["15", "0.4", "9.99"],
+    ))
+    assert df["date"].dtype == "datetime64[ns]"
+    assert df["date"].iloc[1] == pd.Timestamp("2026-03-02")
+    assert isinstance(df["country"].dtype, pd.CategoricalDtype)
+    assert df["sessions"].dtype == np.int64
+    assert df["bounceRate"].dtype == np.float64 and df["totalRevenue"].dtype == np.float64
+    assert df.attrs["totals"] == {"sessions": 15, "bounceRate": 0.4, "totalRevenue": 9.99}
+
+
+def test_unparseable_values_become_nan():
+    df = response_to_dataframe(response(
+        ["dateHour"], [("sessions", MetricType.TYPE_INTEGER)], [["2026030114", "(not set)"], ["bad", "4"]],
+    ))
+    assert df["dateHour"].iloc[0] == pd.Timestamp("2026-03-01 14:00")
+    assert pd.isna(df["dateHour"].iloc[1])
+    assert pd.isna(df["sessions"].iloc[0]) and df["sessions"].iloc[1] == 4
+
+
+def test_empty_response_keeps_columns():
+    df = response_to_dataframe(response(["country"], [("sessions", MetricType.TYPE_INTEGER)], []))
+    assert list(df.columns) == ["country", "sessions"] and df.empty
+
+
+def test_pages_concatenate_as_categories():
+    metrics = [("sessions", MetricType.TYPE_INTEGER)]
+    first = response_to_dataframe(response(["country"], metrics, [["Germany", "1"]]))
+    second = response_to_dataframe(response(["country"], metrics, [["France", "2"]]))
+    df = concat_frames([first, second])
+    assert isinstance(df["country"].dtype, pd.CategoricalDtype)
+    assert list(df["country"]) == ["Germany", "France"]
+
+
+def test_decoder_version_is_part_of_the_cache_key(monkeypatch):
+    request = ga_query.build_report_request("123", ["country"], ["sessions"])
+    key = ga_query.request_key(request)
+    assert ga_query.request_key(request) == key
+    monkeypatch.setattr(ga_query, "DECODER_VERSION", decoder.DECODER_VERSION + 1)
+    assert ga_query.request_key(request) != key
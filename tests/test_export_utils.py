@@ -0,0 +1,146 @@
+import gzip
+import io
+import re
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from docx import Document
+from openpyxl import load_workbook
+
+import export_utils
+from export_utils import EXPORTERS
+
+
+def report(rows=12):
+    return pd.DataFrame({
+        "date": pd.date_range("2026-03-01", periods=rows),
+        "country": pd.Categorical(["Germany", "France", "Japan"] * (rows // 3)),
+        "sessions": range(rows),
+        "bounceRate": [0.5, None, 0.25] * (rows // 3),
+    })
+
+
+def chunks(df, size=5):
+    """The report as a stream of categorical chunks, as decoded report pages arrive"""
+    for start in range(0, len(df), size):
+        chunk = df.iloc[start:start + size].copy()
+        chunk["country"] = chunk["country"].astype(str).astype("category")
+        yield chunk
+
+
+def read_csv(data):
+    return pd.read_csv(io.BytesIO(data), parse_dates=["date"])
+
+
+def assert_typed(df, expected):
+    assert df["date"].dtype == expected["date"].dtype
+    assert isinstance(df["country"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(df.astype({"country": str}), expected.astype({"country": str}))
+
+
+def test_exporters_cover_every_format():
+    assert set(EXPORTERS) == {"csv", "csv.gz", "parquet", "feather", "xlsx", "pdf", "docx"}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_csv_round_trip(stream):
+    df = report()
+    data = EXPORTERS["csv"](chunks(df) if stream else df)
+    pd.testing.assert_frame_equal(read_csv(data), df.astype({"country": object}))
+    assert read_csv(gzip.decompress(EXPORTERS["csv.gz"](chunks(df) if stream else df))).equals(read_csv(data))
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_arrow_round_trips_keep_types(stream):
+    df = report()
+    assert_typed(pq.read_table(io.BytesIO(EXPORTERS["parquet"](chunks(df) if stream else df))).to_pandas(), df)
+    assert_typed(pa.ipc.open_file(EXPORTERS["feather"](chunks(df) if stream else df)).read_pandas(), df)
+
+
+def test_empty_stream():
+    assert EXPORTERS["parquet"](iter(())) == b""
+    assert EXPORTERS["csv"](iter(())) == b""
+
+
+def test_xlsx_round_trip():
+    df = report()
+    sheet = load_workbook(io.BytesIO(EXPORTERS["xlsx"](chunks(df)))).active
+    rows = list(sheet.values)
+    assert rows[0] == tuple(df.columns)
+    assert len(rows) == len(df) + 1
+    assert rows[1][1:] == ("Germany", 0, 0.5)
+    assert rows[2][3] is None
+    assert pd.Timestamp(rows[1][0]) == df["date"][0]
+
+
+def test_docx_round_trip():
+    df = report()
+    table = Document(io.BytesIO(EXPORTERS["docx"](chunks(df)))).tables[0]
+    cells = [[cell.text for cell in row.cells] for row in table.rows]
+    assert cells[0] == list(df.columns)
+    assert cells[1] == ["2026-03-01", "Germany", "0", "0.5"]
+    assert cells[2][3] == ""
+    assert len(cells) == len(df) + 1
+
+
+def test_pdf_continues_the_table_over_pages():
+    data = EXPORTERS["pdf"](chunks(report(120), size=50))
+    assert data.startswith(b"%PDF") and data.rstrip().endswith(b"%%EOF")
+    assert int(re.search(rb"/Count (\d+)", data).group(1)) > 1
+
+
+def test_build_export_reuses_earlier_builds(monkeypatch):
+    monkeypatch.setattr(export_utils, "_export_cache", OrderedDict())
+    built = []
+    monkeypatch.setitem(EXPORTERS, "csv", lambda df, fig=None: built.append(df) or b"a,b\n")
+    df = report()
+    assert export_utils.build_export("csv", df) == b"a,b\n"
+    assert export_utils.build_export("csv", df.copy()) == b"a,b\n"
+    assert len(built) == 1
+    assert export_utils.cached_export("csv", export_utils.report_fingerprint(df)) == b"a,b\n"
+
+
+def test_chart_is_rendered_once_for_every_export(monkeypatch):
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    monkeypatch.setattr(export_utils, "_png_cache", OrderedDict())
+    monkeypatch.setattr(export_utils, "_export_cache", OrderedDict())
+    rendered = []
+    monkeypatch.setattr(pio, "to_image", lambda fig, **kwargs: rendered.append(fig) or b"not a png")
+    df = report()
+    fig = go.Figure(go.Bar(x=["Germany"], y=[3]))
+    for fmt in ("xlsx", "pdf", "docx"):
+        assert export_utils.build_export(fmt, df, fig)
+    assert len(rendered) == 1
+    other = go.Figure(go.Bar(x=["Germany"], y=[4]))
+    assert export_utils.report_fingerprint(df, fig) != export_utils.report_fingerprint(df, other)
+    assert export_utils.report_fingerprint(df, fig) != export_utils.report_fingerprint(df.head(3), fig)
+    assert export_utils.report_fingerprint(df, fig) == export_utils.report_fingerprint(df.copy(), fig)
+
+
+def test_large_tables_are_written_in_chunks():
+    df = pd.DataFrame({"sessions": range(export_utils.CHUNK_ROWS * 2 + 1)})
+    assert [len(chunk) for chunk in export_utils.iter_chunks(df, export_utils.CHUNK_ROWS)] == [
+        export_utils.CHUNK_ROWS, export_utils.CHUNK_ROWS, 1,
+    ]
+    assert [len(chunk) for chunk in export_utils.iter_chunks(chunks(report()))] == [5, 5, 2]
+    rows = list(load_workbook(io.BytesIO(EXPORTERS["xlsx"](df)), read_only=True).active.values)
+    assert len(rows) == len(df) + 1 and rows[-1] == (len(df) - 1,)
+    table = Document(io.BytesIO(EXPORTERS["docx"](df))).tables[0]
+    assert len(table.rows) == len(df) + 1 and table.rows[-1].cells[0].text == str(len(df) - 1)
+
+
+def test_table_text():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2026-03-01", None]),
+        "dateHour": pd.to_datetime(["2026-03-01 14:00", "2026-03-01 15:30"]),
+        "revenue": [1234.5, None],
+        "country": ["Germany", None],
+    })
+    assert list(export_utils._text_rows(df)) == [
+        ("2026-03-01", "2026-03-01 14:00", "1,234.5", "Germany"),
+        ("", "2026-03-01 15:30", "", ""),
+    ]
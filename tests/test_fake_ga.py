@@ -0,0 +1,44 @@
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+
+import fake_ga
+import ga_query
+from fake_ga import FakeDataClient
+
+
+def request(dimensions, metrics, **kwargs):
+    return ga_query.build_report_request(fake_ga.FAKE_PROPERTY_ID, dimensions, metrics, **kwargs)
+
+
+def test_one_row_per_dimension_value_and_day():
+    client = FakeDataClient(cardinality=4)
+    response = client.run_report(request(["country", "date"], ["sessions"],
+                                         date_range="2026-01-01", end_date="2026-01-10"))
+    assert response.row_count == len(fake_ga.DIMENSION_VALUES["country"]) * 10
+    assert client.run_report(request(["pagePath"], ["sessions"])).row_count == 4
+
+
+def test_date_ranges_are_separate_blocks():
+    ranges = ga_query.comparison_ranges("2026-03-01", "2026-03-07", "previous")
+    response = FakeDataClient().run_report(request(["date"], ["sessions"], date_ranges=ranges))
+    assert [header.name for header in response.dimension_headers] == ["date", "dateRange"]
+    assert response.row_count == 14
+
+
+def test_responses_are_deterministic():
+    report = request(["deviceCategory"], ["sessions", "bounceRate"])
+    assert FakeDataClient().run_report(report) == FakeDataClient().run_report(report)
+
+
+def test_hourly_quota_refills(monkeypatch):
+    monkeypatch.setattr(fake_ga, "TOKENS_PER_HOUR", 2)
+    client = FakeDataClient()
+    report = request(["deviceCategory"], ["sessions"])
+    client.run_report(report)
+    client.run_report(report)
+    with pytest.raises(ResourceExhausted):
+        client.run_report(report)
+    client.hour_started -= fake_ga.HOUR
+    client.run_report(report)
+    assert client.tokens_used == 1
+    assert client.tokens_used_today == 3
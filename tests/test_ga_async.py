@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+import fake_ga
+import ga_async
+import ga_query
+from cache import TwoTierCache
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = fake_ga.FakeDataClient(cardinality=50, latency_ms=20)
+    ga_query.set_client_factory(*fake_ga.client_factory(client))
+    monkeypatch.setattr(ga_query, "_report_cache", TwoTierCache(path=None))
+    yield client
+    ga_query.set_client_factory()
+
+
+def test_pages_respect_the_page_worker_limit(fake_client, monkeypatch):
+    monkeypatch.setattr(ga_query, "REPORT_PAGE_SIZE", 5)
+    monkeypatch.setattr(ga_query, "MAX_PAGE_WORKERS", 2)
+    in_flight = []
+    peak = []
+    run_report = fake_ga.FakeAsyncDataClient.run_report
+
+    async def counted(self, request=None, **kwargs):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        try:
+            return await run_report(self, request, **kwargs)
+        finally:
+            in_flight.pop()
+
+    monkeypatch.setattr(fake_ga.FakeAsyncDataClient, "run_report", counted)
+    request = ga_query.build_report_request(fake_ga.FAKE_PROPERTY_ID, ["pagePath"], ["activeUsers"])
+    df = asyncio.run(ga_async.fetch_report_async(request, fake_ga.FAKE_CREDENTIALS))
+    assert len(df) == 50
+    assert len(peak) == 10
+    assert max(peak) == 2
+
+
+def test_concurrent_reports_keep_their_order(fake_client):
+    requests = [
+        ga_query.build_report_request(fake_ga.FAKE_PROPERTY_ID, ["deviceCategory"], ["activeUsers"]),
+        ga_query.build_report_request(fake_ga.FAKE_PROPERTY_ID, ["country"], ["activeUsers"]),
+    ]
+    results = asyncio.run(ga_async.run_reports_async(requests, fake_ga.FAKE_CREDENTIALS))
+    assert [len(df) for df in results] == [3, len(fake_ga.DIMENSION_VALUES["country"])]
@@ -0,0 +1,136 @@
+import pytest
+
+import fake_ga
+import ga_query
+from cache import TwoTierCache
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = fake_ga.FakeDataClient(cardinality=25)
+    ga_query.set_client_factory(*fake_ga.client_factory(client))
+    monkeypatch.setattr(ga_query, "_report_cache", TwoTierCache(path=None))
+    yield client
+    ga_query.set_client_factory()
+
+
+def pages_request(**kwargs):
+    return ga_query.build_report_request(fake_ga.FAKE_PROPERTY_ID, ["pagePath"], ["sessions"], **kwargs)
+
+
+def test_pages_are_yielded_in_order(fake_client):
+    chunks = list(ga_query.iter_report_pages(pages_request(), fake_ga.FAKE_CREDENTIALS, page_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert fake_client.calls == 3
+    paths = [path for chunk in chunks for path in chunk["pagePath"]]
+    assert paths == [f"pagePath {i}" for i in range(25)]
+
+
+def test_limit_caps_the_pages(fake_client):
+    chunks = list(ga_query.iter_report_pages(pages_request(limit=12), fake_ga.FAKE_CREDENTIALS, page_size=5))
+    assert [len(chunk) for chunk in chunks] == [5, 5, 2]
+
+
+def test_closing_the_stream_stops_fetching(fake_client):
+    pages = ga_query.iter_report_pages(pages_request(), fake_ga.FAKE_CREDENTIALS, page_size=1, max_workers=2)
+    next(pages)
+    pages.close()
+    assert fake_client.calls <= 3
+
+
+class PooledClient:
+    def __init__(self, credentials_info):
+        self.key_id = credentials_info["private_key_id"]
+        self.transport = self
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pooled_clients(monkeypatch):
+    monkeypatch.setattr(ga_query, "_client_pool", {})
+    ga_query.set_client_factory(lambda credentials_info, scopes: PooledClient(credentials_info))
+    yield
+    ga_query.set_client_factory()
+
+
+def account(email="reports@example.invalid", key_id="key-1"):
+    return {"client_email": email, "private_key_id": key_id}
+
+
+def test_clients_are_reused_per_service_account(pooled_clients):
+    client = ga_query.get_client(account())
+    assert ga_query.get_client(dict(account())) is client
+    assert ga_query.get_client(account(email="other@example.invalid")) is not client
+    assert ga_query.get_client(account(), scopes=("other-scope",)) is not client
+    assert not client.closed
+
+
+def test_rotated_key_replaces_and_closes_the_old_client(pooled_clients):
+    old = ga_query.get_client(account(key_id="key-1"))
+    other = ga_query.get_client(account(email="other@example.invalid"))
+    new = ga_query.get_client(account(key_id="key-2"))
+    assert new is not old and new.key_id == "key-2"
+    assert old.closed and not other.closed
+    assert len(ga_query._client_pool) == 2
+
+
+def test_idle_clients_are_evicted(pooled_clients, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ga_query.time, "monotonic", lambda: now[0])
+    idle = ga_query.get_client(account())
+    now[0] += ga_query.CLIENT_IDLE_TTL + 1
+    fresh = ga_query.get_client(account(email="other@example.invalid"))
+    assert idle.closed and not fresh.closed
+    assert ga_query.get_client(account()) is not idle
+
+
+def test_release_closes_one_account_and_runs_hooks(pooled_clients, monkeypatch):
+    released = []
+    monkeypatch.setattr(ga_query, "_release_hooks", [released.append])
+    client = ga_query.get_client(account())
+    other = ga_query.get_client(account(email="other@example.invalid"))
+    ga_query.release_client(account())
+    assert client.closed and not other.closed
+    assert released == [account()]
+    assert ga_query.get_client(account()) is not client
+
+
+@pytest.fixture
+def batches(fake_client, monkeypatch):
+    sizes = []
+    run_batch = fake_client.batch_run_reports
+
+    def batch_run_reports(request=None, **kwargs):
+        sizes.append((request.property, len(request.requests)))
+        return run_batch(request, **kwargs)
+
+    monkeypatch.setattr(fake_client, "batch_run_reports", batch_run_reports)
+    return sizes
+
+
+def days_request(days, property_id=fake_ga.FAKE_PROPERTY_ID):
+    return ga_query.build_report_request(property_id, ["country"], ["sessions"], f"{days}daysAgo")
+
+
+def test_batches_are_grouped_by_property_and_split(batches):
+    requests = [days_request(days) for days in range(1, 8)] + [days_request(days, "999") for days in (1, 2)]
+    results = ga_query.fetch_reports_batch(requests, fake_ga.FAKE_CREDENTIALS)
+    fake_property = f"properties/{fake_ga.FAKE_PROPERTY_ID}"
+    assert sorted(batches) == [(fake_property, 2), (fake_property, 5), ("properties/999", 2)]
+    assert all(list(df.columns) == ["country", "sessions"] and len(df) for df in results)
+    single = ga_query.fetch_reports_batch([days_request(3)], fake_ga.FAKE_CREDENTIALS, use_cache=False)[0]
+    assert single.equals(results[2])
+
+
+def test_duplicates_and_cached_reports_are_not_refetched(batches):
+    cached = ga_query.fetch_reports_batch([days_request(1)], fake_ga.FAKE_CREDENTIALS)[0]
+    batches.clear()
+    results = ga_query.fetch_reports_batch(
+        [days_request(1), days_request(2), days_request(2)], fake_ga.FAKE_CREDENTIALS
+    )
+    assert len(batches) == 1 and batches[0][1] == 1
+    assert results[0].equals(cached) and results[1].equals(results[2])
+    assert results[1] is not results[2]
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+
+import ga_scheduler
+from ga_scheduler import EXPORT, INTERACTIVE, QuotaScheduler, TokenBucket
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, capacity=1)
+    now = bucket.updated
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == pytest.approx(0.5)
+    assert bucket.take(now + 0.5) == 0
+
+
+def test_concurrency_cap_and_priority_order():
+    scheduler = QuotaScheduler(max_concurrent=1, rate=1000, burst=1000)
+    scheduler.acquire("p")
+    order = []
+
+    def worker(name, priority):
+        scheduler.acquire("p", priority)
+        order.append(name)
+        scheduler.release("p")
+
+    threads = [threading.Thread(target=worker, args=("export", EXPORT))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=worker, args=("interactive", INTERACTIVE)))
+    threads[1].start()
+    time.sleep(0.05)
+    assert order == []
+    scheduler.release("p")
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "export"]
+
+
+def test_call_retries_quota_errors(monkeypatch):
+    monkeypatch.setattr(ga_scheduler, "BACKOFF_BASE", 0.001)
+    scheduler = QuotaScheduler(rate=1000, burst=1000)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ResourceExhausted("quota")
+        return "ok"
+
+    assert scheduler.call("p", flaky) == "ok"
+    assert scheduler.stats["retries"] == 2
+    assert scheduler._active["p"] == 0
+
+
+def test_cancelled_async_acquire_gives_the_slot_back():
+    scheduler = QuotaScheduler(max_concurrent=1, rate=1000, burst=1000)
+    scheduler.acquire("p")
+
+    async def cancel_waiter():
+        waiter = asyncio.ensure_future(scheduler.acquire_async("p"))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # The worker thread is still waiting; it gets the slot and must hand it back
+        scheduler.release("p")
+        await asyncio.wait_for(scheduler.acquire_async("p"), 5)
+        scheduler.release("p")
+
+    asyncio.run(cancel_waiter())
+    assert scheduler._active["p"] == 0
@@ -0,0 +1,65 @@
+import pytest
+
+import fake_ga
+import ga_query
+import ga_schema
+from cache import TwoTierCache
+from ga_schema import SchemaIndex, _field, builtin_schema
+
+
+def test_longest_phrase_wins():
+    assert builtin_schema().resolve("new users by landing page") == (["landingPage"], ["newUsers"])
+
+
+def test_typos_fall_back_to_fuzzy_matching():
+    assert builtin_schema().resolve("sesions by contry") == (["country"], ["sessions"])
+    # Short words and stopwords are never fuzzy matched
+    assert builtin_schema().match("show thes") == []
+
+
+def test_custom_fields_resolve_by_ui_name():
+    fields = {"customEvent:plan": _field("dimension", "customEvent:plan", "Subscription plan", custom=True),
+              "sessions": _field("metric", "sessions")}
+    assert SchemaIndex(fields).resolve("sessions by subscription plan") == (["customEvent:plan"], ["sessions"])
+
+
+def test_check_rejects_item_dimensions_with_event_metrics():
+    schema = builtin_schema()
+    problems = schema.check(["itemName"], ["sessions"])
+    assert len(problems) == 1 and "itemName" in problems[0] and "sessions" in problems[0]
+    assert schema.check(["itemName"], ["itemRevenue"]) == []
+    assert schema.check(["country"], ["sessions"]) == []
+
+
+def test_check_reports_kinds_limits_and_unknown_fields():
+    schema = builtin_schema()
+    assert schema.check(["sessions"], []) == ["`sessions` is a metric, not a dimension"]
+    assert len(schema.check(["country"] * 10, ["sessions"])) == 1
+    # Unknown names only count as errors against a real property's metadata
+    assert schema.check(["customEvent:x"], ["sessions"]) == []
+    prop_schema = SchemaIndex(builtin_schema().fields, "properties/1")
+    assert prop_schema.check(["customEvent:x"], ["sessions"]) == [
+        "`customEvent:x` is not a dimension of this property",
+    ]
+
+
+@pytest.fixture
+def schema_cache(tmp_path, monkeypatch):
+    ga_query.set_client_factory(*fake_ga.client_factory())
+    path = str(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(ga_schema, "_schema_cache", TwoTierCache(path=path, table="schema_fields"))
+    monkeypatch.setattr(ga_schema, "_indexes", {})
+    yield path
+    ga_query.set_client_factory()
+
+
+def test_schemas_are_cached_as_plain_fields(schema_cache):
+    schema = ga_schema.load_schema(fake_ga.FAKE_PROPERTY_ID, fake_ga.FAKE_CREDENTIALS)
+    assert ga_schema.load_schema(fake_ga.FAKE_PROPERTY_ID, fake_ga.FAKE_CREDENTIALS) is schema
+    stored = TwoTierCache(path=schema_cache, table="schema_fields").get(schema.property_id)
+    assert type(stored) is dict and stored == schema.fields
+    # A new process rebuilds the index from the stored fields
+    ga_schema._schema_cache = TwoTierCache(path=schema_cache, table="schema_fields")
+    ga_schema._indexes.clear()
+    reloaded = ga_schema.load_schema(fake_ga.FAKE_PROPERTY_ID, fake_ga.FAKE_CREDENTIALS)
+    assert reloaded is not schema and reloaded.resolve("sessions by country") == (["country"], ["sessions"])
@@ -0,0 +1,49 @@
+import pandas as pd
+import plotly.graph_objects as go
+
+from history_store import HistoryStore
+
+
+def ask(store, property_id, count):
+    return [store.add(property_id, f"question {i}", f"enhanced {i}", {"dimensions": ["country"]})
+            for i in range(count)]
+
+
+def test_entries_are_paged_newest_first():
+    store = HistoryStore(path=None)
+    ask(store, "123", 25)
+    assert store.count("123") == 25
+    pages = [store.page("123", page, page_size=10) for page in range(3)]
+    assert [len(entries) for entries in pages] == [10, 10, 5]
+    assert pages[0][0]["question"] == "question 24" and pages[2][-1]["question"] == "question 0"
+    assert pages[0][0]["spec"] == {"dimensions": ["country"]}
+    assert store.page("123", 3, page_size=10) == []
+
+
+def test_retention_is_per_property():
+    store = HistoryStore(path=None, max_entries=5)
+    ask(store, "123", 8)
+    ask(store, "456", 2)
+    assert store.count("123") == 5 and store.count("456") == 2
+    assert [entry["question"] for entry in store.page("123")] == [f"question {i}" for i in range(7, 2, -1)]
+    store.clear("123")
+    assert store.count("123") == 0 and store.count("456") == 2
+
+
+def test_history_and_results_survive_restarts(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    df = pd.DataFrame({"country": ["Germany"], "sessions": [3]})
+    fig = go.Figure(go.Bar(x=["Germany"], y=[3]))
+    store = HistoryStore(path=path)
+    store.add("123", "sessions by country", "enhanced", fingerprint="abc", rows=1)
+    store.save_result({"fingerprint": "abc", "df": df, "fig": fig, "trend_fig": None,
+                       "explanation": "Mostly Germany."})
+
+    reopened = HistoryStore(path=path)
+    entry = reopened.page("123")[0]
+    assert (entry["question"], entry["fingerprint"], entry["rows"]) == ("sessions by country", "abc", 1)
+    report = reopened.load_result(entry["fingerprint"])
+    pd.testing.assert_frame_equal(report["df"], df)
+    assert list(report["fig"].data[0].y) == [3]
+    assert report["trend_fig"] is None and report["explanation"] == "Mostly Germany."
+    assert reopened.load_result("missing") is None and reopened.load_result(None) is None
@@ -0,0 +1,49 @@
+from datetime import date
+
+import intent_cache
+from cache import TwoTierCache
+from intent_cache import IntentCache, canonical_question
+
+TODAY = date(2026, 3, 15)
+
+
+def test_wordings_of_one_question_match():
+    assert canonical_question("Users by country last week", TODAY) == \
+        canonical_question("show me users by country for the past 7 days", TODAY)
+
+
+def test_different_questions_and_ranges_differ():
+    assert canonical_question("users by country", TODAY) != canonical_question("users by city", TODAY)
+    assert canonical_question("users by country last week", TODAY) != \
+        canonical_question("users by country last month", TODAY)
+    assert canonical_question("users by country", TODAY) != \
+        canonical_question("users by country vs last month", TODAY)
+
+
+def test_entries_are_per_property():
+    cache = IntentCache(TwoTierCache(path=None, table="intents"))
+    cache.put("Users by country", "123", {"dimensions": ["country"], "explanation": None})
+    assert cache.get("users by country", "properties/123")["dimensions"] == ["country"]
+    assert cache.get("users by country", "456") is None
+
+
+def test_explanation_is_attached_to_existing_entry():
+    cache = IntentCache(TwoTierCache(path=None, table="intents"))
+    cache.set_explanation("users by country", "123", "ignored")
+    assert cache.get("users by country", "123") is None
+    cache.put("users by country", "123", {"dimensions": ["country"], "end_date": "2020-01-31",
+                                          "explanation": None})
+    cache.set_explanation("users by country", "123", "Most users are in Germany.")
+    assert cache.get("users by country", "123")["explanation"] == "Most users are in Germany."
+
+
+def test_entries_of_an_older_parser_are_not_reused(monkeypatch):
+    cache = IntentCache(TwoTierCache(path=None, table="intents"))
+    cache.put("users from germany", "123", {"dimensions": [], "explanation": None})
+    monkeypatch.setattr(intent_cache, "INTENT_VERSION", intent_cache.INTENT_VERSION + 1)
+    assert cache.get("users from germany", "123") is None
+
+
+def test_filters_come_from_the_parsed_text():
+    assert "[country eq Germany]" in canonical_question("users from germany", TODAY)
+    assert canonical_question("users from germany", TODAY) != canonical_question("users from france", TODAY)
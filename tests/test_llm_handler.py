@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+import llm_handler
+from llm_handler import FakeProvider, LLMError, Provider
+
+
+def test_incomplete_provider_fails_on_creation():
+    class Incomplete(Provider):
+        name = "incomplete"
+
+        def request(self, prompt, system):
+            return "https://example.invalid", {}, {}
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_fake_provider_streams_first_line_of_prompt():
+    provider = FakeProvider()
+    answer = "".join(provider.stream("Users by country\nData: ..."))
+    assert answer == "This is a sample explanation for: Users by country"
+    assert provider.last_call["chars"] == len(answer)
+
+
+def test_fake_provider_handles_empty_prompt():
+    assert "".join(FakeProvider().stream("")) == "This is a sample explanation for:"
+
+
+def test_fake_provider_cancel_and_failure():
+    cancel = threading.Event()
+    cancel.set()
+    provider = FakeProvider()
+    assert list(provider.stream("question", cancel=cancel)) == []
+    assert provider.last_call["cancelled"]
+    with pytest.raises(LLMError):
+        list(FakeProvider(fail_after=2).stream("question"))
+
+
+def test_openai_request_streams():
+    url, headers, body = llm_handler.OpenAIProvider("key").request("prompt", "system")
+    assert url.endswith("/chat/completions")
+    assert headers["Authorization"] == "Bearer key"
+    assert body["stream"] is True
+
+
+def test_mean_ttft_ignores_calls_without_a_first_token(monkeypatch):
+    provider = FakeProvider(delay=0.01)
+    monkeypatch.setattr(llm_handler, "_providers", {("fake", "", None, None): provider})
+    provider.complete("question")
+    ttft = provider.last_call["ttft"]
+    provider.fail_after = 0
+    for _ in range(3):
+        with pytest.raises(LLMError):
+            provider.complete("question")
+    info = llm_handler.provider_summary()["fake"]
+    assert info["calls"] == 4 and info["errors"] == 3 and info["first_tokens"] == 1
+    assert info["mean_ttft"] == pytest.approx(ttft)
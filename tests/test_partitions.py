@@ -0,0 +1,82 @@
+import asyncio
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import fake_ga
+import ga_async
+import ga_query
+import partitions
+from cache import TwoTierCache
+
+
+def test_is_partitionable():
+    assert partitions.is_partitionable(["country"], ["sessions", "screenPageViews"])
+    assert not partitions.is_partitionable(["country"], ["activeUsers"])
+    assert partitions.is_partitionable(["date"], ["activeUsers"])
+    assert not partitions.is_partitionable(["country"], [])
+
+
+def test_contiguous_spans():
+    days = [date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 5)]
+    assert partitions.contiguous_spans(days) == [
+        (date(2026, 1, 1), date(2026, 1, 2)), (date(2026, 1, 5), date(2026, 1, 5)),
+    ]
+
+
+def test_split_by_day_keeps_empty_days():
+    df = pd.DataFrame({"date": ["20260101", "20260101", "20260103"], "country": ["a", "b", "a"],
+                       "sessions": [1, 2, 3]})
+    days = partitions.days_between(date(2026, 1, 1), date(2026, 1, 3))
+    parts = partitions.split_by_day(df, days)
+    assert [len(parts[day]) for day in days] == [2, 0, 1]
+    assert list(parts[days[0]].columns) == ["country", "sessions"]
+
+
+def test_combine_partitions_sums_additive_metrics():
+    frames = [pd.DataFrame({"country": ["a", "b"], "sessions": [1, 2]}),
+              pd.DataFrame({"country": ["b"], "sessions": [5]})]
+    combined = partitions.combine_partitions(frames, ["country"], ["sessions"])
+    assert combined.to_dict("list") == {"country": ["b", "a"], "sessions": [7, 1]}
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = fake_ga.FakeDataClient(cardinality=3)
+    ga_query.set_client_factory(*fake_ga.client_factory(client))
+    monkeypatch.setattr(ga_query, "_partition_cache",
+                        TwoTierCache(path=None, table="partitions", default_ttl=None))
+    monkeypatch.setattr(ga_query, "_report_cache", TwoTierCache(path=None))
+    yield client
+    ga_query.set_client_factory()
+
+
+def settled_request(days):
+    end = date.today() - timedelta(days=ga_query.GA_PROCESSING_DAYS + 1)
+    return ga_query.build_report_request(
+        fake_ga.FAKE_PROPERTY_ID, ["pagePath"], ["sessions"],
+        date_range=(end - timedelta(days=days - 1)).isoformat(), end_date=end.isoformat(),
+    )
+
+
+def test_settled_days_are_fetched_once(fake_client):
+    first = ga_query.fetch_partitioned(settled_request(5), fake_ga.FAKE_CREDENTIALS)
+    assert fake_client.calls == 1
+    assert len(first) == 3
+    # Five of the seven days are cached; only the two earlier ones are requested
+    ga_query.fetch_partitioned(settled_request(7), fake_ga.FAKE_CREDENTIALS)
+    assert fake_client.calls == 2
+    ga_query.fetch_partitioned(settled_request(7), fake_ga.FAKE_CREDENTIALS)
+    assert fake_client.calls == 2
+
+
+def test_async_fetch_uses_day_partitions(fake_client):
+    ga_query.fetch_report(settled_request(5), fake_ga.FAKE_CREDENTIALS)
+    assert fake_client.calls == 1
+    df = asyncio.run(ga_async.fetch_report_async(settled_request(7), fake_ga.FAKE_CREDENTIALS))
+    assert len(df) == 3
+    assert fake_client.calls == 2
+    # The async fetch stored its days as partitions too, so the sync one needs no call
+    ga_query.fetch_report(settled_request(6), fake_ga.FAKE_CREDENTIALS)
+    assert fake_client.calls == 2
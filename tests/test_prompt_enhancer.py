@@ -0,0 +1,56 @@
+import pytest
+
+from prompt_enhancer import analyze_query, enhance_prompt
+
+
+def test_terms_are_explained_once():
+    enhanced = analyze_query("users by page").enhanced
+    assert enhanced.startswith("users (number of visitors) by page (specific pages visited)")
+    # The inserted "specific pages visited" is not scanned again
+    assert enhanced.count("(") == 2
+    assert enhance_prompt("sessions") == analyze_query("sessions").enhanced
+
+
+def test_terms_match_whole_words_only():
+    assert "(" not in analyze_query("homepage sourcing").enhanced.split(" for the last")[0]
+    assert analyze_query("Pages and Sources").enhanced.startswith(
+        "Pages (specific pages visited) and Sources (where visitors came from)"
+    )
+
+
+@pytest.mark.parametrize("question, time_range", [
+    ("users last 3 months", ("90daysAgo", "today")),
+    ("users past week", ("7daysAgo", "today")),
+    ("users this month", ("30daysAgo", "today")),
+    ("users 5 days ago", ("5daysAgo", "5daysAgo")),
+    ("users yesterday", ("yesterday", "yesterday")),
+    ("users today", ("today", "today")),
+    ("users", None),
+])
+def test_time_ranges(question, time_range):
+    intent = analyze_query(question)
+    assert intent.time_range == time_range
+    assert intent.enhanced.endswith("for the last 30 days. Display in a simple table - "
+                                    "Please explain what this means in simple terms!") == (time_range is None)
+
+
+@pytest.mark.parametrize("question, breakdown, chart_type", [
+    ("sessions by country last week", "country", "bar"),
+    ("sessions by device category, please", "device category", "bar"),
+    ("sessions trend over time", None, "line"),
+    ("share of traffic as a pie chart", None, "pie"),
+    ("sessions by country in a line chart", "country", "line"),
+    ("correlation of sessions and bounce", None, "scatter"),
+    ("total sessions", None, None),
+])
+def test_breakdown_and_chart_type(question, breakdown, chart_type):
+    intent = analyze_query(question)
+    assert intent.breakdown == breakdown
+    assert intent.chart_type == chart_type
+
+
+def test_repeated_questions_are_memoized():
+    analyze_query.cache_clear()
+    first = analyze_query("users by country")
+    assert analyze_query("users by country") is first
+    assert analyze_query.cache_info().hits == 1
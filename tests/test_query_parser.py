@@ -0,0 +1,91 @@
+from datetime import date
+
+from intent_cache import canonical_question
+from query_parser import DEFAULT_TOP_N, extract_query_spec
+
+
+def filters(question):
+    return {f["field"]: (f["op"], f["value"]) for f in extract_query_spec(question)["dimension_filters"]}
+
+
+def test_top_n_with_country_and_device():
+    spec = extract_query_spec("top 5 pages from Germany on mobile")
+    assert spec["dimensions"] == ["pagePath"]
+    assert spec["limit"] == 5
+    assert spec["order_by"] == [{"field": spec["metrics"][0], "desc": True}]
+    assert spec["totals"]
+    assert filters("top 5 pages from Germany on mobile") == {
+        "country": ("eq", "Germany"), "deviceCategory": ("eq", "mobile"),
+    }
+
+
+def test_top_without_number_uses_default():
+    assert extract_query_spec("top pages")["limit"] == DEFAULT_TOP_N
+    assert extract_query_spec("bottom 3 pages")["order_by"][0]["desc"] is False
+
+
+def test_thresholds_are_not_rankings():
+    questions = ("pages with at least 5 sessions", "pages with at most 5 sessions", "pages viewed at least 5 times")
+    for question in questions:
+        spec = extract_query_spec(question)
+        assert spec["limit"] is None and spec["order_by"] == [], question
+    assert extract_query_spec("pages with at least 5 sessions")["metric_filters"] == [
+        {"field": "sessions", "op": ">=", "value": 5},
+    ]
+
+
+def test_number_after_a_short_gap():
+    spec = extract_query_spec("least visited 5 pages")
+    assert spec["limit"] == 5
+    assert spec["order_by"][0]["desc"] is False
+    assert extract_query_spec("most visited 3 pages last month")["limit"] == 3
+    assert extract_query_spec("top pages in 2024")["limit"] == DEFAULT_TOP_N
+
+
+def test_country_matching_ignores_case():
+    assert filters("top pages from germany") == filters("top pages from Germany") == {"country": ("eq", "Germany")}
+
+
+def test_country_aliases_and_lists():
+    assert filters("users in the UK") == {"country": ("eq", "United Kingdom")}
+    assert filters("users from the United States and Canada") == {
+        "country": ("in", ["United States", "Canada"]),
+    }
+
+
+def test_us_pronoun_is_not_a_country():
+    assert filters("customers who bought from us") == {}
+    assert filters("users from the US") == {"country": ("eq", "United States")}
+    assert filters("users from the U.S. and Canada") == {"country": ("in", ["United States", "Canada"])}
+
+
+def test_unknown_places_are_not_filtered():
+    for question in ("Users in Chrome", "Sessions in Q1 by country", "visitors from New York"):
+        assert "country" not in filters(question), question
+
+
+def test_filtered_country_is_kept_only_when_broken_down():
+    assert "country" not in extract_query_spec("sessions from France")["dimensions"]
+    assert "country" in extract_query_spec("sessions from France and Spain by country")["dimensions"]
+
+
+def test_several_devices_break_down_by_device():
+    spec = extract_query_spec("Mobile vs desktop traffic")
+    assert "deviceCategory" in spec["dimensions"]
+    assert filters("Mobile vs desktop traffic") == {"deviceCategory": ("in", ["mobile", "desktop"])}
+
+
+def test_metric_threshold():
+    spec = extract_query_spec("pages with more than 1,000 views")
+    assert spec["metric_filters"] == [{"field": "screenPageViews", "op": ">", "value": 1000}]
+    assert "screenPageViews" in spec["metrics"]
+
+
+def test_source_filter():
+    assert filters("sessions from google") == {"sessionSource": ("contains", "google")}
+
+
+def test_cache_key_follows_parsed_filters():
+    today = date(2026, 1, 15)
+    assert canonical_question("top pages from Germany", today) == canonical_question("top pages from germany", today)
+    assert canonical_question("users on mobile", today) != canonical_question("users mobile", today)
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+import settings
+
+
+@pytest.fixture(autouse=True)
+def files(monkeypatch):
+    monkeypatch.setattr(settings, "_files", {})
+
+
+def test_files_are_parsed_once_until_they_change(tmp_path):
+    path = str(tmp_path / "llm.json")
+    settings.save_json(path, {"provider": "OpenAI"})
+    parsed = []
+
+    def parse(f):
+        parsed.append(path)
+        return json.load(f)
+
+    first = settings._load(path, parse)
+    assert settings._load(path, parse) is first and len(parsed) == 1
+
+    settings.save_json(path, {"provider": "Claude (Anthropic)"})
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert settings._load(path, parse) == {"provider": "Claude (Anthropic)"} and len(parsed) == 2
+
+
+def test_missing_and_unreadable_files_are_none(tmp_path):
+    path = str(tmp_path / "credentials.json")
+    assert settings.load_json(path) is None
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert settings.load_json(path) is None
+
+
+def test_saved_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CREDENTIALS_PATH", str(tmp_path / "credentials.json"))
+    monkeypatch.setattr(settings, "PROPERTY_ID_PATH", str(tmp_path / "property.txt"))
+    settings.save_json(settings.CREDENTIALS_PATH, {"client_email": "reports@example.invalid"})
+    assert settings.saved_connection() is None
+    settings.save_text(settings.PROPERTY_ID_PATH, "123\n")
+    assert settings.saved_connection() == ({"client_email": "reports@example.invalid"}, "123")
+    settings.remove(settings.PROPERTY_ID_PATH)
+    assert settings.saved_connection() is None and settings.PROPERTY_ID_PATH not in settings._files
@@ -0,0 +1,81 @@
+import json
+import socket
+import urllib.request
+
+import pytest
+
+import tracing
+from tracing import Span, Tracer
+
+
+@pytest.fixture
+def tracer():
+    return Tracer()
+
+
+def finished(tracer, name, duration, **attributes):
+    span = Span(name, tracer, **attributes)
+    span.duration = duration
+    tracer.record(span)
+    return span
+
+
+def test_spans_nest_into_one_trace(tracer):
+    with Span("question", tracer) as question:
+        with Span("ga.report", tracer, cache="miss") as report:
+            report.add(rows=10).add(rows=5)
+    assert report.trace_id == question.trace_id
+    assert report.parent_id == question.span_id
+    assert [row["stage"] for row in tracing.trace_rows(tracer.trace(question.trace_id))] == [
+        "question", "  ga.report",
+    ]
+    assert tracer.stage_summary()["ga.report"]["rows"] == 15
+    assert tracing.current() is None
+
+
+def test_prometheus_text(tracer):
+    finished(tracer, "ga.report", 0.02, rows=100, cache="hit", tokens=3)
+    finished(tracer, "ga.report", 3.0, rows=50, cache="miss")
+    text = tracing.prometheus_text(tracer)
+    assert "# TYPE ga4_assistant_stage_duration_seconds histogram" in text
+    assert 'ga4_assistant_stage_duration_seconds_bucket{stage="ga.report",le="0.025"} 1' in text
+    assert 'ga4_assistant_stage_duration_seconds_bucket{stage="ga.report",le="5.0"} 2' in text
+    assert 'ga4_assistant_stage_duration_seconds_bucket{stage="ga.report",le="+Inf"} 2' in text
+    assert 'ga4_assistant_stage_duration_seconds_sum{stage="ga.report"} 3.020000' in text
+    assert 'ga4_assistant_stage_rows_total{stage="ga.report"} 150' in text
+    assert 'ga4_assistant_stage_tokens_total{stage="ga.report"} 3' in text
+    assert 'ga4_assistant_stage_cache_total{stage="ga.report",result="hit"} 1' in text
+    assert text.endswith("\n")
+
+
+def test_otlp_json(tracer):
+    parent = finished(tracer, "question", 0.5)
+    child = Span("ga.report", tracer, rows=3, cache="hit", ratio=0.5)
+    child.parent_id, child.trace_id, child.duration = parent.span_id, parent.trace_id, 0.1
+    child.error = "ValueError: boom"
+    body = json.loads(tracing.otlp_json([parent, child]))
+    resource = body["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"]["stringValue"] == tracing.SERVICE_NAME
+    spans = resource["scopeSpans"][0]["spans"]
+    assert "parentSpanId" not in spans[0]
+    assert spans[1]["parentSpanId"] == parent.span_id and spans[1]["traceId"] == parent.trace_id
+    assert len(spans[1]["traceId"]) == 32 and len(spans[1]["spanId"]) == 16
+    attributes = {item["key"]: item["value"] for item in spans[1]["attributes"]}
+    assert attributes == {"rows": {"intValue": "3"}, "cache": {"stringValue": "hit"}, "ratio": {"doubleValue": 0.5}}
+    assert spans[1]["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert int(spans[1]["endTimeUnixNano"]) - int(spans[1]["startTimeUnixNano"]) == 100_000_000
+
+
+def test_metrics_server_listens_on_localhost_by_default(monkeypatch):
+    monkeypatch.setattr(tracing, "_server", None)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = tracing.serve_metrics(port)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+    finally:
+        server.shutdown()
+        server.server_close()
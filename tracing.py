@@ -0,0 +1,357 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Set GA4_TRACING=0 to turn spans into no-ops
+TRACING_ENABLED = os.environ.get("GA4_TRACING", "1").lower() not in ("0", "false", "no")
+
+# Finished spans kept in memory for the timing panel and OTLP export
+TRACE_MAX_SPANS = int(os.environ.get("GA4_TRACE_SPANS", 5000))
+
+# Port serving /metrics (Prometheus text) and /traces (OTLP JSON); unset means off
+METRICS_PORT = os.environ.get("GA4_METRICS_PORT")
+# Traces contain questions and property IDs, so only this machine can read them unless
+# GA4_METRICS_HOST opens them up (e.g. 0.0.0.0 behind a firewall or an authenticating proxy)
+METRICS_HOST = os.environ.get("GA4_METRICS_HOST", "127.0.0.1")
+
+# Upper bounds of the span duration histogram (seconds)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Numeric span attributes summed into per-stage counters
+COUNTED_ATTRIBUTES = ("rows", "bytes", "tokens")
+
+SERVICE_NAME = "ga4-analytics-assistant"
+
+_current = contextvars.ContextVar("ga4_current_span", default=None)
+
+
+class Span:
+    """One timed stage: name, wall time and attributes (rows, bytes, cache, tokens, ...)
+
+    Spans nest through a context variable, so a span started while
+    another is open becomes its child in the same trace.
+    """
+
+    def __init__(self, name, tracer, **attributes):
+        self.name = name
+        self.tracer = tracer
+        self.attributes = attributes
+        parent = _current.get()
+        if parent is not None and parent.duration is not None:
+            parent = None  # Left current by an interrupted stage; start a new trace
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        """Add or update attributes; None values are ignored"""
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+        return self
+
+    def add(self, **amounts):
+        """Increase numeric attributes (rows fetched page by page, tokens per call, ...)"""
+        for key, value in amounts.items():
+            if value:
+                self.attributes[key] = self.attributes.get(key, 0) + value
+        return self
+
+    def begin(self):
+        self._token = _current.set(self)
+        return self
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                _current.set(None)  # Ended in another context; don't leave it as the parent
+        self.tracer.record(self)
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start_time": self.start_time,
+            "duration_ms": (self.duration or 0.0) * 1000, "error": self.error, **self.attributes,
+        }
+
+
+class _NoopSpan:
+    trace_id = span_id = parent_id = None
+
+    def set(self, **attributes):
+        return self
+
+    add = set
+
+    def begin(self):
+        return self
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Keeps recent spans and per-stage metrics
+
+    Metrics (count, duration histogram, rows, bytes, tokens, cache hits
+    and misses, errors) cover every span since start; individual spans
+    are kept up to `max_spans`.
+    """
+
+    def __init__(self, max_spans=TRACE_MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+            stage = self.stages.get(span.name)
+            if stage is None:
+                stage = self.stages[span.name] = {
+                    "count": 0, "seconds": 0.0, "errors": 0, "buckets": [0] * len(DURATION_BUCKETS),
+                    "cache": {}, **{key: 0 for key in COUNTED_ATTRIBUTES},
+                }
+            stage["count"] += 1
+            stage["seconds"] += span.duration
+            stage["errors"] += span.error is not None
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    stage["buckets"][i] += 1
+            for key in COUNTED_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)):
+                    stage[key] += value
+            cache = span.attributes.get("cache")
+            if cache:
+                stage["cache"][cache] = stage["cache"].get(cache, 0) + 1
+
+    def trace(self, trace_id):
+        """Finished spans of one trace, in start order"""
+        with self._lock:
+            spans = [span for span in self.spans if span.trace_id == trace_id]
+        return sorted(spans, key=lambda span: span.start)
+
+    def stage_summary(self):
+        """{stage: metrics} snapshot"""
+        with self._lock:
+            return {name: {**stage, "cache": dict(stage["cache"])} for name, stage in self.stages.items()}
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+            self.stages.clear()
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """Process-wide Tracer"""
+    return _tracer
+
+
+def span(name, **attributes):
+    """Context manager timing one stage; yields the span so attributes can be set"""
+    if not TRACING_ENABLED:
+        return _NOOP
+    return Span(name, _tracer, **attributes)
+
+
+def current():
+    """The open span of this context, or None"""
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Set attributes on the open span of this context, if any"""
+    parent = _current.get()
+    if parent is not None:
+        parent.set(**attributes)
+
+
+def propagate(func):
+    """Run func in the current trace context, for work handed to a thread pool"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+class attach:
+    """Make `parent` the current span, e.g. in a coroutine started on another thread"""
+
+    def __init__(self, parent):
+        self.parent = parent
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self.parent)
+        return self.parent
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+def trace_rows(spans):
+    """Rows for a timing table: one per span, indented under its parent"""
+    depth = {}
+    rows = []
+    for item in spans:
+        level = depth.get(item.parent_id, -1) + 1
+        depth[item.span_id] = level
+        rows.append({
+            "stage": "  " * level + item.name,
+            "ms": round(item.duration * 1000, 1),
+            **{key: item.attributes.get(key) for key in ("rows", "bytes", "cache", "tokens")},
+            "error": item.error,
+        })
+    return rows
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(tracer=None):
+    """Per-stage metrics in the Prometheus text exposition format"""
+    summary = (tracer or _tracer).stage_summary()
+    prefix = "ga4_assistant"
+    lines = [
+        f"# HELP {prefix}_stage_duration_seconds Wall time of pipeline stages",
+        f"# TYPE {prefix}_stage_duration_seconds histogram",
+    ]
+    for name, stage in sorted(summary.items()):
+        label = f'stage="{_label(name)}"'
+        for bound, count in zip(DURATION_BUCKETS, stage["buckets"]):
+            lines.append(f'{prefix}_stage_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'{prefix}_stage_duration_seconds_bucket{{{label},le="+Inf"}} {stage["count"]}')
+        lines.append(f"{prefix}_stage_duration_seconds_sum{{{label}}} {stage['seconds']:.6f}")
+        lines.append(f"{prefix}_stage_duration_seconds_count{{{label}}} {stage['count']}")
+    counters = [
+        ("rows", "Rows processed by pipeline stages"),
+        ("bytes", "Bytes produced or received by pipeline stages"),
+        ("tokens", "GA4 quota tokens consumed"),
+        ("errors", "Pipeline stages that raised"),
+    ]
+    for key, help_text in counters:
+        lines += [f"# HELP {prefix}_stage_{key}_total {help_text}", f"# TYPE {prefix}_stage_{key}_total counter"]
+        for name, stage in sorted(summary.items()):
+            if stage[key]:
+                lines.append(f'{prefix}_stage_{key}_total{{stage="{_label(name)}"}} {stage[key]}')
+    lines += [f"# HELP {prefix}_stage_cache_total Cache lookups by result",
+              f"# TYPE {prefix}_stage_cache_total counter"]
+    for name, stage in sorted(summary.items()):
+        for result, count in sorted(stage["cache"].items()):
+            lines.append(f'{prefix}_stage_cache_total{{stage="{_label(name)}",result="{_label(result)}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_json(spans=None):
+    """Spans as an OTLP/JSON ExportTraceServiceRequest (POST to a collector's /v1/traces)"""
+    if spans is None:
+        with _tracer._lock:
+            spans = list(_tracer.spans)
+    otlp_spans = []
+    for item in spans:
+        start = int(item.start_time * 1e9)
+        otlp_span = {
+            "traceId": item.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": 1,
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int((item.duration or 0.0) * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)}
+                           for key, value in item.attributes.items() if value is not None],
+            "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+        }
+        if item.parent_id:
+            otlp_span["parentSpanId"] = item.parent_id
+        otlp_spans.append(otlp_span)
+    return json.dumps({"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otlp_spans}],
+    }]})
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port=None, host=None):
+    """Serve /metrics and /traces on a background thread, once per process
+
+    Uses GA4_METRICS_PORT and GA4_METRICS_HOST (default 127.0.0.1) when
+    not given; returns the server, or None when no port is configured.
+    """
+    global _server
+    port = port or METRICS_PORT
+    if not port or _server is not None:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+            elif path == "/traces":
+                body, content_type = otlp_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the Streamlit log
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host or METRICS_HOST, int(port)), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server